@@ -5,6 +5,7 @@ import math
 import logging
 import time
 import game_states
+import profiler
 
 import bgeutils
 
@@ -248,20 +249,14 @@ class UILoop(object):
                         "ui_state_machine": self.ui_state_machine}
 
         if method_name in loop_methods:
-            timer = time.clock()
-            loop_methods[method_name]()
+            timer = time.perf_counter()
 
-            timer = time.clock() - timer
+            with profiler.scope(method_name):
+                loop_methods[method_name]()
 
             if one_time:
-                finished = "(DONE)"
-            else:
-                finished = ""
-
-            method_string = method_name
-
-            time_string = str(round(timer * 1000, 3))
-            self.main_loop.debug_timer[method_name] = "{:<30}:{:>12}ms {}".format(method_string, time_string, finished)
+                time_string = str(round((time.perf_counter() - timer) * 1000, 3))
+                self.main_loop.debug_timer[method_name] = "{:<30}:{:>12}ms (DONE)".format(method_name, time_string)
 
         else:
             print("not method called [{}] on UI loop".format(method_name))
@@ -2,6 +2,8 @@ import bgeutils
 import bge
 import mathutils
 import particles
+import pathfinding
+import profiler
 import random
 
 
@@ -224,6 +226,29 @@ class AgentEnemyTargeter(AgentTargeter):
         self.agent.exit_facing()
 
 
+class AgentSegmentTargeter(AgentTargeter):
+
+    """turns the agent to face along a path segment, which can be at any angle"""
+
+    def __init__(self, agent, vector):
+        self.vector = vector
+        super().__init__(agent)
+
+    def set_up(self):
+
+        start_vector = self.agent.agent_hook.getAxisVect([0.0, 1.0, 0.0])
+        end_vector = self.vector.to_3d()
+
+        self.start = self.agent.agent_hook.localTransform
+        self.end = end_vector.normalized().to_track_quat("Y", "Z").to_matrix().to_4x4()
+
+        angle = start_vector.angle(end_vector)
+        self.scale = angle / 3.142
+
+    def new_facing(self):
+        self.agent.exit_facing()
+
+
 class AgentMovement(object):
     def __init__(self, agent):
 
@@ -241,8 +266,7 @@ class AgentMovement(object):
             self.progress = 0.0
             self.done = False
 
-            self.agent.clear_occupied()
-            self.agent.set_occupied()
+            self.agent.move_occupied()
 
     def update(self):
 
@@ -270,6 +294,88 @@ class AgentMovement(object):
                 self.done = True
 
 
+class AgentSegmentMovement(object):
+
+    """drives the agent down a straight segment of its path without stopping at each tile.
+    location, occupancy and the ground points still follow it tile by tile, each tile entered is taken off the front
+    of path and added to travelled. it stops short if the next tile has been taken since the segment was planned
+    """
+
+    def __init__(self, agent, path, count, travelled):
+
+        self.agent = agent
+        self.path = path
+        self.remaining = count
+        self.travelled = travelled
+        self.done = False
+        self.progress = 0.0
+
+        last = path[count - 1]
+        self.origin = self.agent.box.worldPosition.copy()
+        self.direction = mathutils.Vector([last[0] + self.agent.tile_offset, last[1] + self.agent.tile_offset,
+                                           0.0]) - self.origin
+        self.direction.normalize()
+
+        self.next_tile()
+
+    def next_tile(self):
+
+        if not self.remaining or not self.path:
+            self.done = True
+            return False
+
+        target = self.path[0]
+
+        if self.agent.check_occupied(target):
+            self.done = True
+            return False
+
+        self.path.pop(0)
+        self.remaining -= 1
+        self.travelled.append(target)
+        self.agent.target_tile = target
+
+        # the point on the segment level with the tile, so the agent drives a straight line
+        tile_position = mathutils.Vector([target[0] + self.agent.tile_offset, target[1] + self.agent.tile_offset, 0.0])
+        self.start = self.agent.box.worldPosition.copy()
+        self.end = self.origin + (self.direction * (tile_position - self.origin).dot(self.direction))
+        self.length = max(0.001, (self.end - self.start).length)
+        self.progress = 0.0
+
+        self.agent.move_occupied()
+        self.agent.animation.survey_points()
+        return True
+
+    def update(self):
+
+        if not self.done:
+            self.agent.throttle_target = 1.0
+
+            travel = self.agent.dynamic_stats.get("speed", 0.02)
+            if self.agent.extra_movement:
+                travel += self.agent.extra_movement
+                self.agent.extra_movement = None
+
+            while travel > 0.0:
+                movement_vector = self.end - self.agent.box.worldPosition.copy()
+                remaining = movement_vector.length
+
+                if remaining > travel:
+                    movement_vector.length = travel
+                    self.agent.box.worldPosition += movement_vector
+                    self.progress = 1.0 - (remaining / self.length)
+                    return
+
+                self.agent.box.worldPosition = self.end.copy()
+                travel -= remaining
+                self.agent.location = self.agent.target_tile
+                self.agent.target_tile = None
+
+                if not self.next_tile():
+                    self.agent.extra_movement = travel
+                    return
+
+
 class AgentPause(object):
     def __init__(self, agent, pause_length=60):
 
@@ -288,13 +394,34 @@ class AgentPause(object):
                 self.progress += self.increment
 
 
+class AgentPlanWait(object):
+
+    """holds the agent still like AgentPause until its path comes back from the path service"""
+
+    def __init__(self, agent, future):
+
+        self.agent = agent
+        self.future = future
+        self.done = False
+        self.progress = 0.0
+
+    def update(self):
+
+        if not self.done:
+            self.agent.throttle_target = 0.0
+            if self.future.done():
+                self.done = True
+
+
 class ManAction(object):
     def __init__(self, man):
 
         self.man = man
         self.agent = man.agent
         self.location = self.agent.location
-        self.history = []
+        self.history = pathfinding.VisitedTiles(15)
+        self.history_goal = None
+        self.route = []
         self.occupied = None
         self.target = None
         self.destination = None
@@ -320,6 +447,7 @@ class ManAction(object):
         speed = self.agent.dynamic_stats.get("speed", 0.02)
         self.speed = speed + random.uniform(0.0, 0.01)
 
+    @profiler.profiled()
     def update(self):
 
         self.switch_stance()
@@ -460,13 +588,43 @@ class ManAction(object):
 
         self.destination = bgeutils.get_key(destination)
 
+    def plan_route(self):
+
+        """the man has stopped getting closer to his place in the formation, plan a short path there"""
+
+        manager = self.agent.manager
+        manager.stuck.loops += 1
+        self.history.clear()
+
+        if manager.chunked_tiles:
+            return
+
+        tiles = manager.tiles
+        agent_id = tiles.registry.agent_ids.get(self.agent, 0)
+        window, origin = pathfinding.search_window(tiles.occupant_map(), tiles.origin, self.location,
+                                                   self.destination, 8, 1)
+        blocked = pathfinding.block_outside(pathfinding.footprint_blocked(window, agent_id, 1), origin,
+                                            *level_limits(manager, 1))
+
+        self.route = pathfinding.GridPathfinder(blocked, origin).find_path(self.location, self.destination)
+        manager.stuck.escalated += 1
+
+    def route_step(self):
+
+        current_tile = self.location
+        step = self.route.pop(0)
+        choice = (step[0] - current_tile[0], step[1] - current_tile[1])
+
+        if max(abs(choice[0]), abs(choice[1])) != 1 or self.check_occupied(step):
+            self.route = []
+            return None
+
+        return choice
+
     def choose_tile(self):
 
         avoid = self.avoiding
 
-        if len(self.history) > 15:
-            self.history = []
-
         search_array = [(1, 0), (1, 1), (0, 1), (1, -1), (-1, 0), (-1, 1), (0, -1), (-1, -1)]
 
         if avoid:
@@ -481,6 +639,14 @@ class ManAction(object):
         closest = 10000.0
         furthest = 0.0
 
+        if self.route and not avoid:
+            route_choice = self.route_step()
+
+            if route_choice:
+                choice = route_choice
+                target = (current_tile[0] + choice[0], current_tile[1] + choice[1])
+                search_array = []
+
         for s in search_array:
             neighbor = (current_tile[0] + s[0], current_tile[1] + s[1])
             if not self.check_occupied(neighbor):
@@ -503,7 +669,23 @@ class ManAction(object):
 
         self.direction = choice
         self.target = target
-        self.history.append(target)
+
+        if avoid:
+            self.history.add(target)
+        else:
+            if self.history_goal != reference:
+                self.history_goal = reference
+                self.history.reset_progress()
+
+            self.history.add(target, (mathutils.Vector(reference) - mathutils.Vector(target)).length)
+
+            # next to his place, or kept off it by someone standing there, he can't get any closer
+            if max(abs(reference[0] - target[0]), abs(reference[1] - target[1])) <= 1 or \
+                    self.check_occupied(reference):
+                self.history.reset_progress()
+
+            elif self.history.looping():
+                self.plan_route()
 
         self.clear_occupied()
         self.set_occupied(self.target)
@@ -574,7 +756,7 @@ class ManAction(object):
 
         for facing in search_array:
             facing_vector = mathutils.Vector(facing)
-            angle = gun_vector.angle(facing_vector)
+            angle = gun_vector.angle(facing_vector, 4.0)
             if angle < best_angle:
                 best_facing = facing
                 best_angle = angle
@@ -583,42 +765,41 @@ class ManAction(object):
 
     def check_occupied(self, target_tile):
 
-        check_tile = self.agent.manager.tiles[target_tile].occupied
+        if self.agent.manager.clearance:
+            return not self.agent.manager.clearance.fits(target_tile, 1)
 
-        if check_tile:
-            return True
+        return self.agent.manager.occupancy.rect_any(target_tile, target_tile)
 
     def check_too_close(self, target_tile):
 
-        closest = []
+        reach = self.agent.avoid_radius // 2
+        occupancy = self.agent.manager.occupancy
+        proximity = occupancy.proximity
 
-        radius = self.agent.avoid_radius
-        half = int(round(radius * 0.5))
+        if proximity and reach <= proximity.max_distance:
+            return proximity.nearest(target_tile, reach)
 
         ox, oy = target_tile
+        low = (ox - reach, oy - reach)
+        high = (ox + reach, oy + reach)
 
-        for x in range(radius):
-            for y in range(radius):
-                check_key = (ox + (x - half), oy + (y - half))
-                check_tile = self.agent.manager.tiles[check_key].occupied
-
-                if check_tile:
-                    vehicles = ["VEHICLE", "ARTILLERY"]
-                    if check_tile != self.agent and check_tile.agent_type in vehicles:
-                        closest.append(check_tile)
+        if occupancy.rect_count(low, high, "VEHICLE"):
+            closest = occupancy.rect_agents(low, high, self.agent, "VEHICLE")
 
-        if closest:
-            return closest[0]
+            if closest:
+                return closest[0]
 
     def set_occupied(self, set_tile):
 
-        self.agent.manager.tiles[set_tile].occupied = self.agent
+        self.agent.manager.occupancy.stamp(self.agent, set_tile, set_tile)
+        self.agent.manager.occupancy_changed(set_tile, set_tile)
         self.occupied = set_tile
 
     def clear_occupied(self):
 
         if self.occupied:
-            self.agent.manager.tiles[self.occupied].occupied = None
+            self.agent.manager.occupancy.clear(self.agent, self.occupied, self.occupied)
+            self.agent.manager.occupancy_changed(self.occupied, self.occupied)
 
         self.occupied = None
 
@@ -647,14 +828,38 @@ class ArtilleryManAction(ManAction):
 
 
 class AgentPathfinding(object):
+
+    """greedy steps toward the destination, never back onto the tiles in history.
+    a walker that stops getting closer is going round an obstacle, it's handed to a full planner when there is one
+    """
+
+    max_waits = 25
+
     def __init__(self, agent, destination):
 
         self.agent = agent
         self.done = False
-        self.history = []
+        self.history = pathfinding.VisitedTiles(25)
+        self.waits = 0
+        self.planner = None
 
         self.destination = destination
 
+    def escalate(self):
+
+        """the walker is stuck, plan the rest of the way or give up on chunked tiles"""
+
+        manager = self.agent.manager
+        manager.stuck.loops += 1
+
+        if manager.chunked_tiles:
+            manager.stuck.gave_up += 1
+            self.destination = None
+
+        else:
+            manager.stuck.escalated += 1
+            self.planner = AgentPathPlanner(self.agent, self.destination)
+
     def next_tile(self):
 
         search_array = [(1, 0), (1, 1), (0, 1), (1, -1), (-1, 0), (-1, 1), (0, -1), (-1, -1)]
@@ -665,9 +870,19 @@ class AgentPathfinding(object):
         closest = 10000.0
         free = 0
 
+        free_steps = None
+        clearance = self.agent.manager.clearance
+        if clearance:
+            agent_id = self.agent.manager.tiles.registry.agent_ids.get(self.agent, 0)
+            free_steps = clearance.free_steps(current_tile, self.agent.get_footprint(), agent_id)
+
         for s in search_array:
             neighbor = (current_tile[0] + s[0], current_tile[1] + s[1])
-            neighbor_check = self.agent.check_occupied(neighbor)
+
+            if free_steps is not None and free_steps[s[0] + 1, s[1] + 1]:
+                neighbor_check = None
+            else:
+                neighbor_check = self.agent.check_occupied(neighbor)
 
             if not neighbor_check:
                 if neighbor not in self.history:
@@ -695,44 +910,69 @@ class AgentPathfinding(object):
 
         return closest, next_facing, next_target, free, touching_infantry
 
+    @profiler.profiled()
     def update(self):
+        if self.planner:
+            self.planner.update()
+            self.done = self.planner.done
+            return
+
         if self.agent.stop_movement:
             if not self.agent.movement:
                 self.destination = None
                 self.done = True
 
+        if self.destination:
+            if not self.agent.movement:
+                self.agent.manager.scheduler.request(self.agent, "path", self.decide)
+
+        if not self.destination:
+            self.agent.throttle_target = 0.0
+            self.done = True
+
+    @profiler.profiled()
+    def decide(self):
+
+        """picks the next tile or action, run by the agent scheduler so it can wait a few ticks"""
+
+        if self.done or self.planner:
+            return
+
         if self.destination:
             if not self.agent.movement:
 
                 closest, next_facing, next_target, free, touching_infantry = self.next_tile()
 
                 if free < 6 and closest < 6:
-                    if len(self.history) > 25:
+                    if self.waits >= self.max_waits:
+                        self.agent.manager.stuck.gave_up += 1
                         self.destination = None
                     else:
-                        self.history.append(None)
+                        self.waits += 1
                         self.agent.set_waiting()
 
                 elif self.agent.location == self.destination:
                     self.destination = None
 
                 elif not next_facing:
-                    self.destination = None
+                    self.escalate()
 
                 elif next_target:
                     if touching_infantry:
                         self.agent.set_waiting()
 
+                    elif next_facing != self.agent.facing:
+                        self.agent.facing = next_facing
+                        self.agent.set_targeter()
+
                     else:
-                        if len(self.history) > 25:
-                            self.history = []
+                        distance = (mathutils.Vector(self.destination) - mathutils.Vector(next_target)).length
+                        self.history.add(next_target, distance)
 
-                        if next_facing != self.agent.facing:
-                            self.agent.facing = next_facing
-                            self.agent.set_targeter()
+                        if self.history.looping():
+                            self.escalate()
 
                         else:
-                            self.history.append(next_target)
                             self.agent.target_tile = next_target
                             self.agent.set_movement()
                             self.agent.animation.survey_points()
@@ -745,6 +985,551 @@ class AgentPathfinding(object):
             self.done = True
 
 
+class AgentPathPlanner(AgentPathfinding):
+
+    """follows a full A* path to the destination, planning again when the next step is blocked.
+    JPS mode plans the same paths with jump point search, which is faster across open ground.
+    vehicles weigh steps by the movement costs of their drive type, so they keep to roads and gentle slopes.
+    long orders in HPA mode follow the entrances of the cluster graph, planning a cluster or two at a time.
+    the tiles walked on long orders go in the path cache, so the next agent making the same journey can reuse them.
+    the path is string pulled into straight segments of up to max_segment tiles, driven without stopping at each tile
+    """
+
+    max_segment = 24
+
+    def __init__(self, agent, destination):
+        super().__init__(agent, destination)
+
+        self.path = None
+        self.waypoints = None
+        self.start = None
+        self.travelled = []
+        self.pending = None
+        self.pending_search = None
+        self.crowded = False
+        self.replans = 0
+        self.max_replans = 12
+        self.margin = 32
+        self.finder_class = get_finder_class(agent.manager)
+
+    def long_order(self, start):
+        return pathfinding.octile(self.destination[0] - start[0], self.destination[1] - start[1]) > self.margin
+
+    def path_blocked(self, keys):
+
+        occupancy = self.agent.manager.occupancy
+        span = self.agent.get_footprint() - 1
+
+        for key in keys:
+            if occupancy.rect_any(key, (key[0] + span, key[1] + span), self.agent, self.agent.occupied):
+                return True
+
+        return False
+
+    def cached_path(self):
+
+        """a cached path for this journey, joined on from the agent's location with a short search"""
+
+        path_cache = self.agent.manager.path_cache
+        location = self.agent.location
+        cached = path_cache.get(location, self.destination, self.agent.get_footprint(), self.path_blocked,
+                                self.agent.get_drive_type())
+
+        if not cached:
+            return None
+
+        path_start, path = cached
+        if path_start == location:
+            return list(path)
+
+        join = min(len(path) - 1, path_cache.region_size)
+        join_path, reached = self.search(location, path[join])
+
+        if reached:
+            return join_path + path[join + 1:]
+
+        return None
+
+    def uses_hierarchy(self):
+
+        manager = self.agent.manager
+        location = self.agent.location
+
+        if manager.pathfinding_mode == "HPA":
+            distance = pathfinding.octile(self.destination[0] - location[0], self.destination[1] - location[1])
+            return distance > manager.hierarchy_distance
+
+        return False
+
+    def get_waypoints(self):
+
+        if self.uses_hierarchy():
+            waypoints = get_cluster_graph(self.agent).abstract_path(self.agent.location, self.destination)
+            if waypoints:
+                return waypoints
+
+        return []
+
+    def next_waypoint(self):
+
+        """the furthest waypoint within margin, or the destination once they're used up"""
+
+        location = self.agent.location
+
+        if self.waypoints and self.waypoints[0] == location:
+            self.waypoints.pop(0)
+
+        if not self.waypoints:
+            return self.destination
+
+        goal_index = 0
+
+        for i, waypoint in enumerate(self.waypoints):
+            if pathfinding.octile(waypoint[0] - location[0], waypoint[1] - location[1]) > self.margin:
+                break
+
+            goal_index = i
+
+        self.waypoints = self.waypoints[goal_index:]
+        return self.waypoints[0]
+
+    def next_segment(self):
+
+        """string pulls the front of the path, the longest straight line from the agent to a tile further on
+        that its footprint can follow now, and that costs no more than the path there, replaces the path up to it.
+        returns the number of tiles in the segment
+        """
+
+        location = self.agent.location
+        end = min(len(self.path), self.max_segment) - 1
+
+        while end > 0:
+            line = pathfinding.line_tiles(location, self.path[end])
+
+            if line == self.path[:end + 1]:
+                return len(line)
+
+            if self.line_open(location, line, end):
+                self.path[:end + 1] = line
+                return len(line)
+
+            end //= 2
+
+        return 1
+
+    def line_open(self, location, line, end):
+
+        if self.path_blocked(pathfinding.swept_tiles(location, line)):
+            return False
+
+        movement_costs = self.agent.manager.movement_costs
+        drive_type = self.agent.get_drive_type()
+
+        if movement_costs and drive_type:
+            costs = movement_costs.get_costs(drive_type, self.agent.get_footprint())
+            origin = movement_costs.origin
+
+            def route_cost(keys):
+                total = 0.0
+                previous = location
+
+                for key in keys:
+                    step = pathfinding.octile(key[0] - previous[0], key[1] - previous[1])
+                    total += step * float(costs[key[0] - origin[0], key[1] - origin[1]])
+                    previous = key
+
+                return total
+
+            return route_cost(line) <= route_cost(self.path[:end + 1]) + 0.001
+
+        return True
+
+    def cost_window(self, origin, shape):
+
+        """the terrain costs for this agent's drive type over a search window, None for uniform costs"""
+
+        movement_costs = self.agent.manager.movement_costs
+        drive_type = self.agent.get_drive_type()
+
+        if movement_costs and drive_type:
+            return movement_costs.get_window(drive_type, self.agent.get_footprint(), origin, shape)
+
+        return None
+
+    def search(self, start, goal):
+
+        tiles = self.agent.manager.tiles
+        span = self.agent.get_footprint()
+        agent_id = tiles.registry.agent_ids.get(self.agent, 0)
+        occupant_map = tiles.occupant_map()
+
+        for margin in (self.margin, max(occupant_map.shape)):
+            window, origin = pathfinding.search_window(occupant_map, tiles.origin, start, goal, margin, span)
+            blocked = pathfinding.block_outside(pathfinding.footprint_blocked(window, agent_id, span), origin,
+                                                *level_limits(self.agent.manager, span))
+            finder = self.finder_class(blocked, origin, costs=self.cost_window(origin, blocked.shape))
+            path = finder.find_path(start, goal)
+
+            if finder.reached:
+                break
+
+        return path, finder.reached
+
+    def plan(self):
+
+        if self.waypoints is None:
+            self.start = self.agent.location
+
+            if self.long_order(self.start):
+                self.path = self.cached_path()
+
+                if self.path:
+                    self.waypoints = []
+                    return
+
+            if self.agent.manager.path_service.enabled and self.uses_hierarchy():
+                self.request_waypoints()
+                return
+
+            self.waypoints = self.get_waypoints()
+
+        goal = self.next_waypoint()
+
+        if self.agent.manager.path_service.enabled:
+            self.request_search(self.agent.location, goal, self.margin)
+        else:
+            self.set_path(*self.search(self.agent.location, goal))
+
+    def set_path(self, path, reached):
+
+        self.path = path
+        # boxed in, most likely by other units, so wait and try again
+        self.crowded = not path and not reached
+
+        if self.crowded:
+            self.replans += 1
+
+    def request_search(self, start, goal, margin):
+
+        """sends the search to the path service with a copy of the occupancy around it and waits for the result"""
+
+        tiles = self.agent.manager.tiles
+        span = self.agent.get_footprint()
+        agent_id = tiles.registry.agent_ids.get(self.agent, 0)
+        window, origin = pathfinding.search_window(tiles.occupant_map(), tiles.origin, start, goal, margin, span)
+
+        self.path = None
+        self.pending = self.agent.manager.path_service.submit(self.agent, pathfinding.plan_path, window.copy(), origin,
+                                                              agent_id, span, start, goal,
+                                                              level_limits(self.agent.manager, span),
+                                                              self.finder_class, self.cost_window(origin, window.shape))
+        self.pending_search = ("path", start, goal, margin)
+        self.agent.movement = AgentPlanWait(self.agent, self.pending)
+
+    def request_waypoints(self):
+
+        """the cluster graph search for a long order goes to the path service too, the graph locks itself"""
+
+        location = self.agent.location
+        graph = get_cluster_graph(self.agent)
+
+        self.path = None
+        self.pending = self.agent.manager.path_service.submit(self.agent, graph.abstract_path, location,
+                                                              self.destination)
+        self.pending_search = ("waypoints", location, self.destination, None)
+        self.agent.movement = AgentPlanWait(self.agent, self.pending)
+
+    def collect_search(self):
+
+        """True once a result is in place, otherwise the agent is still waiting on a search"""
+
+        future = self.pending
+
+        if not future.done():
+            self.agent.movement = AgentPlanWait(self.agent, future)
+            return False
+
+        self.pending = None
+        result = self.agent.manager.path_service.collect(self.agent, future)
+        kind, start, goal, margin = self.pending_search
+
+        if result is None or start != self.agent.location:
+            if kind == "waypoints":
+                self.waypoints = None
+
+            self.plan()
+            return not self.pending
+
+        if kind == "waypoints":
+            self.waypoints = result or []
+            self.plan()
+            return not self.pending
+
+        path, reached = result
+        full_margin = max(self.agent.manager.tiles.occupant_map().shape)
+
+        if not reached and margin < full_margin:
+            self.request_search(start, goal, full_margin)
+            return False
+
+        self.set_path(path, reached)
+        return True
+
+    def blocked_by_infantry(self, blocking):
+
+        if self.agent.agent_type != "INFANTRY":
+            for agent in blocking:
+                if agent.agent_type == "INFANTRY" and agent.team == self.agent.team:
+                    return True
+
+        return False
+
+    @profiler.profiled()
+    def decide(self):
+
+        if self.done:
+            return
+
+        if self.destination:
+            if not self.agent.movement:
+
+                planned = False
+
+                if self.pending:
+                    if not self.collect_search():
+                        return
+
+                    planned = True
+
+                next_target = None
+                blocking = None
+
+                if self.agent.location == self.destination:
+                    if self.start and self.long_order(self.start):
+                        self.agent.manager.path_cache.put(self.start, self.destination, self.agent.get_footprint(),
+                                                          self.travelled, self.agent.get_drive_type())
+
+                    self.destination = None
+
+                else:
+                    if self.path:
+                        next_target = self.path[0]
+                        blocking = self.agent.check_occupied(next_target)
+
+                        if blocking:
+                            next_target = None
+                            self.replans += 1
+
+                            if self.blocked_by_infantry(blocking) and self.waits < self.max_waits:
+                                self.waits += 1
+                                self.agent.set_waiting()
+                                return
+
+                            self.path = None
+
+                    if not next_target:
+                        if self.replans > self.max_replans:
+                            self.agent.manager.stuck.gave_up += 1
+                            self.destination = None
+
+                        else:
+                            if not planned:
+                                self.plan()
+
+                                if self.pending:
+                                    return
+
+                            if self.path:
+                                next_target = self.path[0]
+                            elif blocking or self.crowded:
+                                self.agent.set_waiting()
+                                return
+                            else:
+                                self.destination = None
+
+                if next_target:
+                    location = self.agent.location
+                    count = self.next_segment()
+                    last = self.path[count - 1]
+                    heading = mathutils.Vector([last[0] - location[0], last[1] - location[1]])
+
+                    if self.agent.reversing:
+                        heading = -heading
+
+                    facing = self.agent.agent_hook.getAxisVect([0.0, 1.0, 0.0]).to_2d()
+
+                    if facing.angle(heading, 0.0) > 0.05:
+                        self.agent.movement = AgentSegmentTargeter(self.agent, heading)
+
+                    else:
+                        self.agent.movement = AgentSegmentMovement(self.agent, self.path, count, self.travelled)
+
+        if not self.destination:
+            if self.pending:
+                self.agent.manager.path_service.forget(self.agent)
+                self.pending = None
+
+            self.agent.throttle_target = 0.0
+            self.done = True
+
+
+class AgentFlowFollower(AgentPathPlanner):
+
+    """walks down the shared flow field of a group order, then plans the last few tiles to its own destination"""
+
+    def __init__(self, agent, destination, flow_order):
+        super().__init__(agent, destination)
+
+        self.flow_order = flow_order
+        self.arrival = 12.0
+        self.look_ahead = 8
+        self.best_cost = pathfinding.UNREACHABLE
+
+    def plan(self):
+
+        """blocked steps only count against max_replans until the agent gets closer than it has been,
+        when the way down the field stays crowded it searches around the crowd instead"""
+
+        field = self.flow_order.get_field(self.agent)
+        cost = field.get_cost(self.agent.location)
+        self.crowded = False
+
+        if cost < self.best_cost:
+            self.best_cost = cost
+            self.replans = 0
+
+        if cost > self.arrival:
+            self.path = self.flow_path(field)
+
+            if self.path or (self.crowded and self.replans < 4):
+                return
+
+        self.crowded = False
+        super().plan()
+
+    def flow_path(self, field):
+
+        path = []
+        current = self.agent.location
+
+        for _ in range(self.look_ahead):
+            steps = field.next_steps(current)
+
+            if not path:
+                steps = [step for step in steps if not self.agent.check_occupied(step)]
+
+                if not steps and field.next_steps(current):
+                    self.crowded = True
+                    self.replans += 1
+
+            if not steps:
+                break
+
+            current = steps[0]
+            path.append(current)
+
+            if field.get_cost(current) <= self.arrival:
+                break
+
+        return path
+
+
+class FlowOrder(object):
+
+    """a group move order, one integration field from all the group's destinations for each footprint size.
+    fields are made the first time an agent of that size asks and live as long as the order is followed
+    """
+
+    def __init__(self, manager, agents, goals, margin=32):
+
+        self.manager = manager
+        self.agents = agents
+        self.goals = goals
+        self.margin = margin
+        self.fields = {}
+
+    def get_field(self, agent):
+
+        span = agent.get_footprint()
+        field = self.fields.get(span)
+
+        if not field:
+            keys = [group_agent.location for group_agent in self.agents] + self.goals
+            low = (min(key[0] for key in keys), min(key[1] for key in keys))
+            high = (max(key[0] for key in keys), max(key[1] for key in keys))
+
+            window, origin = pathfinding.search_window(building_blocked(self.manager, span), self.manager.tiles.origin,
+                                                       low, high, self.margin, span)
+            field = pathfinding.FlowField(window, origin, self.goals)
+            self.fields[span] = field
+
+        return field
+
+
+def get_pathfinder(agent, destination):
+
+    """the path finder for manager.pathfinding_mode, chunked tiles have no occupant map so they stay greedy.
+    destinations from a group order follow its flow field
+    """
+
+    manager = agent.manager
+    manager.path_service.forget(agent)
+    flow_order = agent.flow_orders.pop(destination, None)
+
+    if manager.pathfinding_mode in ("ASTAR", "JPS", "HPA") and not manager.chunked_tiles:
+        if flow_order:
+            return AgentFlowFollower(agent, destination, flow_order)
+
+        return AgentPathPlanner(agent, destination)
+
+    return AgentPathfinding(agent, destination)
+
+
+def get_finder_class(manager):
+    if manager.pathfinding_mode == "JPS":
+        return pathfinding.JumpPointPathfinder
+
+    return pathfinding.GridPathfinder
+
+
+def level_limits(manager, span):
+
+    """the first and last tiles a footprint of span tiles can have its corner on without leaving the level"""
+
+    last = (manager.level_size * 8) - span
+    return (0, 0), (last, last)
+
+
+def building_blocked(manager, span):
+    blocked = pathfinding.footprint_mask(manager.occupancy.layers["BUILDING"] != 0, span)
+    return pathfinding.block_outside(blocked, manager.tiles.origin, *level_limits(manager, span))
+
+
+def get_cluster_graph(agent):
+
+    """the shared cluster graph for agents with this footprint, built around buildings only"""
+
+    manager = agent.manager
+    span = agent.get_footprint()
+    graph = manager.cluster_graphs.get(span)
+
+    if not graph:
+        graph = pathfinding.ClusterGraph(building_blocked(manager, span), manager.tiles.origin, manager.cluster_size)
+        manager.cluster_graphs[span] = graph
+
+    return graph
+
+
+def update_cluster_graphs(manager, location, size):
+
+    """rebuilds the clusters around a building placed or removed at location"""
+
+    for span, graph in manager.cluster_graphs.items():
+        low = (location[0] - span, location[1] - span)
+        high = (location[0] + size, location[1] + size)
+        graph.update_area(building_blocked(manager, span), low, high)
+
+
 class CombatControl(object):
     def __init__(self, agent):
         self.agent = agent
@@ -758,23 +1543,11 @@ class CombatControl(object):
 
     def get_targets(self):
         if not self.agent.enemy_target:
+            team = self.agent.team
+            position = self.manager.spatial_index.positions[self.agent]
 
-            target_list = [agent for agent in self.manager.agents if
-                           agent.team >= 0 and agent.team != self.agent.team and agent.visible]
-
-            closest = 90000.0
-            best = None
-
-            for target in target_list:
-                distance = (target.box.worldPosition.copy() - self.agent.box.worldPosition.copy()).length
-
-                if distance < 48.0:
-
-                    if distance < closest:
-                        closest = distance
-                        best = target
-
-            self.target = best
+            self.target = self.manager.spatial_index.nearest(position, 48.0, lambda agent: agent.team >= 0 and
+                                                             agent.team != team and agent.visible)
         else:
             self.target = self.agent.enemy_target
 
@@ -784,21 +1557,19 @@ class CombatControl(object):
     def visibility(self):
 
         if self.agent.team != 0:
-            self.agent.set_visible(False)
-
-            for agent in self.agent.manager.agents:
-                if agent.team == 0:
-                    distance = (self.agent.box.worldPosition.to_2d() - agent.box.worldPosition.to_2d()).length
+            position = self.manager.spatial_index.positions[self.agent]
+            self.agent.set_visible(self.manager.spatial_index.any_within(position, 48.0,
+                                                                         lambda agent: agent.team == 0))
 
-                    if distance < 48.0:
-                        self.agent.set_visible(True)
+    def refresh(self):
+        self.refresh_timer = 0
+        self.visibility()
+        self.get_targets()
 
     def update(self):
 
         if self.refresh_timer > 30:
-            self.refresh_timer = 0
-            self.visibility()
-            self.get_targets()
+            self.manager.scheduler.request(self.agent, "combat", self.refresh)
         else:
             self.refresh_timer += 1
 
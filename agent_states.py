@@ -198,7 +198,7 @@ class VehicleMoving(VehicleState):
 
         if self.agent.destinations:
             destination = self.agent.destinations.pop(0)
-            self.pathfinder = agent_actions.AgentPathfinding(self.agent, destination)
+            self.pathfinder = agent_actions.get_pathfinder(self.agent, destination)
 
         else:
             self.pathfinder = None
@@ -231,7 +231,7 @@ class VehicleMovingAI(VehicleMoving):
         super().__init__(agent)
 
         destination = self.agent.manager.waypoints.point_list[self.agent.waypoint].location
-        self.pathfinder = agent_actions.AgentPathfinding(self.agent, destination)
+        self.pathfinder = agent_actions.get_pathfinder(self.agent, destination)
 
     def exit_check(self):
 
@@ -394,7 +394,7 @@ class InfantryMoving(InfantryState):
 
         if self.agent.destinations:
             destination = self.agent.destinations.pop(0)
-            self.pathfinder = agent_actions.AgentPathfinding(self.agent, destination)
+            self.pathfinder = agent_actions.get_pathfinder(self.agent, destination)
 
         else:
             self.pathfinder = None
@@ -605,7 +605,7 @@ class ArtilleryMoving(ArtilleryState):
 
         if self.agent.destinations:
             destination = self.agent.destinations.pop(0)
-            self.pathfinder = agent_actions.AgentPathfinding(self.agent, destination)
+            self.pathfinder = agent_actions.get_pathfinder(self.agent, destination)
 
         else:
             self.pathfinder = None
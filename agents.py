@@ -24,7 +24,8 @@ class TestHouse(object):
         self.size = 9
         self.tile_offset = (self.size * 0.5) - 0.5
         self.team = -1
-        self.occupied = []
+        self.occupied = None
+        self.markers = []
         self.commands = []
         self.ended = False
         self.selected = False
@@ -50,19 +51,19 @@ class TestHouse(object):
     def set_occupied(self):
 
         x, y = self.location
+        far = (x + self.size - 1, y + self.size - 1)
 
-        for xp in range(self.size):
-            for yp in range(self.size):
-
-                set_key = (x + xp, y + yp)
-                marker = None
-
-                if self.manager.debug:
+        if self.manager.debug:
+            for xp in range(self.size):
+                for yp in range(self.size):
                     marker = self.box.scene.addObject("marker", self.box, 0)
                     marker.worldPosition = (x + xp, y + yp, self.box.worldPosition.copy().z + 5.0)
+                    self.markers.append(marker)
 
-                self.manager.tiles[set_key].occupied = self
-                self.occupied.append([set_key, marker])
+        self.manager.occupancy.stamp(self, (x, y), far)
+        self.occupied = ((x, y), far)
+        self.manager.occupancy_changed((x, y), far)
+        agent_actions.update_cluster_graphs(self.manager, self.location, self.size)
 
     def update(self):
         # need to write code to set visible, and set team if occupied, as well as set HP, do damage etc...
@@ -103,6 +104,17 @@ class Agent(object):
     reversing = False
     stance = "FLANK"
 
+    _location = None
+
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, location):
+        self._location = location
+        self.update_spatial_index()
+
     def __init__(self, manager, location, load_name, team=0):
 
         self.manager = manager
@@ -110,8 +122,8 @@ class Agent(object):
         self.location = location
         self.team = team
 
-        self.occupied = []
-        self.shell = [(0, 0)]
+        self.occupied = None
+        self.markers = []
 
         self.state_name = None
         self.state = None
@@ -134,6 +146,7 @@ class Agent(object):
         self.combat_control = None
         self.commands = []
         self.destinations = []
+        self.flow_orders = {}
 
         self.rotation_target = None
         self.stop_movement = False
@@ -181,60 +194,76 @@ class Agent(object):
 
     def set_position(self):
         self.box.worldPosition = [self.location[0] + self.tile_offset, self.location[1] + self.tile_offset, 0.0]
+        self.update_spatial_index()
         self.clear_occupied()
         self.set_occupied()
 
-    def set_shell(self):
+    def update_spatial_index(self):
+        x, y = self._location
+        self.manager.spatial_index.update(self, (x + self.tile_offset, y + self.tile_offset))
 
-        self.shell = []
+    def set_occupied(self):
 
-        for x in range(self.size + 1):
-            for y in range(self.size + 1):
+        x, y = self.location
+        far = (x + self.size, y + self.size)
 
-                x_edge = x == 0 or x == self.size
-                y_edge = y == 0 or y == self.size
+        if self.manager.debug:
+            for xp in range(self.size + 1):
+                for yp in range(self.size + 1):
+                    marker = self.box.scene.addObject("marker", self.box, 0)
+                    marker.worldPosition = (x + xp, y + yp, 2.0)
+                    self.markers.append(marker)
 
-                if x_edge or y_edge:
-                    self.shell.append((x, y))
+        self.manager.occupancy.stamp(self, (x, y), far)
+        self.occupied = ((x, y), far)
+        self.manager.occupancy_changed((x, y), far)
 
-    def set_occupied(self):
+    def clear_occupied(self):
 
-        x, y = self.location
+        if self.occupied:
+            low, high = self.occupied
+            self.manager.occupancy.clear(self, low, high)
+            self.manager.occupancy_changed(low, high)
 
-        for tile in self.shell:
-            xp, yp = tile
-            set_key = (x + xp, y + yp)
-            marker = None
+        for marker in self.markers:
+            marker.endObject()
 
-            if self.manager.debug:
-                marker = self.box.scene.addObject("marker", self.box, 0)
-                marker.worldPosition = (x + xp, y + yp, 2.0)
+        self.markers = []
+        self.occupied = None
 
-            self.manager.tiles[set_key].occupied = self
-            self.occupied.append([set_key, marker])
+    def move_occupied(self):
 
-    def clear_occupied(self):
+        """moves the stamped footprint to location, only the tiles it leaves and enters are written"""
+
+        if not self.occupied or self.manager.debug:
+            self.clear_occupied()
+            self.set_occupied()
+            return
 
-        for occupied in self.occupied:
-            self.manager.tiles[occupied[0]].occupied = False
-            if occupied[1]:
-                occupied[1].endObject()
+        x, y = self.location
+        corner = self.occupied[0]
+
+        if corner != (x, y):
+            low, high = self.manager.occupancy.move(self, corner, (x, y), self.size + 1)
+            self.occupied = ((x, y), (x + self.size, y + self.size))
+            self.manager.occupancy_changed(low, high)
 
-        self.occupied = []
+    def get_footprint(self):
+        return self.size + 1
+
+    def get_drive_type(self):
+        return None
 
     def check_occupied(self, location):
 
         x, y = location
-        occupied = []
+        low = (x, y)
+        high = (x + self.size, y + self.size)
 
-        for xp in range(self.size + 1):
-            for yp in range(self.size + 1):
-                check_key = (x + xp, y + yp)
-                check_tile = self.manager.tiles[check_key].occupied
+        if not self.manager.occupancy.rect_any(low, high, self, self.occupied):
+            return None
 
-                if check_tile:
-                    if check_tile != self:
-                        occupied.append(check_tile)
+        occupied = self.manager.occupancy.rect_agents(low, high, self)
 
         if occupied:
             return occupied
@@ -245,10 +274,11 @@ class Agent(object):
     def set_movement(self):
         self.movement = agent_actions.AgentMovement(self)
 
-    def set_waiting(self):
+    def set_waiting(self, pause_length=60):
         self.throttle = 0.0
         self.target_tile = None
-        self.movement = agent_actions.AgentPause(self)
+        self.movement = agent_actions.AgentPause(self, pause_length)
+        self.manager.stuck.waited(pause_length)
 
     def process_commands(self):
 
@@ -295,7 +325,10 @@ class Agent(object):
                 destination = (int(round(command.position[0])), int(round(command.position[1])))
                 if not command.additive:
                     self.destinations = []
+                    self.flow_orders = {}
                     self.stop_movement = True
+                if command.target:
+                    self.flow_orders[destination] = command.target
                 if command.condition == "REVERSE":
                     if not self.reversing:
                         self.throttle = 0.0
@@ -389,11 +422,11 @@ class Agent(object):
 
 class VehicleAgent(Agent):
 
+    agent_type = "VEHICLE"
+
     def __init__(self, manager, location, load_name, team):
         super().__init__(manager, location, load_name, team)
 
-        self.agent_type = "VEHICLE"
-
     def add_box(self):
         box = self.manager.scene.addObject("agent", self.manager.own, 0)
         return box
@@ -402,6 +435,9 @@ class VehicleAgent(Agent):
         self.state_name = None
         self.state = agent_states.VehicleStartUp(self)
 
+    def get_drive_type(self):
+        return self.stats.drive_type
+
     def load_vehicle(self):
 
         self.stats = vehicle_stats.load_vehicle(self.load_name)
@@ -415,8 +451,6 @@ class VehicleAgent(Agent):
         self.size = 3 + self.stats.chassis_size
         self.tile_offset = (self.size * 0.5) - 0.5
 
-        self.set_shell()
-
     def set_dynamic_stats(self):
 
         self.dynamic_stats = {"handling": 0.0, "acceleration": 0.0, "speed": 0.02, "abs_speed": 0.0,
@@ -507,10 +541,11 @@ class Soldier(object):
 
 class Artillery(Agent):
 
+    agent_type = "ARTILLERY"
+
     def __init__(self, manager, location, load_name, team):
         super().__init__(manager, location, load_name, team)
 
-        self.agent_type = "ARTILLERY"
         self.deployed = 0.0
         self.deploy_speed = 0.02
 
@@ -557,12 +592,10 @@ class Artillery(Agent):
         else:
             cammo = 4
 
-        self.display_object = model_display.ArtilleryModel(self.hull, self, cammo=cammo)
+        self.display_object = model_display.ArtilleryModel(self.hull, self.stats, owner=self, cammo=cammo)
         self.size = 3 + self.stats.chassis_size
         self.tile_offset = (self.size * 0.5) - 0.5
 
-        self.set_shell()
-
         if self.stats.weight > 12:
             self.dynamic_stats['speed'] = 0.025
             self.dynamic_stats['turning_speed'] = 0.001
@@ -637,11 +670,11 @@ class Artillery(Agent):
 
 class InfantrySquad(Agent):
 
+    agent_type = "INFANTRY"
+
     def __init__(self, manager, location, load_name, team):
         super().__init__(manager, location, load_name, team)
 
-        self.agent_type = "INFANTRY"
-
         load_dict = {"officer": [1, 1, "HRE_OFFICER"],
                      "engineer": [2, 1, "HRE_ENGINEER"],
                      "mg": [6, 1, "HRE_MG"],
@@ -689,19 +722,19 @@ class InfantrySquad(Agent):
     def clear_occupied(self):
         pass
 
+    def get_footprint(self):
+        return self.size
+
     def check_occupied(self, location):
 
         x, y = location
-        occupied = []
+        low = (x, y)
+        high = (x + self.size - 1, y + self.size - 1)
 
-        for xp in range(self.size):
-            for yp in range(self.size):
-                check_key = (x + xp, y + yp)
-                check_tile = self.manager.tiles[check_key].occupied
+        if not self.manager.occupancy.rect_any(low, high, self):
+            return None
 
-                if check_tile:
-                    if check_tile != self:
-                        occupied.append(check_tile)
+        occupied = self.manager.occupancy.rect_agents(low, high, self)
 
         if occupied:
             return occupied
@@ -832,7 +865,10 @@ class InfantrySquad(Agent):
                 destination = (int(round(command.position[0])), int(round(command.position[1])))
                 if not command.additive:
                     self.destinations = []
+                    self.flow_orders = {}
                     self.stop_movement = True
+                if command.target:
+                    self.flow_orders[destination] = command.target
                 if command.condition == "REVERSE":
                     if not self.reversing:
                         self.throttle = 0.0
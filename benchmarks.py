@@ -0,0 +1,1323 @@
+import json
+import math
+import platform
+import random
+import time
+
+import numpy as np
+
+import headless
+import pathfinding
+import profiler
+import terrain_raster
+import tile_grid
+
+AGENT_TICK_PHASES = ["agent_commands", "agents_update", "particle_update", "particle_light_update"]
+DEFAULT_AGENT_MIX = {"VehicleAgent": 0.3, "InfantrySquad": 0.5, "Artillery": 0.1, "TestHouse": 0.1}
+
+
+def timed(method, *args, **kwargs):
+    timer = time.perf_counter()
+    method(*args, **kwargs)
+    return (time.perf_counter() - timer) * 1000.0
+
+
+def startup_cache_benchmark(manager, runs=3):
+
+    """times GameLoop.get_tiles with an empty heightfield cache (cold) and a filled one (warm)
+    run it from a live game loop after prep_level, results are in milliseconds
+    """
+
+    cache = manager.heightfield_cache
+    terrain_key = cache.terrain_key(manager.terrain.ground_object, manager.level_size, manager.heightfield_mode)
+
+    results = {"cold": [], "warm": []}
+
+    for _ in range(runs):
+        cache.clear(terrain_key)
+        results["cold"].append(timed(manager.get_tiles))
+        results["warm"].append(timed(manager.get_tiles))
+
+    for name in results:
+        times = results[name]
+        print("{:<10}: best {:>10.3f}ms mean {:>10.3f}ms".format(name, min(times), sum(times) / len(times)))
+
+    return results
+
+
+def synthetic_terrain_mesh(level_size, spacing=4.0, seed=0):
+
+    """a rolling noise height field as a triangle mesh, with quads split along alternating diagonals"""
+
+    random_state = np.random.RandomState(seed)
+    extent = (level_size * 8) + 4
+    count = int(math.ceil(extent / spacing)) + 1
+
+    axis = (np.arange(count) * spacing) - 2.0
+    xs, ys = np.meshgrid(axis, axis, indexing="ij")
+    phases = random_state.uniform(0.0, math.pi * 2.0, 4)
+    zs = (np.sin((xs * 0.05) + phases[0]) * 3.0 + np.cos((ys * 0.07) + phases[1]) * 2.0 +
+          np.sin(((xs + ys) * 0.11) + phases[2]) + random_state.uniform(-0.3, 0.3, xs.shape))
+
+    vertices = np.stack([xs.ravel(), ys.ravel(), zs.ravel()], axis=1)
+
+    triangles = []
+    for x in range(count - 1):
+        for y in range(count - 1):
+            a = (x * count) + y
+            b = a + count
+            c = b + 1
+            d = a + 1
+
+            if (x + y) % 2:
+                triangles.extend([[a, b, c], [a, c, d]])
+            else:
+                triangles.extend([[a, b, d], [b, c, d]])
+
+    return vertices, np.array(triangles, dtype=np.int64)
+
+
+def ray_cast_heights(grid, vertices, triangles):
+
+    """reference heights from a straight down ray per tile, like GameLoop.survey_tiles"""
+
+    corners = vertices[triangles]
+    edge_1 = corners[:, 1] - corners[:, 0]
+    edge_2 = corners[:, 2] - corners[:, 0]
+    low = corners[:, :, :2].min(axis=1)
+    high = corners[:, :, :2].max(axis=1)
+    direction = np.array([0.0, 0.0, -1.0])
+
+    heights = np.zeros(grid.size)
+    hit = np.zeros(grid.size, dtype=np.bool_)
+
+    for x in grid.key_range():
+        for y in grid.key_range():
+            near = np.where((low[:, 0] <= x + 1e-6) & (high[:, 0] >= x - 1e-6) &
+                            (low[:, 1] <= y + 1e-6) & (high[:, 1] >= y - 1e-6))[0]
+
+            origin = np.array([x, y, 1000.0])
+            best = None
+
+            for i in near:
+                p = np.cross(direction, edge_2[i])
+                determinant = edge_1[i].dot(p)
+                if abs(determinant) < 1e-12:
+                    continue
+
+                t_vector = origin - corners[i, 0]
+                u = t_vector.dot(p) / determinant
+                q = np.cross(t_vector, edge_1[i])
+                v = direction.dot(q) / determinant
+
+                if u < -1e-9 or v < -1e-9 or u + v > 1.0 + 1e-9:
+                    continue
+
+                z = origin[2] - (edge_2[i].dot(q) / determinant)
+                if best is None or z > best:
+                    best = z
+
+            if best is not None:
+                index = grid.index((x, y))
+                heights[index] = best + 0.5
+                hit[index] = True
+
+    return heights, hit
+
+
+def mesh_heightfield_check(level_size=2, tolerance=0.001):
+
+    """rasterizes a synthetic mesh and compares it with ray cast heights, returns the worst error"""
+
+    grid = tile_grid.TileGrid(level_size)
+    vertices, triangles = synthetic_terrain_mesh(level_size, spacing=3.0)
+
+    terrain_raster.rasterize_triangles(grid, vertices, triangles)
+    heights, hit = ray_cast_heights(grid, vertices, triangles)
+
+    if not np.array_equal(hit, grid.hit):
+        raise AssertionError("mesh raster and ray cast disagree on {} tiles".format(int((hit != grid.hit).sum())))
+
+    error = float(np.abs(grid.height[hit] - heights[hit]).max())
+    if error > tolerance:
+        raise AssertionError("mesh raster height error {} is over tolerance {}".format(error, tolerance))
+
+    return error
+
+
+def mesh_heightfield_benchmark(level_sizes=(64, 128, 256)):
+
+    results = {}
+
+    for level_size in level_sizes:
+        grid = tile_grid.TileGrid(level_size)
+        vertices, triangles = synthetic_terrain_mesh(level_size)
+        results[level_size] = timed(terrain_raster.rasterize_triangles, grid, vertices, triangles)
+
+        print("level size {:<6}: {:>8} tiles {:>10.3f}ms".format(level_size, grid.size, results[level_size]))
+
+    return results
+
+
+def percentiles(times):
+
+    times = np.asarray(times, dtype=np.float64)
+    if not len(times):
+        return {}
+
+    p50, p90, p95, p99 = np.percentile(times, [50, 90, 95, 99])
+
+    return {"mean": float(times.mean()), "p50": float(p50), "p90": float(p90), "p95": float(p95),
+            "p99": float(p99), "max": float(times.max())}
+
+
+def mix_counts(count, mix):
+
+    """splits count units between agent classes by the mix fractions, rounding so the total is exact"""
+
+    names = sorted(mix)
+    total = sum(mix.values())
+    counts = {name: int(count * mix[name] / total) for name in names}
+
+    remainders = sorted(names, key=lambda name: (count * mix[name] / total) - counts[name], reverse=True)
+    for name in remainders[:count - sum(counts.values())]:
+        counts[name] += 1
+
+    return counts
+
+
+def scenario_level_size(count, spacing=12):
+    per_row = int(math.ceil(math.sqrt(count)))
+    return max(32, int(math.ceil(((per_row * spacing) + 16) / 8.0)))
+
+
+def scenario_agents(count, mix=None, spacing=12, seed=0):
+
+    """returns a starting_agents(manager) callable for HeadlessRuntime.
+    units are laid out on a grid of spacing tile slots, the first half on team 0 and the rest on team 1
+    """
+
+    counts = mix_counts(count, mix or DEFAULT_AGENT_MIX)
+
+    def starting_agents(manager):
+
+        import agents
+
+        random_state = random.Random(seed)
+        names = [name for name in sorted(counts) for _ in range(counts[name])]
+        random_state.shuffle(names)
+
+        per_row = int(math.ceil(math.sqrt(count)))
+        squads = ["mg", "squad", "officer", "engineer", "squad", "anti-tank"]
+        agent_list = []
+
+        for i, name in enumerate(names):
+            location = (8 + ((i // per_row) * spacing), 8 + ((i % per_row) * spacing))
+            team = 0 if i < count // 2 else 1
+
+            if name == "VehicleAgent":
+                agent_list.append((agents.VehicleAgent, (manager, location, "primitive-tank", team)))
+            elif name == "InfantrySquad":
+                agent_list.append((agents.InfantrySquad, (manager, location, random_state.choice(squads), team)))
+            elif name == "Artillery":
+                agent_list.append((agents.Artillery, (manager, location, "light gun", team)))
+            else:
+                agent_list.append((agents.TestHouse, (manager, location)))
+
+        return agent_list
+
+    return starting_agents
+
+
+def agent_tick_benchmark(sizes=(10, 100, 500, 2000), ticks=100, mix=None, output_path="agent_tick_benchmark.json",
+                         moving=0.5, seed=0, agent_budget=None, background_planning=None):
+
+    """runs the headless game loop with size units for ticks ticks and writes per phase timings to output_path.
+
+    moving is the fraction of team 0 units ordered to the far corner at the start, so path finding is exercised.
+    agent_budget overrides the scheduler budget in milliseconds, use float("inf") to run all deferred work at once.
+    background_planning turns the path service on or off.
+    all times are in milliseconds, call headless.install() before importing this module outside blender.
+    """
+
+    mix = mix or DEFAULT_AGENT_MIX
+    scenarios = []
+
+    for size in sizes:
+        level_size = scenario_level_size(size)
+        runtime = headless.HeadlessRuntime(level_size=level_size, seed=seed,
+                                           starting_agents=scenario_agents(size, mix, seed=seed),
+                                           camera_position=(level_size * 4.0, level_size * 4.0))
+        runtime.phases = AGENT_TICK_PHASES
+
+        manager = runtime.manager
+        if agent_budget is not None:
+            manager.scheduler.budget = agent_budget
+        if background_planning is not None:
+            manager.path_service.enabled = background_planning
+
+        movers = [agent for agent in manager.agents if agent.team == 0 and agent.agent_type != "BUILDING"]
+        runtime.order_move(movers[:int(len(movers) * moving)], (level_size * 8.0 - 16.0, level_size * 8.0 - 16.0))
+
+        runtime.timings = {phase: [] for phase in runtime.phases}
+        runtime.run(ticks)
+
+        totals = [sum(phase_times) for phase_times in zip(*(runtime.timings[phase] for phase in runtime.phases))]
+
+        scenario = {"size": size,
+                    "level_size": level_size,
+                    "agents": mix_counts(size, mix),
+                    "ticks": ticks,
+                    "start_up": runtime.start_up_time,
+                    "particles": len(manager.particles),
+                    "agent_budget": manager.scheduler.budget,
+                    "scheduler_waiting": manager.scheduler.waiting,
+                    "background_planning": manager.path_service.enabled,
+                    "phases": {phase: percentiles(runtime.timings[phase]) for phase in runtime.phases},
+                    "tick": percentiles(totals)}
+
+        scenarios.append(scenario)
+
+        print("{:>6} agents: tick mean {:>10.3f}ms p95 {:>10.3f}ms p99 {:>10.3f}ms".format(
+            size, scenario["tick"]["mean"], scenario["tick"]["p95"], scenario["tick"]["p99"]))
+
+        runtime.close()
+
+    results = {"benchmark": "agent_tick",
+               "version": 1,
+               "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "seed": seed,
+               "mix": mix,
+               "scenarios": scenarios}
+
+    if output_path:
+        with open(output_path, "w") as out_file:
+            json.dump(results, out_file, indent=2, sort_keys=True)
+
+    return results
+
+
+def profiler_overhead_benchmark(calls=200000):
+
+    """cost per call of a profiled method with the profiler off and on, compared to a plain call, in microseconds"""
+
+    def plain():
+        pass
+
+    wrapped = profiler.profiled("overhead")(plain)
+    shared = profiler.PROFILER
+    was_enabled = shared.enabled
+
+    def run(method):
+        timer = time.perf_counter()
+        for _ in range(calls):
+            method()
+        return (time.perf_counter() - timer) * 1000000.0 / calls
+
+    results = {"plain": run(plain)}
+
+    shared.enabled = False
+    results["disabled"] = run(wrapped)
+
+    shared.enabled = True
+    results["enabled"] = run(wrapped)
+    shared.end_frame()
+    shared.clear()
+
+    shared.enabled = was_enabled
+
+    for name in results:
+        print("{:<10}: {:>8.3f}us per call".format(name, results[name]))
+
+    return results
+
+
+def brute_force_target(manager, agent, radius=48.0):
+
+    """the old all agents scan, kept to check and time the spatial index against"""
+
+    position = manager.spatial_index.positions[agent]
+    closest = radius
+    best = None
+
+    for target in manager.agents:
+        if target.team >= 0 and target.team != agent.team and target.visible:
+            target_position = manager.spatial_index.positions[target]
+            distance = math.hypot(target_position[0] - position[0], target_position[1] - position[1])
+
+            if distance < closest:
+                closest = distance
+                best = target
+
+    return best
+
+
+def target_distance(manager, agent, target):
+    if not target:
+        return None
+
+    position = manager.spatial_index.positions[agent]
+    target_position = manager.spatial_index.positions[target]
+    return round(math.hypot(target_position[0] - position[0], target_position[1] - position[1]), 6)
+
+
+def target_acquisition_benchmark(sizes=(250, 1000, 2000), rounds=3, brute_force=True, seed=0):
+
+    """times one combat refresh, visibility and target search, for every unit against the old full scan.
+    times are in milliseconds per round of all units,
+    mismatches counts units where the two searches find targets at different distances.
+    """
+
+    results = []
+
+    for size in sizes:
+        level_size = scenario_level_size(size)
+        runtime = headless.HeadlessRuntime(level_size=level_size, seed=seed,
+                                           starting_agents=scenario_agents(size, seed=seed),
+                                           camera_position=(level_size * 4.0, level_size * 4.0))
+        manager = runtime.manager
+        fighters = [agent for agent in manager.agents if getattr(agent, "combat_control", None)]
+
+        indexed = []
+        for _ in range(rounds):
+            timer = time.perf_counter()
+            for agent in fighters:
+                agent.combat_control.refresh()
+            indexed.append((time.perf_counter() - timer) * 1000.0)
+
+        result = {"size": size, "units": len(fighters), "indexed": min(indexed)}
+
+        if brute_force:
+            scanned = []
+            for _ in range(rounds):
+                timer = time.perf_counter()
+                found = [brute_force_target(manager, agent) for agent in fighters]
+                scanned.append((time.perf_counter() - timer) * 1000.0)
+
+            result["brute_force"] = min(scanned)
+            result["mismatches"] = sum(1 for agent, target in zip(fighters, found)
+                                       if not agent.enemy_target and
+                                       target_distance(manager, agent, agent.combat_control.target) !=
+                                       target_distance(manager, agent, target))
+
+        results.append(result)
+
+        print("{:>6} agents: indexed {:>10.3f}ms brute force {:>10.3f}ms mismatches {}".format(
+            size, result["indexed"], result.get("brute_force", 0.0), result.get("mismatches", 0)))
+
+    return results
+
+
+def maze_occupant_map(width=260, wall_spacing=24, gap=12, houses=40, seed=0):
+
+    """an occupant map of walls every wall_spacing tiles, each with a few random gaps, plus scattered 9x9 houses"""
+
+    random_state = random.Random(seed)
+    occupant_map = np.zeros((width, width), dtype=np.int32)
+
+    for x in range(wall_spacing, width - wall_spacing, wall_spacing):
+        occupant_map[x:x + 2, :] = 1
+
+        for _ in range(2):
+            y = random_state.randrange(0, width - gap)
+            occupant_map[x:x + 2, y:y + gap] = 0
+
+    for _ in range(houses):
+        x = random_state.randrange(0, width - 9)
+        y = random_state.randrange(0, width - 9)
+        occupant_map[x:x + 9, y:y + 9] = 2
+
+    return occupant_map
+
+
+def open_tiles(finder, count, seed=0):
+
+    random_state = random.Random(seed)
+    tiles = []
+
+    while len(tiles) < count:
+        key = (random_state.randrange(finder.width), random_state.randrange(finder.height))
+        if not finder.is_blocked(key):
+            tiles.append(key)
+
+    return tiles
+
+
+def greedy_path(finder, start, goal, history_length=25):
+
+    """the old one step look ahead from AgentPathfinding.next_tile, returns None when it gives up"""
+
+    path = []
+    history = []
+    current = start
+    max_steps = int(pathfinding.octile(goal[0] - start[0], goal[1] - start[1]) * 4) + 100
+
+    while current != goal:
+        if len(path) > max_steps:
+            return None
+
+        closest = 10000.0
+        next_target = None
+
+        for s in pathfinding.SEARCH_ARRAY:
+            neighbor = (current[0] + s[0], current[1] + s[1])
+
+            if not finder.is_blocked(neighbor) and neighbor not in history:
+                distance = math.hypot(goal[0] - neighbor[0], goal[1] - neighbor[1])
+                if s[0] and s[1]:
+                    distance += 0.4
+
+                if distance < closest:
+                    closest = distance
+                    next_target = neighbor
+
+        if not next_target:
+            return None
+
+        if len(history) > history_length:
+            history = []
+
+        history.append(next_target)
+        path.append(next_target)
+        current = next_target
+
+    return path
+
+
+def pathfinding_benchmark(width=260, queries=100, span=5, seed=0):
+
+    """A* paths per second on a maze map for an agent footprint of span tiles,
+    and how often the old greedy walk gets there and how much longer its paths are
+    """
+
+    occupant_map = maze_occupant_map(width, seed=seed)
+    finder = pathfinding.GridPathfinder(pathfinding.footprint_blocked(occupant_map, 0, span))
+    starts = open_tiles(finder, queries, seed)
+    goals = open_tiles(finder, queries, seed + 1)
+
+    times = []
+    expanded = []
+    reached = 0
+    greedy_reached = 0
+    length_ratios = []
+
+    for start, goal in zip(starts, goals):
+        timer = time.perf_counter()
+        path = finder.find_path(start, goal)
+        times.append((time.perf_counter() - timer) * 1000.0)
+        expanded.append(finder.expanded)
+
+        if finder.reached:
+            reached += 1
+
+            greedy = greedy_path(finder, start, goal)
+            if greedy is not None:
+                greedy_reached += 1
+                best_length = max(1.0, pathfinding.path_length(start, path))
+                length_ratios.append(pathfinding.path_length(start, greedy) / best_length)
+
+    results = {"width": width,
+               "span": span,
+               "queries": queries,
+               "paths_per_second": queries / (sum(times) / 1000.0),
+               "time": percentiles(times),
+               "expanded": sum(expanded) / float(len(expanded)),
+               "reached": reached,
+               "greedy_reached": greedy_reached,
+               "greedy_length_ratio": sum(length_ratios) / max(1, len(length_ratios))}
+
+    print("A* {:>8.1f} paths/s, mean {:>8.3f}ms, p95 {:>8.3f}ms, {:>8.0f} nodes, reached {}/{}".format(
+        results["paths_per_second"], results["time"]["mean"], results["time"]["p95"], results["expanded"],
+        reached, queries))
+    print("greedy reached {}/{}, {:.3f}x the A* path length".format(greedy_reached, reached,
+                                                                     results["greedy_length_ratio"]))
+
+    return results
+
+
+def jump_point_benchmark(width=260, queries=100, span=5, seed=0):
+
+    """A* against jump point search for an agent footprint of span tiles, on an open field with a few houses
+    and on the maze map. times in milliseconds, build is making the finder from the blocked map,
+    expanded is the mean number of nodes taken off the open list, mismatches counts queries where the two
+    path lengths differ
+    """
+
+    maps = {"open": maze_occupant_map(width, wall_spacing=width, houses=12, seed=seed),
+            "cluttered": maze_occupant_map(width, houses=80, seed=seed)}
+    results = {}
+
+    for name, occupant_map in maps.items():
+        blocked = pathfinding.footprint_blocked(occupant_map, 0, span)
+        finder_classes = {"astar": pathfinding.GridPathfinder, "jps": pathfinding.JumpPointPathfinder}
+        starts = None
+        map_results = {}
+        lengths = {}
+
+        for finder_name, finder_class in finder_classes.items():
+            timer = time.perf_counter()
+            finder = finder_class(blocked)
+            build = (time.perf_counter() - timer) * 1000.0
+
+            if starts is None:
+                starts = open_tiles(finder, queries, seed)
+                goals = open_tiles(finder, queries, seed + 1)
+
+            times = []
+            expanded = []
+            lengths[finder_name] = []
+
+            for start, goal in zip(starts, goals):
+                timer = time.perf_counter()
+                path = finder.find_path(start, goal)
+                times.append((time.perf_counter() - timer) * 1000.0)
+                expanded.append(finder.expanded)
+                lengths[finder_name].append(pathfinding.path_length(start, path))
+
+            map_results[finder_name] = {"build": build, "time": percentiles(times),
+                                        "expanded": sum(expanded) / float(queries)}
+
+            print("{:<10} {:<6} build {:>8.3f}ms, mean {:>8.3f}ms, p95 {:>8.3f}ms, {:>8.0f} nodes".format(
+                name, finder_name, build, map_results[finder_name]["time"]["mean"],
+                map_results[finder_name]["time"]["p95"], map_results[finder_name]["expanded"]))
+
+        map_results["mismatches"] = sum(1 for astar_length, jps_length in zip(lengths["astar"], lengths["jps"])
+                                        if abs(astar_length - jps_length) > 0.001)
+        map_results["speed_up"] = map_results["astar"]["time"]["mean"] / max(0.001, map_results["jps"]["time"]["mean"])
+        results[name] = map_results
+
+        print("{:<10} jps {:.1f}x faster, mismatches {}".format(name, map_results["speed_up"],
+                                                                 map_results["mismatches"]))
+
+    return results
+
+
+def hierarchical_pathfinding_benchmark(width=516, queries=30, span=5, cluster_size=16, rebuilds=20, seed=0):
+
+    """query times of the cluster graph against flat A* on a level_size 64 maze, both searching the whole map.
+    hierarchical times include refining the path, warm times are the same queries again with every cluster's
+    entrance costs already worked out. length_ratio is how much longer its paths are.
+    rebuild is the time to place a house and update the graph, in milliseconds like the rest
+    """
+
+    occupant_map = maze_occupant_map(width, houses=120, seed=seed)
+    blocked = pathfinding.footprint_blocked(occupant_map, 0, span)
+
+    timer = time.perf_counter()
+    graph = pathfinding.ClusterGraph(blocked, cluster_size=cluster_size)
+    build_time = (time.perf_counter() - timer) * 1000.0
+
+    flat = pathfinding.GridPathfinder(blocked, max_nodes=width * width)
+    starts = open_tiles(flat, queries, seed)
+    goals = open_tiles(flat, queries, seed + 1)
+
+    flat_times = []
+    graph_times = []
+    length_ratios = []
+
+    for start, goal in zip(starts, goals):
+        timer = time.perf_counter()
+        path = flat.find_path(start, goal)
+        flat_times.append((time.perf_counter() - timer) * 1000.0)
+
+        if not flat.reached:
+            continue
+
+        timer = time.perf_counter()
+        graph_path = graph.hierarchical_path(start, goal)
+        graph_times.append((time.perf_counter() - timer) * 1000.0)
+
+        if graph_path is not None:
+            best_length = max(1.0, pathfinding.path_length(start, path))
+            length_ratios.append(pathfinding.path_length(start, graph_path) / best_length)
+
+    warm_times = []
+
+    for start, goal in zip(starts, goals):
+        timer = time.perf_counter()
+        graph.hierarchical_path(start, goal)
+        warm_times.append((time.perf_counter() - timer) * 1000.0)
+
+    random_state = random.Random(seed)
+    rebuild_times = []
+
+    for _ in range(rebuilds):
+        x = random_state.randrange(0, width - 9)
+        y = random_state.randrange(0, width - 9)
+        occupant_map[x:x + 9, y:y + 9] = 2
+
+        timer = time.perf_counter()
+        graph.update_area(pathfinding.footprint_blocked(occupant_map, 0, span), (x - span, y - span), (x + 9, y + 9))
+        rebuild_times.append((time.perf_counter() - timer) * 1000.0)
+
+    results = {"width": width,
+               "span": span,
+               "cluster_size": cluster_size,
+               "build": build_time,
+               "entrances": len(graph.inter),
+               "flat": percentiles(flat_times),
+               "hierarchical": percentiles(graph_times),
+               "warm": percentiles(warm_times),
+               "found": len(length_ratios),
+               "reachable": len(graph_times),
+               "length_ratio": sum(length_ratios) / max(1, len(length_ratios)),
+               "rebuild": percentiles(rebuild_times)}
+
+    print("build {:.3f}ms, {} entrances, rebuild mean {:.3f}ms".format(build_time, results["entrances"],
+                                                                      results["rebuild"]["mean"]))
+    print("flat A*  mean {:>9.3f}ms p95 {:>9.3f}ms".format(results["flat"]["mean"], results["flat"]["p95"]))
+    print("HPA*     mean {:>9.3f}ms p95 {:>9.3f}ms, found {}/{}, {:.3f}x the A* path length".format(
+        results["hierarchical"]["mean"], results["hierarchical"]["p95"], results["found"], results["reachable"],
+        results["length_ratio"]))
+    print("HPA* warm mean {:>9.3f}ms p95 {:>9.3f}ms".format(results["warm"]["mean"], results["warm"]["p95"]))
+
+    return results
+
+
+def flow_walk(field, start):
+
+    path = []
+    current = start
+
+    while field.get_cost(current) > 0.0:
+        steps = field.next_steps(current)
+        if not steps:
+            return None
+
+        current = steps[0]
+        path.append(current)
+
+    return path
+
+
+def group_move_benchmark(group_sizes=(4, 16, 64), width=260, span=5, seed=0):
+
+    """one A* search per agent against one shared flow field for a group order across a maze, in milliseconds.
+    the group starts in a block near one corner and the goals keep the same formation near the other
+    """
+
+    occupant_map = maze_occupant_map(width, houses=20, seed=seed)
+    blocked = pathfinding.footprint_blocked(occupant_map, 0, span)
+    finder = pathfinding.GridPathfinder(blocked, max_nodes=width * width)
+    results = []
+
+    for group_size in group_sizes:
+        per_row = int(math.ceil(math.sqrt(group_size)))
+        offsets = [((i // per_row) * (span + 2), (i % per_row) * (span + 2)) for i in range(group_size)]
+        starts = [finder.nearest_open((10 + x, 10 + y), radius=16) for x, y in offsets]
+        goals = [finder.nearest_open((width - 70 + x, width - 70 + y), radius=16) for x, y in offsets]
+
+        timer = time.perf_counter()
+        searched = [finder.find_path(start, goal) for start, goal in zip(starts, goals)]
+        search_time = (time.perf_counter() - timer) * 1000.0
+
+        timer = time.perf_counter()
+        field = pathfinding.FlowField(blocked, (0, 0), goals)
+        field_time = (time.perf_counter() - timer) * 1000.0
+
+        timer = time.perf_counter()
+        walked = [flow_walk(field, start) for start in starts]
+        walk_time = (time.perf_counter() - timer) * 1000.0
+
+        result = {"group_size": group_size,
+                  "search": search_time,
+                  "field": field_time,
+                  "walk": walk_time,
+                  "search_length": sum(pathfinding.path_length(start, path) for start, path in zip(starts, searched)),
+                  "walk_length": sum(pathfinding.path_length(start, path) for start, path in zip(starts, walked)
+                                     if path is not None)}
+
+        results.append(result)
+
+        print("{:>4} agents: A* per agent {:>10.3f}ms, flow field {:>10.3f}ms + {:>8.3f}ms walking".format(
+            group_size, search_time, field_time, walk_time))
+
+    return results
+
+
+def patrol_cache_benchmark(legs=8, vehicles=2, level_size=32, seed=0):
+
+    """AI vehicles patrolling the four waypoints, planning time per leg in milliseconds and path cache counters.
+    after the first lap every leg should come from the cache
+    """
+
+    import agents
+    import agent_actions
+
+    def starting_agents(manager):
+        agent_list = [(agents.VehicleAgent, (manager, (12 + (i * 8), 12), "primitive-tank", 1))
+                      for i in range(vehicles)]
+
+        for i in range(8):
+            agent_list.append((agents.TestHouse, (manager, (40 + (i % 4) * 50, 60 + (i // 4) * 90))))
+
+        return agent_list
+
+    runtime = headless.HeadlessRuntime(level_size=level_size, terrain="FLAT", seed=seed,
+                                       starting_agents=starting_agents, camera_position=(120, 120))
+    manager = runtime.manager
+    leader = [agent for agent in manager.agents if agent.agent_type == "VEHICLE"][0]
+
+    plan_time = [0.0]
+    plan = agent_actions.AgentPathPlanner.plan
+
+    def timed_plan(planner):
+        timer = time.perf_counter()
+        plan(planner)
+        plan_time[0] += time.perf_counter() - timer
+
+    agent_actions.AgentPathPlanner.plan = timed_plan
+    leg_results = []
+
+    try:
+        waypoint = leader.waypoint
+        leg_start = 0.0
+
+        while len(leg_results) < legs:
+            runtime.tick()
+
+            if leader.waypoint != waypoint:
+                waypoint = leader.waypoint
+                leg_results.append({"plan": (plan_time[0] - leg_start) * 1000.0,
+                                    "hits": manager.path_cache.hits,
+                                    "misses": manager.path_cache.misses,
+                                    "invalidated": manager.path_cache.invalidated})
+                leg_start = plan_time[0]
+
+                print("leg {:>3}: planning {:>9.3f}ms, hits {} misses {} invalidated {}".format(
+                    len(leg_results), leg_results[-1]["plan"], manager.path_cache.hits, manager.path_cache.misses,
+                    manager.path_cache.invalidated))
+
+    finally:
+        agent_actions.AgentPathPlanner.plan = plan
+
+    return leg_results
+
+
+def clearance_benchmark(sizes=(100, 500), rounds=3, seed=0):
+
+    """times the eight neighbour footprint checks of every vehicle, tile scans against the clearance map.
+    times are in milliseconds per round of all vehicles, refresh is the time to bring the map up to date
+    after every vehicle is stamped again. mismatches counts neighbours where the two checks disagree.
+    """
+
+    steps = [(1, 0), (1, 1), (0, 1), (1, -1), (-1, 0), (-1, 1), (0, -1), (-1, -1)]
+    results = []
+
+    for size in sizes:
+        level_size = scenario_level_size(size)
+        runtime = headless.HeadlessRuntime(level_size=level_size, seed=seed,
+                                           starting_agents=scenario_agents(size, seed=seed),
+                                           camera_position=(level_size * 4.0, level_size * 4.0))
+        manager = runtime.manager
+        clearance = manager.clearance
+        vehicles = [agent for agent in manager.agents if agent.agent_type in ("VEHICLE", "ARTILLERY")]
+        agent_ids = manager.tiles.registry.agent_ids
+
+        def scan():
+            return [not agent.check_occupied((agent.location[0] + step[0], agent.location[1] + step[1]))
+                    for agent in vehicles for step in steps]
+
+        def lookup():
+            found = []
+            for agent in vehicles:
+                free_steps = clearance.free_steps(agent.location, agent.get_footprint(), agent_ids.get(agent, 0))
+                found.extend(bool(free_steps[step[0] + 1, step[1] + 1]) for step in steps)
+
+            return found
+
+        manager.clearance = None
+        scanned = [timed(scan) for _ in range(rounds)]
+        scan_found = scan()
+        manager.clearance = clearance
+        looked_up = [timed(lookup) for _ in range(rounds)]
+
+        refreshed = []
+        for _ in range(rounds):
+            for agent in vehicles:
+                agent.clear_occupied()
+                agent.set_occupied()
+
+            refreshed.append(timed(clearance.refresh))
+
+        result = {"size": size, "vehicles": len(vehicles), "scan": min(scanned), "clearance": min(looked_up),
+                  "refresh": min(refreshed),
+                  "mismatches": sum(1 for scanned_free, free in zip(scan_found, lookup()) if scanned_free != free)}
+        results.append(result)
+
+        print("{:>6} agents: scan {:>9.3f}ms clearance {:>9.3f}ms refresh {:>9.3f}ms mismatches {}".format(
+            size, result["scan"], result["clearance"], result["refresh"], result["mismatches"]))
+
+    return results
+
+
+def movement_cost_benchmark(level_size=32, queries=20, span=5, seed=0):
+
+    """builds the movement cost grids, then plans paths with and without them.
+    route is the summed movement cost, time to drive, of the paths. times are in milliseconds
+    """
+
+    import movement_costs
+
+    runtime = headless.HeadlessRuntime(level_size=level_size, seed=seed, starting_agents=lambda manager: [])
+    manager = runtime.manager
+    tiles = manager.tiles
+    build = timed(movement_costs.MovementCosts, tiles)
+    costs = movement_costs.MovementCosts(tiles)
+
+    last = (level_size * 8) - span
+    blocked = pathfinding.block_outside(pathfinding.footprint_blocked(tiles.occupant_map(), 0, span), tiles.origin,
+                                        (0, 0), (last, last))
+    plain = pathfinding.GridPathfinder(blocked, tiles.origin, max_nodes=blocked.size)
+    starts = open_tiles(plain, queries, seed)
+    goals = open_tiles(plain, queries, seed + 1)
+
+    results = {"level_size": level_size, "build": build, "drive_types": {}}
+    print("build {:>8.3f}ms".format(build))
+
+    for drive_type in costs.drive_types:
+        footprint_costs = costs.get_costs(drive_type, span)
+        weighted = pathfinding.GridPathfinder(blocked, tiles.origin, max_nodes=blocked.size, costs=footprint_costs)
+        drive_results = {}
+
+        for name, finder in (("plain", plain), ("weighted", weighted)):
+            times = []
+            route = 0.0
+
+            for start, goal in zip(starts, goals):
+                timer = time.perf_counter()
+                path = finder.find_path(start, goal)
+                times.append((time.perf_counter() - timer) * 1000.0)
+
+                previous = start
+                for key in path:
+                    step = pathfinding.octile(key[0] - previous[0], key[1] - previous[1])
+                    route += step * footprint_costs[key[0] - tiles.origin[0], key[1] - tiles.origin[1]]
+                    previous = key
+
+            drive_results[name] = {"time": percentiles(times), "route": float(route)}
+
+        results["drive_types"][drive_type] = drive_results
+
+        print("{:<10} route plain {:>9.1f} weighted {:>9.1f}, search plain {:>8.3f}ms weighted {:>8.3f}ms".format(
+            drive_type, drive_results["plain"]["route"], drive_results["weighted"]["route"],
+            drive_results["plain"]["time"]["mean"], drive_results["weighted"]["time"]["mean"]))
+
+    return results
+
+
+def path_smoothing_benchmark(vehicles=4, level_size=32, max_ticks=20000, seed=0):
+
+    """vehicles driving across a map of houses with per tile steps and with string pulled segments.
+    counts the movement and turning actions made for each tile travelled, update time is in milliseconds
+    """
+
+    import agents
+    import agent_actions
+
+    def starting_agents(manager):
+        agent_list = [(agents.VehicleAgent, (manager, (12 + (i * 8), 12), "primitive-tank", 0))
+                      for i in range(vehicles)]
+
+        for i in range(12):
+            agent_list.append((agents.TestHouse, (manager, (60 + (i % 4) * 40, 40 + (i // 4) * 60))))
+
+        return agent_list
+
+    max_segment = agent_actions.AgentPathPlanner.max_segment
+    results = []
+
+    try:
+        for name, segment in (("per tile", 1), ("smoothed", max_segment)):
+            agent_actions.AgentPathPlanner.max_segment = segment
+
+            runtime = headless.HeadlessRuntime(level_size=level_size, terrain="FLAT", seed=seed,
+                                               starting_agents=starting_agents, camera_position=(120, 120))
+            manager = runtime.manager
+            movers = [agent for agent in manager.agents if agent.agent_type == "VEHICLE"]
+            runtime.order_move(movers, ((level_size * 8) - 30, (level_size * 8) - 30))
+
+            actions = {agent: None for agent in movers}
+            locations = {agent: agent.location for agent in movers}
+            moves = 0
+            turns = 0
+            tiles = 0
+            times = []
+
+            for tick in range(max_ticks):
+                timer = time.perf_counter()
+                runtime.tick()
+                times.append((time.perf_counter() - timer) * 1000.0)
+
+                for agent in movers:
+                    if agent.movement is not None and agent.movement is not actions[agent]:
+                        if isinstance(agent.movement, agent_actions.AgentTargeter):
+                            turns += 1
+                        else:
+                            moves += 1
+
+                    actions[agent] = agent.movement
+                    location = agent.location
+                    tiles += max(abs(location[0] - locations[agent][0]), abs(location[1] - locations[agent][1]))
+                    locations[agent] = location
+
+                if tick > 50 and all(not agent.movement and "Idle" in agent.state_name for agent in movers):
+                    break
+
+            result = {"mode": name, "ticks": tick, "tiles": tiles, "moves": moves, "turns": turns,
+                      "actions_per_tile": (moves + turns) / float(max(1, tiles)), "time": percentiles(times)}
+            results.append(result)
+
+            print("{:<9} {:>6} ticks, {:>5} tiles, {:>5} moves {:>4} turns, {:>6.3f} actions per tile, "
+                  "tick {:>7.3f}ms".format(name, tick, tiles, moves, turns, result["actions_per_tile"],
+                                           result["time"]["mean"]))
+
+    finally:
+        agent_actions.AgentPathPlanner.max_segment = max_segment
+
+    return results
+
+
+def stuck_benchmark(modes=("GREEDY", "ASTAR"), level_size=32, max_ticks=15000, seed=0):
+
+    """a tank and a squad ordered out the back of a cup of houses, which traps greedy walkers.
+    reports the ticks to arrive and the stuck counters, waits and the ticks lost to them, loops and escalations
+    """
+
+    import agents
+
+    def starting_agents(manager):
+        agent_list = [(agents.VehicleAgent, (manager, (58, 50), "primitive-tank", 0)),
+                      (agents.InfantrySquad, (manager, (62, 60), "squad", 0))]
+
+        for x in range(30, 100, 9):
+            agent_list.append((agents.TestHouse, (manager, (x, 84))))
+
+        for y in range(30, 84, 9):
+            agent_list.append((agents.TestHouse, (manager, (30, y))))
+            agent_list.append((agents.TestHouse, (manager, (93, y))))
+
+        return agent_list
+
+    results = []
+
+    for mode in modes:
+        runtime = headless.HeadlessRuntime(level_size=level_size, terrain="FLAT", seed=seed,
+                                           starting_agents=starting_agents, camera_position=(120, 120))
+        manager = runtime.manager
+        manager.pathfinding_mode = mode
+        movers = [agent for agent in manager.agents if agent.agent_type != "BUILDING"]
+        destination = (62, 150)
+        runtime.order_move(movers, destination)
+
+        for tick in range(max_ticks):
+            runtime.tick()
+
+            if tick > 50 and all(not agent.movement and "Idle" in agent.state_name for agent in movers):
+                break
+
+        arrived = sum(1 for agent in movers if max(abs(agent.location[0] - destination[0]),
+                                                   abs(agent.location[1] - destination[1])) < 8)
+
+        result = {"mode": mode, "ticks": tick, "arrived": arrived, "agents": len(movers)}
+        result.update(manager.stuck.report())
+        results.append(result)
+
+        print("{:<7} {:>6} ticks, {}/{} arrived, {:>3} waits ({:>5} ticks), {:>3} loops, {:>3} escalated, "
+              "{:>3} gave up".format(mode, tick, arrived, len(movers), result["waits"], result["wasted_ticks"],
+                                     result["loops"], result["escalated"], result["gave_up"]))
+
+    return results
+
+
+def occupancy_benchmark(spans=range(1, 10), rounds=2000, level_size=32, seed=0):
+
+    """stamp, clear and any occupied rates, in operations per second, for square footprints of each span.
+    per tile writes each tile through tiles[key].occupied as agents used to, only the combined array, rect goes
+    through the occupancy grid which keeps the layers and the dirty blocks too
+    """
+
+    import occupancy
+
+    class Stamper(object):
+        agent_type = "VEHICLE"
+
+    tiles = tile_grid.TileGrid(level_size)
+    grid = occupancy.OccupancyGrid(tiles)
+    agent = Stamper()
+    other = Stamper()
+    grid.stamp(other, (0, 0), (0, 0))
+
+    random.seed(seed)
+    last = (level_size * 8) - 10
+    corners = [(random.randint(0, last), random.randint(0, last)) for _ in range(rounds)]
+
+    def tile_stamp(low, high):
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                tiles[(x, y)].occupied = agent
+
+    def tile_clear(low, high):
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                tiles[(x, y)].occupied = None
+
+    def tile_any(low, high):
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                occupant = tiles[(x, y)].occupied
+                if occupant and occupant != agent:
+                    return True
+
+        return False
+
+    methods = {"tiles": (tile_stamp, tile_clear, tile_any),
+               "rect": (lambda low, high: grid.stamp(agent, low, high),
+                        lambda low, high: grid.clear(agent, low, high),
+                        lambda low, high: grid.rect_any(low, high, agent))}
+
+    results = []
+
+    for span in spans:
+        rects = [(corner, (corner[0] + span - 1, corner[1] + span - 1)) for corner in corners]
+        result = {"span": span}
+
+        for name, (stamp, clear, any_occupied) in methods.items():
+            for operation, method in (("stamp", stamp), ("clear", clear), ("any", any_occupied)):
+                timer = time.perf_counter()
+
+                for low, high in rects:
+                    method(low, high)
+
+                result["{}_{}".format(name, operation)] = rounds / max(1e-9, time.perf_counter() - timer)
+
+        results.append(result)
+
+        print("span {}: stamp {:>9.0f} / {:>9.0f}, clear {:>9.0f} / {:>9.0f}, any {:>9.0f} / {:>9.0f} per second, "
+              "per tile / rect".format(span, result["tiles_stamp"], result["rect_stamp"], result["tiles_clear"],
+                                       result["rect_clear"], result["tiles_any"], result["rect_any"]))
+
+    return results
+
+
+def footprint_step_benchmark(spans=range(4, 11), steps=5000, level_size=32, seed=0):
+
+    """a footprint random walking one tile at a time, cleared and stamped whole against move(), which clears the tiles
+    it leaves and stamps the new footprint in one slice.
+    tiles is the number of tiles written per step, rates are steps per second
+    """
+
+    import occupancy
+
+    class Stamper(object):
+        agent_type = "VEHICLE"
+
+    tiles = tile_grid.TileGrid(level_size)
+    grid = occupancy.OccupancyGrid(tiles)
+    agent = Stamper()
+    directions = [(1, 0), (1, 1), (0, 1), (1, -1), (-1, 0), (-1, 1), (0, -1), (-1, -1)]
+    results = []
+
+    for span in spans:
+        random.seed(seed)
+        corners = [(100, 100)]
+
+        for _ in range(steps):
+            dx, dy = random.choice(directions)
+            x, y = corners[-1]
+            corners.append((min(200, max(10, x + dx)), min(200, max(10, y + dy))))
+
+        moves = list(zip(corners[:-1], corners[1:]))
+        result = {"span": span}
+
+        timer = time.perf_counter()
+        for old, new in moves:
+            grid.clear(agent, old, (old[0] + span - 1, old[1] + span - 1))
+            grid.stamp(agent, new, (new[0] + span - 1, new[1] + span - 1))
+
+        result["whole"] = steps / (time.perf_counter() - timer)
+        result["whole_tiles"] = 2 * span * span
+        grid.clear(agent, corners[-1], (corners[-1][0] + span - 1, corners[-1][1] + span - 1))
+
+        grid.stamp(agent, corners[0], (corners[0][0] + span - 1, corners[0][1] + span - 1))
+        timer = time.perf_counter()
+        for old, new in moves:
+            grid.move(agent, old, new, span)
+
+        result["delta"] = steps / (time.perf_counter() - timer)
+        grid.clear(agent, corners[-1], (corners[-1][0] + span - 1, corners[-1][1] + span - 1))
+
+        written = 0
+        for old, new in moves:
+            leaving = occupancy.step_rects(span, new[0] - old[0], new[1] - old[1])[0]
+            for (x0, y0), (x1, y1) in leaving:
+                written += (x1 - x0 + 1) * (y1 - y0 + 1)
+
+            written += span * span
+
+        result["delta_tiles"] = written / float(steps)
+        results.append(result)
+
+        print("span {:>2}: whole {:>4} tiles {:>8.0f} steps/s, delta {:>5.1f} tiles {:>8.0f} steps/s".format(
+            span, result["whole_tiles"], result["whole"], result["delta_tiles"], result["delta"]))
+
+    return results
+
+
+def rect_query_benchmark(spans=(2, 5, 9, 16), queries=5000, level_size=32, agents=300, seed=0):
+
+    """counts the occupied tiles in square rectangles of each span, reading tiles one at a time, slicing the
+    array and from the summed area table. rates are queries per second, rebuild is the per tick table rebuild in ms
+    """
+
+    import occupancy
+
+    class Stamper(object):
+        agent_type = "VEHICLE"
+
+    tiles = tile_grid.TileGrid(level_size)
+    grid = occupancy.OccupancyGrid(tiles)
+    random.seed(seed)
+    last = (level_size * 8) - 10
+
+    for _ in range(agents):
+        corner = (random.randint(0, last), random.randint(0, last))
+        size = random.randint(1, 6)
+        grid.stamp(Stamper(), corner, (corner[0] + size - 1, corner[1] + size - 1))
+
+    rebuild = min(timed(grid.build_table, None) for _ in range(10))
+    last = (level_size * 8) - max(spans)
+    corners = [(random.randint(0, last), random.randint(0, last)) for _ in range(queries)]
+
+    def tile_count(low, high):
+        count = 0
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                if tiles[(x, y)].occupied:
+                    count += 1
+
+        return count
+
+    def slice_count(low, high):
+        return int(np.count_nonzero(grid.window(low, high)[0]))
+
+    results = {"rebuild": rebuild, "spans": []}
+    print("table rebuild {:>8.3f}ms".format(rebuild))
+
+    for span in spans:
+        rects = [(corner, (corner[0] + span - 1, corner[1] + span - 1)) for corner in corners]
+        result = {"span": span}
+
+        for name, method in (("tiles", tile_count), ("slice", slice_count), ("table", grid.rect_count)):
+            timer = time.perf_counter()
+            counts = [method(low, high) for low, high in rects]
+            result[name] = queries / (time.perf_counter() - timer)
+            result[name + "_total"] = sum(counts)
+
+        results["spans"].append(result)
+
+        print("span {:>2}: tiles {:>9.0f}, slice {:>9.0f}, table {:>9.0f} queries per second".format(
+            span, result["tiles"], result["slice"], result["table"]))
+
+    return results
+
+
+def layer_query_benchmark(queries=5000, radius=8, level_size=32, men=600, vehicles=100, seed=0):
+
+    """the vehicle check men make before each step, reading every occupied tile around them against the vehicle
+    layer alone, on a map crowded with men. rates are queries per second
+    """
+
+    import occupancy
+
+    class Man(object):
+        agent_type = "INFANTRY"
+
+    class Vehicle(object):
+        agent_type = "VEHICLE"
+
+    tiles = tile_grid.TileGrid(level_size)
+    grid = occupancy.OccupancyGrid(tiles)
+    random.seed(seed)
+    last = (level_size * 8) - 10
+
+    for _ in range(men):
+        tile = (random.randint(0, last), random.randint(0, last))
+        grid.stamp(Man(), tile, tile)
+
+    for _ in range(vehicles):
+        corner = (random.randint(0, last), random.randint(0, last))
+        grid.stamp(Vehicle(), corner, (corner[0] + 5, corner[1] + 5))
+
+    corners = [(random.randint(0, last), random.randint(0, last)) for _ in range(queries)]
+    rects = [(corner, (corner[0] + radius - 1, corner[1] + radius - 1)) for corner in corners]
+    results = {}
+
+    for name, layer in (("combined", None), ("vehicle", "VEHICLE")):
+        timer = time.perf_counter()
+        found = [grid.rect_agents(low, high, layer=layer) for low, high in rects if grid.rect_count(low, high, layer)]
+        results[name] = queries / (time.perf_counter() - timer)
+        results[name + "_hits"] = len(found)
+
+    print("combined {:>9.0f} ({} hits), vehicle layer {:>9.0f} ({} hits) queries per second".format(
+        results["combined"], results["combined_hits"], results["vehicle"], results["vehicle_hits"]))
+
+    return results
+
+
+def proximity_benchmark(queries=20000, reach=6, level_size=32, vehicles=100, moving=20, seed=0):
+
+    """the vehicle check men make before each step, searching the vehicle layer around them against one lookup in
+    the proximity field. rates are queries per second, update is the per tick cost of the field in ms with some of
+    the vehicles moving a tile
+    """
+
+    import occupancy
+
+    class Vehicle(object):
+        agent_type = "VEHICLE"
+
+    tiles = tile_grid.TileGrid(level_size)
+    grid = occupancy.OccupancyGrid(tiles)
+    proximity = grid.proximity
+    random.seed(seed)
+    last = (level_size * 8) - 10
+    corners = {}
+
+    for _ in range(vehicles):
+        vehicle = Vehicle()
+        corners[vehicle] = (random.randint(1, last), random.randint(1, last))
+        grid.stamp(vehicle, corners[vehicle], (corners[vehicle][0] + 5, corners[vehicle][1] + 5))
+
+    updates = []
+
+    for _ in range(20):
+        for vehicle in random.sample(list(corners), moving):
+            old = corners[vehicle]
+            corners[vehicle] = (min(last, max(1, old[0] + random.choice((-1, 0, 1)))), old[1])
+            grid.move(vehicle, old, corners[vehicle], 6)
+
+        updates.append(timed(proximity.update))
+
+    keys = [(random.randint(0, last), random.randint(0, last)) for _ in range(queries)]
+
+    def search(key):
+        low = (key[0] - reach, key[1] - reach)
+        high = (key[0] + reach, key[1] + reach)
+        if grid.rect_count(low, high, "VEHICLE"):
+            return grid.rect_agents(low, high, layer="VEHICLE")[0]
+
+    results = {"update": sum(updates) / len(updates)}
+
+    for name, method in (("search", search), ("field", lambda key: proximity.nearest(key, reach))):
+        timer = time.perf_counter()
+        found = [method(key) for key in keys]
+        results[name] = queries / (time.perf_counter() - timer)
+        results[name + "_hits"] = len([agent for agent in found if agent])
+
+    print("update {:>8.3f}ms, search {:>9.0f} ({} hits), field {:>9.0f} ({} hits) queries per second".format(
+        results["update"], results["search"], results["search_hits"], results["field"], results["field_hits"]))
+
+    return results
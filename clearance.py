@@ -0,0 +1,155 @@
+import numpy as np
+
+
+def summed_area(blocked):
+    table = np.zeros((blocked.shape[0] + 1, blocked.shape[1] + 1), dtype=np.int32)
+    table[1:, 1:] = blocked.cumsum(axis=0, dtype=np.int32).cumsum(axis=1, dtype=np.int32)
+
+    return table
+
+
+def square_sums(table, span, width, height):
+
+    """the number of blocked tiles in the span x span square anchored at each of the first width x height tiles"""
+
+    return (table[span:span + width, span:span + height] - table[:width, span:span + height] -
+            table[span:span + width, :height] + table[:width, :height])
+
+
+def square_clearance(blocked, width, height, cap):
+
+    """the side of the largest open square anchored at each of the first width x height tiles, up to cap.
+    blocked has to reach cap - 1 tiles past them.
+    """
+
+    table = summed_area(blocked)
+    clearance = np.zeros((width, height), dtype=np.int8)
+
+    for span in range(1, cap + 1):
+        open_squares = square_sums(table, span, width, height) == 0
+        if not open_squares.any():
+            break
+
+        clearance += open_squares
+
+    return clearance
+
+
+class ClearanceMap(object):
+
+    """the side of the largest free square anchored at each tile, growing toward +x and +y, up to max_clearance.
+
+    a footprint of span tiles fits at key if clearance[key] >= span, one lookup instead of span * span.
+    after tiles are stamped or cleared update(low, high) marks the blocks of anchors whose square can reach them,
+    a dirty block is recomputed the next time it is read, so men shuffling around a squad cost one refresh.
+    tiles off the map count as blocked.
+
+    free_steps() answers for an agent standing on its own footprint, its tiles are lifted for that query.
+    """
+
+    def __init__(self, tiles, max_clearance=12, block_size=16):
+
+        self.tiles = tiles
+        self.origin = tiles.origin
+        self.width = tiles.width
+        self.max_clearance = max_clearance
+        self.block_size = block_size
+        self.dirty = set()
+        self.refreshed = 0
+
+        padded = self.width + max_clearance - 1
+        self.clearance = square_clearance(self.get_blocked((0, 0), (padded, padded)), self.width, self.width,
+                                          max_clearance)
+
+    def get_blocked(self, low, high, agent_id=0):
+
+        """occupied tiles for array indices low to high, exclusive, padded with blocked tiles off the map.
+        tiles of agent_id are left open
+        """
+
+        blocked = np.ones((high[0] - low[0], high[1] - low[1]), dtype=np.bool_)
+
+        x0 = max(0, low[0])
+        y0 = max(0, low[1])
+        x1 = min(self.width, high[0])
+        y1 = min(self.width, high[1])
+
+        if x0 < x1 and y0 < y1:
+            occupants = self.tiles.occupant_map()[x0:x1, y0:y1]
+            if agent_id:
+                blocked[x0 - low[0]:x1 - low[0], y0 - low[1]:y1 - low[1]] = (occupants != 0) & (occupants != agent_id)
+            else:
+                blocked[x0 - low[0]:x1 - low[0], y0 - low[1]:y1 - low[1]] = occupants != 0
+
+        return blocked
+
+    def update(self, low, high):
+
+        """mark the anchors of the tile keys from low to high, inclusive, for a refresh"""
+
+        cap = self.max_clearance
+
+        x0 = max(0, low[0] - self.origin[0] - cap + 1)
+        y0 = max(0, low[1] - self.origin[1] - cap + 1)
+        x1 = min(self.width - 1, high[0] - self.origin[0])
+        y1 = min(self.width - 1, high[1] - self.origin[1])
+
+        for bx in range(x0 // self.block_size, (x1 // self.block_size) + 1):
+            for by in range(y0 // self.block_size, (y1 // self.block_size) + 1):
+                self.dirty.add((bx, by))
+
+    def refresh_block(self, block):
+
+        cap = self.max_clearance
+
+        x0 = block[0] * self.block_size
+        y0 = block[1] * self.block_size
+        x1 = min(self.width, x0 + self.block_size)
+        y1 = min(self.width, y0 + self.block_size)
+
+        blocked = self.get_blocked((x0, y0), (x1 + cap - 1, y1 + cap - 1))
+        self.clearance[x0:x1, y0:y1] = square_clearance(blocked, x1 - x0, y1 - y0, cap)
+        self.dirty.discard(block)
+        self.refreshed += 1
+
+    def refresh(self):
+
+        """bring the whole clearance array up to date, for code reading it directly"""
+
+        for block in list(self.dirty):
+            self.refresh_block(block)
+
+    def get_clearance(self, key):
+
+        x = key[0] - self.origin[0]
+        y = key[1] - self.origin[1]
+
+        if 0 <= x < self.width and 0 <= y < self.width:
+            if self.dirty:
+                block = (x // self.block_size, y // self.block_size)
+                if block in self.dirty:
+                    self.refresh_block(block)
+
+            return int(self.clearance[x, y])
+
+        return 0
+
+    def fits(self, key, span):
+
+        if span <= 1:
+            index = self.tiles.index(key)
+            return index is not None and not self.tiles.occupant[index]
+
+        return self.get_clearance(key) >= span
+
+    def free_steps(self, key, span, agent_id):
+
+        """3 x 3 array, True where a span footprint of agent_id standing at key could step to key + (dx, dy),
+        indexed [dx + 1, dy + 1]
+        """
+
+        x = key[0] - self.origin[0] - 1
+        y = key[1] - self.origin[1] - 1
+
+        blocked = self.get_blocked((x, y), (x + span + 2, y + span + 2), agent_id)
+        return square_sums(summed_area(blocked), span, 3, 3) == 0
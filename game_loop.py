@@ -9,12 +9,24 @@ import mathutils
 import game_states
 import particles
 import agents
+import agent_actions
+import clearance
 
 import terrain_generation
+import tile_grid
+import terrain_cache
+import terrain_raster
 import LOS
+import movement_costs
+import pathfinding
+import occupancy
+import path_service
 
 import game_input
 import camera_control
+import profiler
+import scheduler
+import spatial_index
 import time
 
 
@@ -79,8 +91,15 @@ class MovementAction(object):
 
     def finish(self):
 
+        flow_order = None
+        movement_markers = [marker for marker in self.movement_markers if not marker.icon.invalid_location]
+
+        if self.manager.group_flow_fields and len(movement_markers) > 1:
+            goals = [(int(round(marker.position[0])), int(round(marker.position[1]))) for marker in movement_markers]
+            flow_order = agent_actions.FlowOrder(self.manager, [marker.owner for marker in movement_markers], goals)
+
         for marker in self.movement_markers:
-            marker.release()
+            marker.release(flow_order)
 
 
 class MovementMarker(object):
@@ -98,7 +117,7 @@ class MovementMarker(object):
             self.position = position
         self.icon.set_position(self.position)
 
-    def release(self):
+    def release(self, flow_order=None):
         if not self.icon.invalid_location:
             if "alt" in self.manager.input.keys:
                 condition = "REVERSE"
@@ -108,16 +127,17 @@ class MovementMarker(object):
             if "control" in self.manager.input.keys:
                 self.owner.commands.append(bgeutils.AgentCommand("ROTATION_TARGET", position=self.position, condition=condition))
             elif "shift" in self.manager.input.keys:
-                self.owner.commands.append(bgeutils.AgentCommand("MOVEMENT_TARGET", position=self.position, additive=True, condition=condition))
+                self.owner.commands.append(bgeutils.AgentCommand("MOVEMENT_TARGET", position=self.position, additive=True, condition=condition, target=flow_order))
             else:
-                self.owner.commands.append(bgeutils.AgentCommand("MOVEMENT_TARGET", position=self.position, additive=False, condition=condition))
+                self.owner.commands.append(bgeutils.AgentCommand("MOVEMENT_TARGET", position=self.position, additive=False, condition=condition, target=flow_order))
         self.icon.released = True
 
 
 class GameLoop(object):
     def __init__(self, cont):
         self.debug = False
-        self.console = True
+        # F12 shows the debug console, the profiler only runs while it's showing
+        self.console = False
         self.cont = cont
         self.own = cont.owner
         self.scene = cont.owner.scene
@@ -134,12 +154,47 @@ class GameLoop(object):
         self.selected_agents = []
 
         self.level_size = 64
+        # RAY surveys each tile with a physics ray, MESH rasterizes the ground mesh (use for level_size 128+)
+        self.heightfield_mode = "RAY"
+        # for very large maps, survey tiles in chunks the first time they are used and drop unused chunks
+        self.chunked_tiles = False
+        self.tile_chunk_size = 32
+        self.tile_memory_cap = 64 * 1024 * 1024
+        self.terrain_key = None
+        self.ground_mesh = None
         self.terrain = None
-        self.tiles = {}
+        self.tiles = None
+        self.heightfield_cache = terrain_cache.HeightfieldCache(bge.logic.expandPath("//cache/"))
 
         self.dynamic_lights = [ob for ob in self.scene.objects if ob.get("dynamic_light")]
         self.lights = []
         self.agents = []
+        # target searches and path decisions share a per tick budget in milliseconds
+        self.scheduler = scheduler.AgentScheduler(budget=2.0)
+        self.spatial_index = spatial_index.SpatialHash(cell_size=32.0)
+        # ASTAR plans whole paths around footprints, JPS plans the same paths with jump point search,
+        # HPA also routes orders longer than hierarchy_distance over a graph of cluster_size tile clusters,
+        # GREEDY steps toward the destination one tile at a time
+        self.pathfinding_mode = "HPA"
+        self.hierarchy_distance = 64
+        self.cluster_size = 16
+        self.cluster_graphs = {}
+        # group move orders share one flow field per footprint size instead of a search per agent
+        self.group_flow_fields = True
+        self.path_cache = pathfinding.PathCache(region_size=16, capacity=256)
+        # how often agents wait on blocked steps, walk in circles or give up, and the ticks it costs them
+        self.stuck = pathfinding.StuckCounter()
+        # agent ids per tile, footprints are stamped, cleared and checked a rectangle at a time.
+        # occupancy.proximity has the distance from each tile to the nearest vehicle, None for chunked tiles
+        self.occupancy = None
+        # free square sizes for footprint checks, kept up to date by occupancy_changed(), None for chunked tiles
+        self.clearance = None
+        # per drive type terrain cost grids, vehicle planners prefer roads and gentle slopes, None for chunked tiles
+        self.movement_costs = None
+        # searches run on worker threads from a copy of the grid, the agent waits for the result
+        self.path_service = path_service.PathService(workers=2)
+        # blender keeps the same python running between games, the worker threads are stopped with the scene
+        self.scene.onRemove.append(self.end_game)
         self.waypoints = None
         self.particles = []
         self.LOS_manager = None
@@ -152,6 +207,17 @@ class GameLoop(object):
         self.mouse_over_unit = None
 
         self.debug_timer = {}
+        # the shared profiler, only collects while the console is showing
+        self.profiler = profiler.PROFILER
+        self.profiler.enabled = False
+
+        # start up is spread over frames, each frame gets start_up_budget milliseconds
+        self.launch_time = time.perf_counter()
+        self.start_up_budget = 12.0
+        self.start_up_pipeline = None
+        self.spawn_batch_size = 4
+        self.loading_progress = 0.0
+        self.loaded = False
 
         self.state_name = None
         self.state = game_states.PrepGame(self)
@@ -171,46 +237,121 @@ class GameLoop(object):
         self.terrain = terrain_generation.TerrainGeneration(self, ground_object)
         self.LOS_manager = LOS.VisionPaint(self)
 
+    def survey_tiles(self, tiles, rows=None):
+
+        if rows is None:
+            keys = tiles.keys()
+        else:
+            keys = [(x, y) for x in rows for y in tiles.key_range()]
+
+        for x, y in keys:
+            point = mathutils.Vector([x, y, 0.0])
+            ray = bgeutils.ground_ray(self.own, survey_point=point)
+
+            if ray:
+                tiles.set_tile((x, y), ray[1].z + 0.5, ray[2], False, ray[0])
+
+    def survey_chunk(self, chunk):
+
+        chunk.ground_object = self.terrain.ground_object
+        chunk_key = terrain_cache.make_key(self.terrain_key, chunk.coords, chunk.width)
+
+        if not self.heightfield_cache.load_heights(chunk, chunk_key):
+            if self.heightfield_mode == "MESH":
+                terrain_raster.rasterize_triangles(chunk, *self.ground_mesh)
+            else:
+                self.survey_tiles(chunk)
+
+            self.heightfield_cache.save_heights(chunk, chunk_key)
+
+        chunk.set_off_road(self.terrain.field)
+
     def get_tiles(self):
+        for _ in self.get_tiles_steps():
+            pass
 
-        for x in range(-2, (self.level_size * 8) + 2):
-            for y in range(-2, (self.level_size * 8) +2):
-                point = mathutils.Vector([x, y, 0.0])
-                ray = bgeutils.ground_ray(self.own, survey_point=point)
+    def get_tiles_steps(self):
 
-                if ray:
-                    ray[1].z += 0.5
-                    tile = bgeutils.TerrainTile(*ray)
-                    terrain = self.terrain.field.get(bgeutils.get_terrain_position((x, y)), 2)
-                    tile.off_road = not bool(terrain)
-                else:
-                    tile = bgeutils.TerrainTile(None, point, mathutils.Vector([0.0, 0.0, 1.0]))
+        """builds the tile grid, yielding the fraction done after each surveyed row"""
 
-                self.tiles[(x, y)] = tile
+        self.terrain_key = self.heightfield_cache.terrain_key(self.terrain.ground_object, self.level_size,
+                                                             self.heightfield_mode)
 
-    def start_up(self):
+        if self.chunked_tiles:
+            if self.heightfield_mode == "MESH":
+                self.ground_mesh = terrain_raster.get_mesh_triangles(self.terrain.ground_object)
 
-        # temporary, later get heights from level generation (maybe)
-        self.get_tiles()
+            self.tiles = tile_grid.ChunkedTileGrid(self.level_size, self.survey_chunk,
+                                                   chunk_size=self.tile_chunk_size, memory_cap=self.tile_memory_cap)
+            self.occupancy = occupancy.TileOccupancy(self.tiles)
+            yield 1.0
+            return
 
-        self.LOS_manager.do_paint()
-        self.waypoints = bgeutils.Waypoints(self)
+        self.tiles = tile_grid.TileGrid(self.level_size)
+        self.tiles.ground_object = self.terrain.ground_object
+        self.occupancy = occupancy.OccupancyGrid(self.tiles)
+        self.clearance = clearance.ClearanceMap(self.tiles)
+
+        if not self.heightfield_cache.load_heights(self.tiles, self.terrain_key):
+            if self.heightfield_mode == "MESH":
+                terrain_raster.rasterize_ground(self.tiles, self.terrain.ground_object)
+            else:
+                rows = self.tiles.key_range()
+                for i, x in enumerate(rows):
+                    self.survey_tiles(self.tiles, rows=[x])
+                    yield (i + 1) / len(rows)
+
+            self.heightfield_cache.save_heights(self.tiles, self.terrain_key)
+
+        self.tiles.set_off_road(self.terrain.field)
+
+        self.movement_costs = movement_costs.MovementCosts(self.tiles)
+
+        yield 1.0
+
+    def occupancy_changed(self, low, high):
+
+        """call after stamping or clearing the tile keys from low to high, inclusive"""
+
+        self.path_cache.mark_dirty(low, high)
+
+        if self.clearance:
+            self.clearance.update(low, high)
+
+    def release_agent(self, agent):
+
+        """frees the tiles and occupancy id of an agent that has ended, so the id can go to a new agent"""
+
+        held = self.occupancy.release(agent)
+
+        if held:
+            self.occupancy_changed(*held)
+
+    def get_starting_agents(self):
+
+        starting_agents = []
 
         for i in range(2):
-            agents.VehicleAgent(self, (180, 120 + (i * 10)), "primitive-tank", 0)
+            starting_agents.append((agents.VehicleAgent, (self, (180, 120 + (i * 10)), "primitive-tank", 0)))
 
         squads = ["mg", "squad", "officer", "engineer", "squad", "anti-tank"]
 
         for i in range(5):
-            agents.InfantrySquad(self, (150, 90 + (i * 10)), squads[i], 0)
+            starting_agents.append((agents.InfantrySquad, (self, (150, 90 + (i * 10)), squads[i], 0)))
 
-        #agents.Artillery(self, (80, 130), "light gun", 0)
+        #starting_agents.append((agents.Artillery, (self, (80, 130), "light gun", 0)))
 
-        agents.InfantrySquad(self, (180, 90), "squad", 1)
+        starting_agents.append((agents.InfantrySquad, (self, (180, 90), "squad", 1)))
 
-        agents.TestHouse(self, (105, 88))
-        agents.TestHouse(self, (156, 66))
-        agents.TestHouse(self, (128, 55))
+        starting_agents.append((agents.TestHouse, (self, (105, 88))))
+        starting_agents.append((agents.TestHouse, (self, (156, 66))))
+        starting_agents.append((agents.TestHouse, (self, (128, 55))))
+
+        return starting_agents
+
+    def start_up_steps(self):
+
+        """start up as a resumable pipeline, yields (step name, fraction of step done) after each slice of work"""
 
         bge.logic.globalDict['volume'] = 1.0
         bge.logic.globalDict['dirt'] = {True: ["particle_dust", [0.25, 0.18, 0.1, 2.0], 1.5],
@@ -218,12 +359,78 @@ class GameLoop(object):
 
         bge.logic.globalDict['tracks'] = [0.04, 0.027, 0.013, 3.0]
 
+        # temporary, later get heights from level generation (maybe)
+        for progress in self.get_tiles_steps():
+            yield "survey", progress
+
+        self.waypoints = bgeutils.Waypoints(self)
+        yield "waypoints", 1.0
+
+        starting_agents = self.get_starting_agents()
+        batch_size = self.spawn_batch_size
+
+        for i in range(0, len(starting_agents), batch_size):
+            for agent_class, arguments in starting_agents[i:i + batch_size]:
+                agent_class(*arguments)
+
+            yield "agents", min(1.0, (i + batch_size) / len(starting_agents))
+
+        self.LOS_manager.do_paint()
+        yield "vision", 1.0
+
+    def start_up(self):
+        for _ in self.start_up_steps():
+            pass
+
+    def start_up_step(self):
+
+        """runs start up steps until the frame budget is used, then hands back to the engine"""
+
+        if not self.start_up_pipeline:
+            self.start_up_pipeline = self.start_up_steps()
+
+        step_names = ["survey", "waypoints", "agents", "vision"]
+        budget = self.start_up_budget / 1000.0
+        timer = time.perf_counter()
+
+        while time.perf_counter() - timer < budget:
+            try:
+                step_name, progress = next(self.start_up_pipeline)
+            except StopIteration:
+                self.start_up_pipeline = None
+                self.loaded = True
+                self.loading_progress = 1.0
+                self.debug_message = ""
+                return
+
+            self.loading_progress = (step_names.index(step_name) + progress) / len(step_names)
+            self.debug_message = "loading {}: {}%".format(step_name, int(self.loading_progress * 100))
+
+    def first_interactive_frame(self):
+
+        time_string = str(round((time.perf_counter() - self.launch_time) * 1000, 3))
+        self.debug_timer["first_interactive_frame"] = "{:<30}:{:>12}ms (DONE)".format("first_interactive_frame",
+                                                                                      time_string)
+
+    def toggle_console(self):
+        self.console = not self.console
+        self.profiler.enabled = self.console
+
+        if not self.console:
+            self.profiler.clear()
+
+    def end_game(self, scene=None):
+        self.path_service.shutdown()
+
     def general_control(self):
 
         if self.input:
             self.input.update()
         if self.camera:
             self.camera.update()
+        if self.chunked_tiles and self.tiles:
+            self.tiles.tick()
+            self.tiles.touch_area(self.camera.camera_hook.worldPosition, self.tile_chunk_size * 2)
         if self.LOS_manager:
             self.LOS_manager.update()
 
@@ -236,26 +443,21 @@ class GameLoop(object):
                         "get_cursor_location": self.get_cursor_location,
                         "general_control": self.general_control,
                         "start_up": self.start_up,
+                        "start_up_step": self.start_up_step,
                         "prep_level": self.prep_level,
                         "agent_commands": self.agent_commands,
                         "process_UI_orders": self.process_UI_orders,
                         "main_state_machine": self.main_state_machine}
 
         if method_name in loop_methods:
-            timer = time.clock()
-            loop_methods[method_name]()
+            timer = time.perf_counter()
 
-            timer = time.clock() - timer
+            with self.profiler.scope(method_name):
+                loop_methods[method_name]()
 
             if one_time:
-                finished = "(DONE)"
-            else:
-                finished = ""
-
-            method_string = method_name
-
-            time_string = str(round(timer * 1000, 3))
-            self.debug_timer[method_name] = "{:<30}:{:>12}ms {}".format(method_string, time_string, finished)
+                time_string = str(round((time.perf_counter() - timer) * 1000, 3))
+                self.debug_timer[method_name] = "{:<30}:{:>12}ms (DONE)".format(method_name, time_string)
 
         else:
             print("not method called [{}] on game loop".format(method_name))
@@ -263,6 +465,7 @@ class GameLoop(object):
     def update(self):
 
         self.profile("main_state_machine")
+        self.profiler.end_frame()
 
     def main_state_machine(self):
         self.state.update()
@@ -355,14 +558,23 @@ class GameLoop(object):
 
     def agents_update(self):
 
+        if self.occupancy:
+            self.occupancy.tick()
+
         next_gen_agents = []
         for agent in self.agents:
             if not agent.ended:
                 next_gen_agents.append(agent)
                 agent.update()
+            else:
+                self.spatial_index.remove(agent)
+                self.release_agent(agent)
 
         self.agents = next_gen_agents
 
+        with self.profiler.scope("agent_scheduler"):
+            self.scheduler.update()
+
     def particle_update(self):
         next_generation = []
         self.lights = []
@@ -427,6 +639,9 @@ class GameLoop(object):
 
         ox, oy = self.tile_over
 
+        if not self.occupancy.rect_count((ox - half, oy - half), (ox - half + radius - 1, oy - half + radius - 1)):
+            return False
+
         for x in range(radius):
             for y in range(radius):
                 check_key = (ox + (x-half), oy + (y-half))
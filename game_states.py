@@ -43,14 +43,17 @@ class StartUp(GameState):
         super().__init__(manager)
 
         """
-        load map and agents here
+        load map and agents here, start up is spread over several frames
+        so the window keeps drawing and the UI can show loading progress
         """
-        self.manager.profile("start_up", one_time=True)
 
     def update(self):
         super().update()
 
-        self.transition_state = RunningState
+        self.manager.profile("start_up_step")
+
+        if self.manager.loaded:
+            self.transition_state = RunningState
 
 
 class ActiveState(GameState):
@@ -66,6 +69,9 @@ class ActiveState(GameState):
         if "pause" in self.manager.input.keys:
             self.manager.paused = not self.manager.paused
 
+        if "debug" in self.manager.input.keys:
+            self.manager.toggle_console()
+
         self.manager.profile("general_control")
 
 
@@ -74,6 +80,7 @@ class RunningState(ActiveState):
         super().__init__(manager)
 
         self.timer = 1.1
+        self.first_frame = True
 
     def update(self):
         super().update()
@@ -86,11 +93,16 @@ class RunningState(ActiveState):
         self.manager.profile("particle_update")
         self.manager.profile("particle_light_update")
 
+        if self.first_frame:
+            self.first_frame = False
+            self.manager.first_interactive_frame()
+
         if self.manager.console:
             if self.timer > 1.0:
                 self.timer = 0.0
                 timer = self.manager.debug_timer
-                times = [timer[key] for key in timer]
+                times = self.manager.profiler.report_lines()
+                times.extend(timer[key] for key in timer)
                 times.append("number of particles:{}".format(str(len(self.manager.particles))))
                 self.manager.debug_message = "\n".join(times)
             else:
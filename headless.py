@@ -0,0 +1,218 @@
+"""runs the game loop outside blender for profiling and regression runs.
+
+install() puts the bge and mathutils stand ins in sys.modules, it has to run before any game module is imported.
+HeadlessRuntime builds a GameLoop on a synthetic flat or noise heightfield and ticks
+agent_commands, agents_update, particle_update and particle_light_update the same way RunningState does.
+"""
+
+import math
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import headless_bge
+import headless_mathutils
+
+# chassis_size, turret_size, drive_type, speed, handling, weight
+TEST_VEHICLES = {"primitive-tank": (2, 1, "TRACKED", [22, 14], [4, 3], 9),
+                 "armored-car": (1, 1, "WHEELED", [40, 10], [6, 2], 5),
+                 "light gun": (2, 0, "WHEELED", [10, 5], [2, 1], 4)}
+
+
+def install(root_path=None):
+
+    """root_path stands in for the blend file directory, "//" paths expand in to it.
+    game modules keep the bge module they imported, so installing again reuses the first stand ins
+    """
+
+    installed = sys.modules.get("bge")
+    if getattr(installed, "headless", False):
+        installed.logic.globalDict.clear()
+        return installed
+
+    if not root_path:
+        root_path = tempfile.mkdtemp(prefix="vinland_headless_")
+
+    modules = headless_bge.make_bge_modules(root_path)
+    modules["mathutils"] = headless_mathutils
+    sys.modules.update(modules)
+
+    return modules["bge"]
+
+
+def load_test_vehicle(load_name):
+
+    """stands in for vehicle_stats.load_vehicle, which needs the saved vehicles file from the builder"""
+
+    import vehicle_stats
+
+    chassis_size, turret_size, drive_type, speed, handling, weight = TEST_VEHICLES.get(load_name,
+                                                                                        TEST_VEHICLES["primitive-tank"])
+
+    stats = vehicle_stats.VehicleStats(chassis_size, turret_size, {}, 1)
+    stats.drive_type = drive_type
+    stats.speed = list(speed)
+    stats.handling = list(handling)
+    stats.weight = weight
+
+    return stats
+
+
+class SyntheticTerrain(object):
+
+    """a quad grid ground mesh with one vertex every spacing tiles, FLAT or NOISE.
+    ray casts return the exact height of the mesh triangles so ray and mesh surveys agree
+    """
+
+    def __init__(self, level_size, mode="NOISE", spacing=8.0, amplitude=2.0, seed=0, margin=8.0):
+
+        self.level_size = level_size
+        self.spacing = spacing
+        self.low = -margin
+        self.high = (level_size * 8.0) + margin
+
+        count = int(math.ceil((self.high - self.low) / spacing)) + 1
+        self.count = count
+
+        if mode == "FLAT":
+            self.heights = np.zeros((count, count))
+        else:
+            self.heights = np.random.RandomState(seed).uniform(-amplitude, amplitude, (count, count))
+
+        vertices = [(self.low + (x * spacing), self.low + (y * spacing), self.heights[x, y])
+                    for x in range(count) for y in range(count)]
+
+        polygons = []
+        for x in range(count - 1):
+            for y in range(count - 1):
+                corner = (x * count) + y
+                polygons.append([corner, corner + count, corner + count + 1, corner + 1])
+
+        self.mesh = headless_bge.HeadlessMesh("synthetic_terrain_{}_{}".format(mode.lower(), seed), vertices,
+                                              polygons)
+
+    def surface(self, x, y):
+
+        """height and up facing normal at a point, quads are split along the same diagonal as terrain_raster"""
+
+        if not (self.low <= x <= self.high and self.low <= y <= self.high):
+            return None
+
+        gx = min(self.count - 2, int((x - self.low) // self.spacing))
+        gy = min(self.count - 2, int((y - self.low) // self.spacing))
+        u = ((x - self.low) / self.spacing) - gx
+        v = ((y - self.low) / self.spacing) - gy
+
+        h00 = self.heights[gx, gy]
+        h10 = self.heights[gx + 1, gy]
+        h11 = self.heights[gx + 1, gy + 1]
+        h01 = self.heights[gx, gy + 1]
+
+        if u >= v:
+            dx = h10 - h00
+            dy = h11 - h10
+        else:
+            dx = h11 - h01
+            dy = h01 - h00
+
+        height = h00 + (u * dx) + (v * dy)
+        normal = headless_mathutils.Vector([-dx / self.spacing, -dy / self.spacing, 1.0]).normalized()
+
+        return height, normal
+
+    def ray_cast(self, start, end):
+
+        hit = self.surface(end[0], end[1])
+        if not hit:
+            return None
+
+        height, normal = hit
+        return headless_mathutils.Vector([end[0], end[1], height]), normal
+
+
+class HeadlessController(object):
+    def __init__(self, owner):
+        self.owner = owner
+
+
+class HeadlessRuntime(object):
+
+    """a started up GameLoop on synthetic terrain, call run(ticks) and read timings[phase] in milliseconds.
+
+    starting_agents(manager) can replace GameLoop.get_starting_agents, returning (agent_class, arguments) pairs.
+    """
+
+    phases = ["agent_commands", "agents_update", "particle_update", "particle_light_update"]
+
+    def __init__(self, level_size=32, terrain="NOISE", seed=0, starting_agents=None, root_path=None,
+                 camera_position=(160.0, 100.0)):
+
+        install(root_path)
+        random.seed(seed)
+
+        import game_loop
+        import vehicle_stats
+
+        vehicle_stats.load_vehicle = load_test_vehicle
+
+        self.terrain = SyntheticTerrain(level_size, terrain, seed=seed)
+        self.scene = headless_bge.HeadlessScene(self.terrain)
+        self.scene.camera_hook.worldPosition = [camera_position[0], camera_position[1], 0.0]
+
+        self.manager = game_loop.GameLoop(HeadlessController(self.scene.own))
+        self.manager.level_size = level_size
+        self.manager.heightfield_mode = "MESH"
+
+        if starting_agents:
+            self.manager.get_starting_agents = lambda: starting_agents(self.manager)
+
+        self.start_up_time = time.perf_counter()
+        self.manager.start_up()
+        self.start_up_time = (time.perf_counter() - self.start_up_time) * 1000.0
+
+        self.ticks = 0
+        self.timings = {phase: [] for phase in self.phases}
+
+    def tick(self):
+
+        for phase in self.phases:
+            method = getattr(self.manager, phase)
+
+            timer = time.perf_counter()
+            with self.manager.profiler.scope(phase):
+                method()
+            self.timings[phase].append((time.perf_counter() - timer) * 1000.0)
+
+        self.manager.profiler.end_frame()
+        self.ticks += 1
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.tick()
+
+    def close(self):
+        self.scene.remove()
+
+    def order_move(self, agents, destination):
+
+        import bgeutils
+
+        for agent in agents:
+            agent.commands.append(bgeutils.AgentCommand("MOVEMENT_TARGET", position=destination))
+
+
+if __name__ == "__main__":
+
+    runtime = HeadlessRuntime()
+    print("start up: {}ms, {} agents".format(round(runtime.start_up_time, 3), len(runtime.manager.agents)))
+
+    runtime.run(120)
+
+    for phase_name in runtime.phases:
+        times = runtime.timings[phase_name]
+        print("{:<30}:{:>12}ms".format(phase_name, str(round(sum(times) / len(times), 3))))
+
+    print("number of particles:{}".format(len(runtime.manager.particles)))
@@ -0,0 +1,519 @@
+"""stand ins for the bge scene, game objects, ray casts and camera so the simulation can run outside blender"""
+
+import collections
+import math
+import os
+import types
+
+from headless_mathutils import Vector, Matrix, Euler
+
+
+# child objects added along with an object, matched by name prefix, each child is (name, properties, children)
+OBJECT_TEMPLATES = {"agent": [("hull", {"hull": True}, [("agent_hook", {"agent_hook": True}, [])])],
+                    "message_text": [("message_text_object", {"Text": ""}, [])],
+                    "v_chassis": [("turret_adder", {"turret": True}, []),
+                                  ("trail_left", {"trail": True}, []),
+                                  ("trail_right", {"trail": True}, []),
+                                  ("front_wheels", {"wheels": True}, []),
+                                  ("back_wheels", {"wheels": True}, [])],
+                    "light_machine_gun": [("crew_left", {"crew": True}, []),
+                                          ("crew_right", {"crew": True}, []),
+                                          ("gun_turret", {"turret": True}, [])]}
+
+
+def get_template(name):
+    for prefix in OBJECT_TEMPLATES:
+        if name.startswith(prefix):
+            return OBJECT_TEMPLATES[prefix]
+
+    return []
+
+
+class HeadlessObject(object):
+
+    def __init__(self, scene, name, properties=None, position=None):
+
+        self.scene = scene
+        self.name = name
+        self.properties = dict(properties or {})
+        self.invalid = False
+
+        self._position = Vector(position or (0.0, 0.0, 0.0))
+        self._last_position = self._position.copy()
+        self._orientation = Matrix.Identity(3)
+        self._scale = Vector((1.0, 1.0, 1.0))
+
+        self.parent = None
+        self.children = []
+        self.meshes = []
+        self._color = [1.0, 1.0, 1.0, 1.0]
+        self.visible = True
+
+        self.energy = 0.0
+        self.distance = 0.0
+        self.spotsize = 0.0
+
+    def __repr__(self):
+        return "HeadlessObject({})".format(self.name)
+
+    def get(self, key, default=None):
+        return self.properties.get(key, default)
+
+    def __getitem__(self, key):
+        return self.properties[key]
+
+    def __setitem__(self, key, value):
+        self.properties[key] = value
+
+    def __contains__(self, key):
+        return key in self.properties
+
+    @property
+    def childrenRecursive(self):
+        children = []
+        for child in self.children:
+            children.append(child)
+            children.extend(child.childrenRecursive)
+        return children
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        self._color = list(color)
+
+    @property
+    def worldPosition(self):
+        return self._position
+
+    @worldPosition.setter
+    def worldPosition(self, position):
+
+        """children follow their parent's position but not its rotation,
+        the returned vector can be edited in place like the real one, children catch up on the next set
+        """
+
+        position = Vector(position).to_3d()
+        delta = position - self._last_position
+
+        self._position = position
+        self._last_position = position.copy()
+
+        if delta.length_squared > 0.0:
+            for child in self.children:
+                child.worldPosition = child.worldPosition + delta
+
+    @property
+    def worldOrientation(self):
+        return self._orientation
+
+    @worldOrientation.setter
+    def worldOrientation(self, orientation):
+        if isinstance(orientation, Euler):
+            orientation = orientation.to_matrix()
+        self._orientation = Matrix(orientation).to_3x3()
+
+    @property
+    def localScale(self):
+        return self._scale
+
+    @localScale.setter
+    def localScale(self, scale):
+        self._scale = Vector(scale).to_3d()
+
+    @property
+    def worldTransform(self):
+        matrix = self._orientation.to_4x4()
+        for r in range(3):
+            for c in range(3):
+                matrix.rows[r][c] *= self._scale[c]
+        matrix.translation = self._position
+        return matrix
+
+    @worldTransform.setter
+    def worldTransform(self, matrix):
+        self._position = matrix.translation
+        self._orientation = matrix.to_3x3().orthonormalized()
+
+    @property
+    def localTransform(self):
+        matrix = self._orientation.to_4x4()
+        matrix.translation = self.localPosition
+        return matrix
+
+    @localTransform.setter
+    def localTransform(self, matrix):
+        self.localPosition = matrix.translation
+        self._orientation = matrix.to_3x3().orthonormalized()
+
+    @property
+    def localPosition(self):
+        if self.parent:
+            return self._position - self.parent.worldPosition
+        return self._position
+
+    @localPosition.setter
+    def localPosition(self, position):
+        if self.parent:
+            position = self.parent.worldPosition + Vector(position).to_3d()
+        self.worldPosition = position
+
+    localOrientation = worldOrientation
+
+    def setParent(self, parent, compound=True, ghost=True):
+        self.removeParent()
+        if parent:
+            self.parent = parent
+            parent.children.append(self)
+
+    def removeParent(self):
+        if self.parent and self in self.parent.children:
+            self.parent.children.remove(self)
+        self.parent = None
+
+    def endObject(self):
+        for child in list(self.children):
+            child.endObject()
+
+        self.removeParent()
+        self.invalid = True
+        self.scene.remove_object(self)
+
+    def replaceMesh(self, mesh, use_display=True, use_physics=False):
+        self.properties["mesh_name"] = mesh
+
+    def getAxisVect(self, vector):
+        return self._orientation * Vector(vector).to_3d()
+
+    def alignAxisToVect(self, vector, axis=2, factor=1.0):
+
+        target = Vector(vector).to_3d()
+        if target.length == 0.0:
+            return
+
+        current = self._orientation.column(axis).normalized()
+        target = current.lerp(target.normalized(), factor)
+        if target.length == 0.0:
+            return
+
+        self._orientation = rotation_between(current, target.normalized()) * self._orientation
+
+    def applyRotation(self, rotation, local=False):
+        matrix = Euler(rotation).to_matrix()
+        if local:
+            self._orientation = self._orientation * matrix
+        else:
+            self._orientation = matrix * self._orientation
+
+    def getDistanceTo(self, other):
+        if isinstance(other, HeadlessObject):
+            other = other.worldPosition
+        return (self._position - Vector(other).to_3d()).length
+
+    def rayCast(self, to_point, from_point=None, distance=0.0, prop="", face=0, xray=0, poly=0):
+
+        if isinstance(to_point, HeadlessObject):
+            to_point = to_point.worldPosition
+        if from_point is None:
+            from_point = self.worldPosition
+        elif isinstance(from_point, HeadlessObject):
+            from_point = from_point.worldPosition
+
+        return self.scene.ray_cast(Vector(from_point).to_3d(), Vector(to_point).to_3d(), prop)
+
+
+class HeadlessCamera(HeadlessObject):
+
+    """an orthographic frustum over the camera hook, view_radius tiles each way"""
+
+    INSIDE = 0
+    INTERSECT = 1
+    OUTSIDE = 2
+
+    def __init__(self, scene, name, view_radius=48.0):
+        super().__init__(scene, name, {"camera": True})
+        self.view_radius = view_radius
+
+    def view_center(self):
+        hook = self.scene.camera_hook
+        if hook:
+            return hook.worldPosition.to_2d()
+        return self.worldPosition.to_2d()
+
+    def getScreenPosition(self, game_object):
+        if isinstance(game_object, HeadlessObject):
+            position = game_object.worldPosition
+        else:
+            position = Vector(game_object)
+
+        center = self.view_center()
+        size = self.view_radius * 2.0
+        x = ((position[0] - center[0]) / size) + 0.5
+        y = 0.5 - ((position[1] - center[1]) / size)
+        return [x, y]
+
+    def getScreenVect(self, x, y):
+        return Vector([0.0, 0.0, 1.0])
+
+    def pointInsideFrustum(self, point):
+        center = self.view_center()
+        return abs(point[0] - center[0]) <= self.view_radius and abs(point[1] - center[1]) <= self.view_radius
+
+    def sphereInsideFrustum(self, center, radius):
+        view = self.view_center()
+        distance = max(abs(center[0] - view[0]), abs(center[1] - view[1]))
+
+        if distance + radius <= self.view_radius:
+            return self.INSIDE
+        if distance - radius <= self.view_radius:
+            return self.INTERSECT
+        return self.OUTSIDE
+
+    def rayCast(self, to_point, from_point=None, distance=0.0, prop="", face=0, xray=0, poly=0):
+
+        """mouse rays look straight down at the middle of the view"""
+
+        center = self.view_center()
+        return self.scene.ray_cast(Vector([center[0], center[1], 1000.0]), Vector([center[0], center[1], -1000.0]),
+                                   prop)
+
+
+class HeadlessScene(object):
+
+    def __init__(self, terrain, view_radius=48.0):
+
+        self.terrain = terrain
+        self.objects = []
+        self.added = 0
+        self.onRemove = []
+
+        self.own = self.add_named("game_loop", {})
+        self.ground = self.add_named("terrain_object", {"terrain_object": True, "ground": True})
+        self.ground.meshes = [terrain.mesh]
+        self.add_named("vision_object", {"vision_object": True})
+        self.camera_hook = self.add_named("camera_hook", {"camera_hook": True})
+        self.add_named("shadow_light", {"shadow_light": True})
+        self.add_named("zoom_in", {"zoom_in": True})
+        self.add_named("zoom_out", {"zoom_out": True})
+        self.add_named("debug_text", {"debug_text": True, "Text": ""})
+
+        for i in range(4):
+            self.add_named("dynamic_light_{}".format(i), {"dynamic_light": True})
+
+        self.active_camera = HeadlessCamera(self, "camera", view_radius)
+        self.objects.append(self.active_camera)
+
+    def remove(self):
+
+        """runs the onRemove callbacks, as bge does when the game stops"""
+
+        for callback in self.onRemove:
+            callback(self)
+
+    def add_named(self, name, properties):
+        game_object = HeadlessObject(self, name, properties)
+        self.objects.append(game_object)
+        return game_object
+
+    def add_template(self, parent, template):
+        for child_name, properties, children in template:
+            child = HeadlessObject(self, child_name, properties, parent.worldPosition.copy())
+            child.setParent(parent)
+            self.objects.append(child)
+            self.add_template(child, children)
+
+    def addObject(self, name, reference=None, time=0):
+
+        self.added += 1
+        if isinstance(reference, HeadlessObject):
+            position = reference.worldPosition.copy()
+        else:
+            position = (0.0, 0.0, 0.0)
+
+        game_object = HeadlessObject(self, name, {}, position)
+        self.add_template(game_object, get_template(name))
+        self.objects.append(game_object)
+
+        return game_object
+
+    def remove_object(self, game_object):
+        if game_object in self.objects:
+            self.objects.remove(game_object)
+
+    def ray_cast(self, start, end, prop):
+
+        """only the ground can be hit, rays are treated as vertical at the end point"""
+
+        if prop and prop != "ground":
+            return None, None, None
+
+        hit = self.terrain.ray_cast(start, end)
+        if not hit:
+            return None, None, None
+
+        point, normal = hit
+        return self.ground, point, normal
+
+
+class HeadlessVertex(object):
+
+    __slots__ = ("XYZ",)
+
+    def __init__(self, position):
+        self.XYZ = Vector(position)
+
+
+class HeadlessPolygon(object):
+
+    __slots__ = ("indexes",)
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def getMaterialIndex(self):
+        return 0
+
+    def getNumVertex(self):
+        return len(self.indexes)
+
+    def getVertexIndex(self, index):
+        return self.indexes[index]
+
+
+class HeadlessMesh(object):
+
+    """a single material mesh proxy, vertices are (x, y, z) and polygons lists of 3 or 4 vertex indexes"""
+
+    def __init__(self, name, vertices, polygons):
+        self.name = name
+        self.vertices = [HeadlessVertex(vertex) for vertex in vertices]
+        self.polygons = [HeadlessPolygon(list(polygon)) for polygon in polygons]
+
+    @property
+    def numMaterials(self):
+        return 1
+
+    @property
+    def numPolygons(self):
+        return len(self.polygons)
+
+    def getVertexArrayLength(self, material_index):
+        return len(self.vertices)
+
+    def getVertex(self, material_index, index):
+        return self.vertices[index]
+
+    def getPolygon(self, index):
+        return self.polygons[index]
+
+    def transformUV(self, uv_index, matrix):
+        pass
+
+
+class HeadlessMouse(object):
+    def __init__(self):
+        self.position = (0.5, 0.5)
+        self.events = collections.defaultdict(int)
+
+
+class HeadlessKeyboard(object):
+    def __init__(self):
+        self.events = collections.defaultdict(int)
+
+
+class HeadlessImageBuff(object):
+    def __init__(self, color=0):
+        self.size = (0, 0)
+
+    def load(self, data, width, height):
+        self.size = (width, height)
+
+    def plot(self, brush, width, height, x, y, mode=0):
+        pass
+
+
+class HeadlessTexture(object):
+    def __init__(self, game_object, material=0, texture=0):
+        self.game_object = game_object
+        self.source = None
+
+    def refresh(self, refresh_source=True):
+        pass
+
+
+def make_bge_modules(root_path):
+
+    """the bge package split in to the sub modules game code imports"""
+
+    logic = types.ModuleType("bge.logic")
+    logic.globalDict = {}
+    logic.mouse = HeadlessMouse()
+    logic.keyboard = HeadlessKeyboard()
+    logic.KX_INPUT_NONE = 0
+    logic.KX_INPUT_JUST_ACTIVATED = 1
+    logic.KX_INPUT_ACTIVE = 2
+
+    def expand_path(path):
+        if path.startswith("//"):
+            return os.path.join(root_path, path[2:])
+        return path
+
+    logic.expandPath = expand_path
+    logic.LibLoad = lambda *args, **kwargs: None
+    logic.LibNew = lambda name, data_type, names: list(names)
+    logic.getCurrentScene = lambda: None
+    logic.getCurrentController = lambda: None
+
+    render = types.ModuleType("bge.render")
+    render.setMipmapping = lambda *args: None
+    render.setAnisotropicFiltering = lambda *args: None
+
+    texture = types.ModuleType("bge.texture")
+    texture.Texture = HeadlessTexture
+    texture.ImageBuff = HeadlessImageBuff
+    texture.IMB_BLEND_LIGHTEN = 0
+
+    events = types.ModuleType("bge.events")
+    event_names = ["LEFTMOUSE", "RIGHTMOUSE", "MIDDLEMOUSE", "WHEELUPMOUSE", "WHEELDOWNMOUSE"]
+    for i, event_name in enumerate(event_names):
+        setattr(events, event_name, 200 + i)
+
+    bge = types.ModuleType("bge")
+    bge.headless = True
+    bge.logic = logic
+    bge.render = render
+    bge.texture = texture
+    bge.events = events
+
+    return {"bge": bge, "bge.logic": logic, "bge.render": render, "bge.texture": texture, "bge.events": events}
+
+
+def rotation_between(start, end):
+
+    """rotation matrix turning unit vector start on to unit vector end"""
+
+    axis = start.cross(end)
+    sin = axis.length
+    cos = max(-1.0, min(1.0, start.dot(end)))
+
+    if sin < 1e-9:
+        if cos > 0.0:
+            return Matrix.Identity(3)
+
+        perpendicular = start.cross(Vector([1.0, 0.0, 0.0]))
+        if perpendicular.length < 1e-9:
+            perpendicular = start.cross(Vector([0.0, 1.0, 0.0]))
+        axis = perpendicular
+
+    axis = axis.normalized()
+    angle = math.atan2(sin, cos)
+    x, y, z = axis
+    c = math.cos(angle)
+    s = math.sin(angle)
+    t = 1.0 - c
+
+    return Matrix([[(t * x * x) + c, (t * x * y) - (s * z), (t * x * z) + (s * y)],
+                   [(t * x * y) + (s * z), (t * y * y) + c, (t * y * z) - (s * x)],
+                   [(t * x * z) - (s * y), (t * y * z) + (s * x), (t * z * z) + c]])
@@ -0,0 +1,362 @@
+"""pure python stand ins for the parts of mathutils the simulation uses,
+operators follow the blender 2.7x api, so Matrix * Matrix and Matrix * Vector are matrix products
+"""
+
+import math
+
+
+def to_values(values):
+    if isinstance(values, Vector):
+        return list(values.values)
+    return [float(value) for value in values]
+
+
+class Vector(object):
+
+    __slots__ = ("values",)
+
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self.values = to_values(values)
+
+    def __repr__(self):
+        return "Vector(({}))".format(", ".join("{:.4f}".format(value) for value in self.values))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __setitem__(self, index, value):
+        self.values[index] = float(value)
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self.values, other))
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def get_axis(self, index):
+        return self.values[index]
+
+    def set_axis(self, index, value):
+        self.values[index] = float(value)
+
+    x = property(lambda self: self.values[0], lambda self, value: self.set_axis(0, value))
+    y = property(lambda self: self.values[1], lambda self, value: self.set_axis(1, value))
+    z = property(lambda self: self.values[2], lambda self, value: self.set_axis(2, value))
+    w = property(lambda self: self.values[3], lambda self, value: self.set_axis(3, value))
+
+    def copy(self):
+        return Vector(self.values)
+
+    def to_2d(self):
+        return Vector(self.values[:2])
+
+    def to_3d(self):
+        return Vector((self.values + [0.0, 0.0, 0.0])[:3])
+
+    def to_4d(self):
+        return Vector((self.values + [0.0, 0.0, 0.0, 1.0])[:4])
+
+    def to_tuple(self):
+        return tuple(self.values)
+
+    @property
+    def length_squared(self):
+        return sum(value * value for value in self.values)
+
+    @property
+    def length(self):
+        return math.sqrt(self.length_squared)
+
+    @length.setter
+    def length(self, new_length):
+        current = self.length
+        if current > 0.0:
+            scale = new_length / current
+            self.values = [value * scale for value in self.values]
+
+    def normalize(self):
+        self.length = 1.0
+
+    def normalized(self):
+        vector = self.copy()
+        vector.normalize()
+        return vector
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self.values, other))
+
+    def cross(self, other):
+        ax, ay, az = self.to_3d()
+        bx, by, bz = Vector(other).to_3d()
+        return Vector([(ay * bz) - (az * by), (az * bx) - (ax * bz), (ax * by) - (ay * bx)])
+
+    def angle(self, other, fallback=None):
+        lengths = self.length * Vector(other).length
+        if lengths == 0.0:
+            if fallback is None:
+                raise ValueError("Vector.angle(other): zero length vectors have no valid angle")
+            return fallback
+
+        return math.acos(max(-1.0, min(1.0, self.dot(other) / lengths)))
+
+    def angle_signed(self, other, fallback=None):
+        if self.length == 0.0 or Vector(other).length == 0.0:
+            if fallback is None:
+                raise ValueError("Vector.angle_signed(other): zero length vectors have no valid angle")
+            return fallback
+
+        cross = (self.values[0] * other[1]) - (self.values[1] * other[0])
+        return -math.atan2(cross, self.dot(other))
+
+    def lerp(self, other, factor):
+        return Vector([a + ((b - a) * factor) for a, b in zip(self.values, other)])
+
+    def rotate(self, rotation):
+        matrix = rotation_matrix(rotation)
+        rotated = matrix * self.to_3d()
+        self.values = rotated.values[:len(self.values)]
+
+    def to_track_quat(self, track="Y", up="Z"):
+
+        """rotation pointing the track axis along this vector, only the Y track, Z up case is used in game"""
+
+        forward = self.to_3d().normalized()
+        if forward.length == 0.0:
+            return Quaternion(Matrix.Identity(3))
+
+        world_up = Vector([0.0, 0.0, 1.0])
+        side = forward.cross(world_up)
+        if side.length < 1e-9:
+            side = Vector([1.0, 0.0, 0.0])
+        side.normalize()
+        up_axis = side.cross(forward).normalized()
+
+        # right handed basis, Y along the vector and Z as close to world up as possible
+        columns = [forward.cross(up_axis), forward, up_axis]
+        rows = [[columns[c][r] for c in range(3)] for r in range(3)]
+        return Quaternion(Matrix(rows))
+
+    def __add__(self, other):
+        return Vector([a + b for a, b in zip(self.values, other)])
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Vector([a - b for a, b in zip(self.values, other)])
+
+    def __rsub__(self, other):
+        return Vector([b - a for a, b in zip(self.values, other)])
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return Vector([value * other for value in self.values])
+        if isinstance(other, Vector):
+            return self.dot(other)
+        return NotImplemented
+
+    def __rmul__(self, other):
+        if isinstance(other, (int, float)):
+            return Vector([value * other for value in self.values])
+        return NotImplemented
+
+    def __truediv__(self, other):
+        return Vector([value / other for value in self.values])
+
+    def __neg__(self):
+        return Vector([-value for value in self.values])
+
+    def __iadd__(self, other):
+        self.values = [a + b for a, b in zip(self.values, other)]
+        return self
+
+    def __isub__(self, other):
+        self.values = [a - b for a, b in zip(self.values, other)]
+        return self
+
+    def __imul__(self, other):
+        self.values = [value * other for value in self.values]
+        return self
+
+    def __itruediv__(self, other):
+        self.values = [value / other for value in self.values]
+        return self
+
+
+class Matrix(object):
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = Matrix.Identity(4).rows
+        self.rows = [to_values(row) for row in rows]
+
+    def __repr__(self):
+        return "Matrix({})".format(self.rows)
+
+    @staticmethod
+    def Identity(size):
+        return Matrix([[1.0 if row == column else 0.0 for column in range(size)] for row in range(size)])
+
+    @staticmethod
+    def Rotation(angle, size, axis):
+        cos = math.cos(angle)
+        sin = math.sin(angle)
+
+        if axis == "X":
+            rows = [[1.0, 0.0, 0.0], [0.0, cos, -sin], [0.0, sin, cos]]
+        elif axis == "Y":
+            rows = [[cos, 0.0, sin], [0.0, 1.0, 0.0], [-sin, 0.0, cos]]
+        else:
+            rows = [[cos, -sin, 0.0], [sin, cos, 0.0], [0.0, 0.0, 1.0]]
+
+        matrix = Matrix(rows)
+        if size == 4:
+            return matrix.to_4x4()
+        return matrix
+
+    @staticmethod
+    def Translation(vector):
+        matrix = Matrix.Identity(4)
+        for i, value in enumerate(Vector(vector).to_3d()):
+            matrix.rows[i][3] = value
+        return matrix
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def copy(self):
+        return Matrix(self.rows)
+
+    @property
+    def size(self):
+        return len(self.rows)
+
+    def to_3x3(self):
+        return Matrix([row[:3] for row in self.rows[:3]])
+
+    def to_4x4(self):
+        matrix = Matrix.Identity(4)
+        for r in range(min(3, len(self.rows))):
+            for c in range(min(4, len(self.rows[r]))):
+                matrix.rows[r][c] = self.rows[r][c]
+        return matrix
+
+    @property
+    def translation(self):
+        return Vector([self.rows[0][3], self.rows[1][3], self.rows[2][3]])
+
+    @translation.setter
+    def translation(self, vector):
+        for i, value in enumerate(Vector(vector).to_3d()):
+            self.rows[i][3] = value
+
+    def column(self, index):
+        return Vector([row[index] for row in self.rows])
+
+    def transposed(self):
+        return Matrix([[self.rows[r][c] for r in range(len(self.rows))] for c in range(len(self.rows[0]))])
+
+    def orthonormalized(self):
+
+        """keeps the 3x3 rotation part a proper rotation after element wise blending"""
+
+        x_axis = Vector(self.column(0)[:3]).normalized()
+        y_axis = Vector(self.column(1)[:3])
+        z_axis = x_axis.cross(y_axis).normalized()
+        y_axis = z_axis.cross(x_axis).normalized()
+
+        matrix = self.copy()
+        for r in range(3):
+            matrix.rows[r][0] = x_axis[r]
+            matrix.rows[r][1] = y_axis[r]
+            matrix.rows[r][2] = z_axis[r]
+        return matrix
+
+    def lerp(self, other, factor):
+        blended = Matrix([[a + ((b - a) * factor) for a, b in zip(row, other_row)]
+                          for row, other_row in zip(self.rows, other.rows)])
+        return blended.orthonormalized()
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            columns = len(other.rows[0])
+            return Matrix([[sum(row[k] * other.rows[k][c] for k in range(len(row))) for c in range(columns)]
+                           for row in self.rows])
+
+        if isinstance(other, (int, float)):
+            return Matrix([[value * other for value in row] for row in self.rows])
+
+        vector = Vector(other)
+        size = len(self.rows)
+        if size == 4 and len(vector) == 3:
+            values = vector.to_4d()
+            return Vector([sum(row[k] * values[k] for k in range(4)) for row in self.rows[:3]])
+
+        return Vector([sum(row[k] * vector[k] for k in range(len(vector))) for row in self.rows[:len(vector)]])
+
+    __matmul__ = __mul__
+
+
+class Euler(object):
+
+    __slots__ = ("values", "order")
+
+    def __init__(self, values=(0.0, 0.0, 0.0), order="XYZ"):
+        self.values = to_values(values)
+        self.order = order
+
+    x = property(lambda self: self.values[0])
+    y = property(lambda self: self.values[1])
+    z = property(lambda self: self.values[2])
+
+    def to_matrix(self):
+        x = Matrix.Rotation(self.values[0], 3, "X")
+        y = Matrix.Rotation(self.values[1], 3, "Y")
+        z = Matrix.Rotation(self.values[2], 3, "Z")
+        return z * y * x
+
+
+class Quaternion(object):
+
+    """only carries a rotation matrix, enough for to_track_quat().to_matrix()"""
+
+    __slots__ = ("matrix",)
+
+    def __init__(self, matrix=None):
+        if matrix is None:
+            matrix = Matrix.Identity(3)
+        self.matrix = matrix.to_3x3()
+
+    def to_matrix(self):
+        return self.matrix.copy()
+
+
+def rotation_matrix(rotation):
+    if isinstance(rotation, (Euler, Quaternion)):
+        return rotation.to_matrix()
+    return rotation.to_3x3()
+
+
+class Geometry(object):
+    pass
+
+
+geometry = Geometry()
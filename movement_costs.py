@@ -0,0 +1,84 @@
+import numpy as np
+
+import vehicle_parts
+
+SLOPE_COST = 4.0
+MAX_COST = 20.0
+
+
+def steepness(normal_map):
+
+    """rise over run of each tile from its normal"""
+
+    up = np.clip(normal_map[:, :, 2], 0.05, 1.0)
+    return np.sqrt(1.0 - (up * up)) / up
+
+
+def drive_costs(off_road_map, normal_map, drive_type):
+
+    """time to cross each tile for a drive type, relative to its best surface on flat ground so no tile costs
+    less than 1.0 and the octile heuristic stays admissible. stability takes the edge off slopes
+    """
+
+    drive = vehicle_parts.drive_dict[drive_type]
+    fastest = max(drive["on_road"], drive["off_road"])
+
+    costs = np.where(off_road_map, fastest / drive["off_road"], fastest / drive["on_road"])
+    costs = costs * (1.0 + ((SLOPE_COST * steepness(normal_map)) / (1.0 + drive["stability"])))
+
+    return np.minimum(costs, MAX_COST).astype(np.float32)
+
+
+def footprint_costs(costs, span):
+
+    """the mean cost under a span x span footprint with its corner on each tile, edges repeat past the map"""
+
+    width, height = costs.shape
+    padded = np.pad(costs.astype(np.float64), ((0, span), (0, span)), mode="edge")
+
+    table = np.zeros((width + span + 1, height + span + 1), dtype=np.float64)
+    table[1:, 1:] = padded.cumsum(axis=0).cumsum(axis=1)
+
+    sums = table[span:span + width, span:span + height] - table[:width, span:span + height] - \
+        table[span:span + width, :height] + table[:width, :height]
+
+    return (sums / (span * span)).astype(np.float32)
+
+
+class MovementCosts(object):
+
+    """per tile movement cost grids for each drive type in vehicle_parts.drive_dict, from off road tiles and slope.
+
+    the grids are built in memory at start up, they depend on the off road tiles which come from a terrain field
+    generated each launch, so there's nothing worth caching on disk. get_costs() gives the grid averaged over a
+    footprint, which planners multiply their step costs by.
+    """
+
+    def __init__(self, tiles):
+
+        self.origin = tiles.origin
+        self.drive_types = sorted(vehicle_parts.drive_dict)
+        self.footprints = {}
+
+        off_road_map = tiles.off_road_map()
+        normal_map = tiles.normal_map()
+        self.grids = {drive_type: drive_costs(off_road_map, normal_map, drive_type) for drive_type in self.drive_types}
+
+    def get_costs(self, drive_type, span):
+
+        costs = self.footprints.get((drive_type, span))
+
+        if costs is None:
+            costs = footprint_costs(self.grids[drive_type], span)
+            self.footprints[(drive_type, span)] = costs
+
+        return costs
+
+    def get_window(self, drive_type, span, origin, shape):
+
+        """the costs for an occupant map window starting at the tile key origin"""
+
+        x = origin[0] - self.origin[0]
+        y = origin[1] - self.origin[1]
+
+        return self.get_costs(drive_type, span)[x:x + shape[0], y:y + shape[1]]
@@ -0,0 +1,651 @@
+import numpy as np
+
+import clearance
+
+# the combined occupant array shows the first layer with an agent on each tile
+LAYERS = ("BUILDING", "INFANTRY", "VEHICLE")
+LAYER_TYPES = {"BUILDING": "BUILDING", "INFANTRY": "INFANTRY", "VEHICLE": "VEHICLE", "ARTILLERY": "VEHICLE"}
+
+step_rects_cache = {}
+
+
+def get_layer(agent):
+    return LAYER_TYPES[agent.agent_type]
+
+
+def rect_difference(a, b):
+
+    """the tiles of rectangle a that are not in b, as up to four rectangles, all inclusive (low, high) pairs"""
+
+    (ax0, ay0), (ax1, ay1) = a
+    (bx0, by0), (bx1, by1) = b
+
+    if ax0 > bx1 or bx0 > ax1 or ay0 > by1 or by0 > ay1:
+        return [a]
+
+    rects = []
+
+    if ax0 < bx0:
+        rects.append(((ax0, ay0), (bx0 - 1, ay1)))
+        ax0 = bx0
+
+    if ax1 > bx1:
+        rects.append(((bx1 + 1, ay0), (ax1, ay1)))
+        ax1 = bx1
+
+    if ay0 < by0:
+        rects.append(((ax0, ay0), (ax1, by0 - 1)))
+
+    if ay1 > by1:
+        rects.append(((ax0, by1 + 1), (ax1, ay1)))
+
+    return rects
+
+
+def step_rects(span, dx, dy):
+
+    """the rectangles a span x span footprint leaves and enters moving by dx, dy.
+    as offsets from its old corner, worked out once for each span and direction
+    """
+
+    rects = step_rects_cache.get((span, dx, dy))
+
+    if rects is None:
+        old = ((0, 0), (span - 1, span - 1))
+        new = ((dx, dy), (dx + span - 1, dy + span - 1))
+        rects = rect_difference(old, new), rect_difference(new, old)
+        step_rects_cache[(span, dx, dy)] = rects
+
+    return rects
+
+
+def rect_overlap(a, b):
+
+    """the number of tiles in both inclusive rectangles"""
+
+    width = min(a[1][0], b[1][0]) - max(a[0][0], b[0][0]) + 1
+    height = min(a[1][1], b[1][1]) - max(a[0][1], b[0][1]) + 1
+
+    return max(0, width) * max(0, height)
+
+
+def rect_union(a, b):
+
+    """the smallest rectangle holding both, either can be None"""
+
+    if a is None:
+        return b
+
+    if b is None:
+        return a
+
+    return (min(a[0][0], b[0][0]), min(a[0][1], b[0][1])), (max(a[1][0], b[1][0]), max(a[1][1], b[1][1]))
+
+
+def offset_rect(rect, corner):
+    (x0, y0), (x1, y1) = rect
+    return (corner[0] + x0, corner[1] + y0), (corner[0] + x1, corner[1] + y1)
+
+
+def move_footprint(occupancy, agent, old_corner, new_corner, span):
+
+    """moves the span x span footprint of agent. stepping to a neighbouring tile only the tiles it leaves are
+    cleared, then the whole new footprint is stamped, so a tile someone else stamped over and cleared while it stood
+    there is put right again. returns the low and high keys of the tiles that changed
+    """
+
+    dx = new_corner[0] - old_corner[0]
+    dy = new_corner[1] - old_corner[1]
+
+    low = (min(old_corner[0], new_corner[0]), min(old_corner[1], new_corner[1]))
+    high = (max(old_corner[0], new_corner[0]) + span - 1, max(old_corner[1], new_corner[1]) + span - 1)
+
+    if abs(dx) > 1 or abs(dy) > 1:
+        occupancy.clear(agent, old_corner, (old_corner[0] + span - 1, old_corner[1] + span - 1))
+        occupancy.stamp(agent, new_corner, (new_corner[0] + span - 1, new_corner[1] + span - 1))
+        return low, high
+
+    for rect in step_rects(span, dx, dy)[0]:
+        occupancy.clear(agent, *offset_rect(rect, old_corner))
+
+    occupancy.stamp(agent, new_corner, (new_corner[0] + span - 1, new_corner[1] + span - 1))
+
+    return low, high
+
+
+def near_distances(occupied, max_distance):
+
+    """the distance in tiles from each tile to the nearest occupied one, counting diagonal steps as one, up to
+    max_distance. tiles further away get max_distance + 1. occupied has to reach max_distance tiles past the
+    tiles wanted
+    """
+
+    distances = np.full(occupied.shape, max_distance + 1, dtype=np.int8)
+    near = occupied.copy()
+    distances -= near
+
+    for _ in range(max_distance):
+        rows = near.copy()
+        rows[1:] |= near[:-1]
+        rows[:-1] |= near[1:]
+
+        near = rows.copy()
+        near[:, 1:] |= rows[:, :-1]
+        near[:, :-1] |= rows[:, 1:]
+
+        distances -= near
+
+    return distances
+
+
+class ProximityField(object):
+
+    """how far each tile is from the nearest tile of one occupancy layer, in tiles counting diagonals as one, up to
+    max_distance. tiles further out read max_distance + 1.
+
+    men check it before each step instead of searching the tiles around them for vehicles, and it's there for the
+    ai to weigh how exposed a tile is. writes to the layer mark the blocks within max_distance of them, update()
+    works out the rectangle around the marked blocks again in one go. the occupancy grid updates it from tick(),
+    so it's a tick behind the layer at most.
+    """
+
+    def __init__(self, occupancy, layer, max_distance=8, block_size=16):
+
+        self.occupancy = occupancy
+        self.layer = layer
+        self.origin = occupancy.origin
+        self.width = occupancy.width
+        self.max_distance = max_distance
+        self.block_size = block_size
+        self.dirty = set()
+        self.updates = 0
+
+        self.distances = np.full((self.width, self.width), max_distance + 1, dtype=np.int8)
+
+    def mark(self, x0, y0, x1, y1):
+
+        """mark the blocks whose tiles are within max_distance of the array indices x0, y0 to x1, y1, exclusive"""
+
+        reach = self.max_distance
+        size = self.block_size
+        last = (self.width - 1) // size
+
+        for bx in range(max(0, x0 - reach) // size, min(last, (x1 - 1 + reach) // size) + 1):
+            for by in range(max(0, y0 - reach) // size, min(last, (y1 - 1 + reach) // size) + 1):
+                self.dirty.add((bx, by))
+
+    def update(self):
+
+        if not self.dirty:
+            return
+
+        reach = self.max_distance
+        size = self.block_size
+
+        x0 = min(bx for bx, by in self.dirty) * size
+        y0 = min(by for bx, by in self.dirty) * size
+        x1 = min(self.width, (max(bx for bx, by in self.dirty) + 1) * size)
+        y1 = min(self.width, (max(by for bx, by in self.dirty) + 1) * size)
+
+        px = max(0, x0 - reach)
+        py = max(0, y0 - reach)
+        occupied = self.occupancy.layers[self.layer][px:x1 + reach, py:y1 + reach] != 0
+
+        distances = near_distances(occupied, reach)
+        self.distances[x0:x1, y0:y1] = distances[x0 - px:x1 - px, y0 - py:y1 - py]
+
+        self.dirty.clear()
+        self.updates += 1
+
+    def distance(self, key):
+
+        x = key[0] - self.origin[0]
+        y = key[1] - self.origin[1]
+
+        if 0 <= x < self.width and 0 <= y < self.width:
+            return int(self.distances[x, y])
+
+        return self.max_distance + 1
+
+    def nearest(self, key, radius):
+
+        """an agent of the layer within radius tiles of key, one of the closest, or None"""
+
+        x = key[0] - self.origin[0]
+        y = key[1] - self.origin[1]
+
+        if 0 <= x < self.width and 0 <= y < self.width:
+            distance = int(self.distances[x, y])
+
+            if distance <= radius:
+                # every tile of the layer in the square is at the nearest distance
+                square = self.occupancy.layers[self.layer][max(0, x - distance):x + distance + 1,
+                                                           max(0, y - distance):y + distance + 1]
+                return self.occupancy.registry.get_agent(square.max())
+
+    def window(self, low, high):
+
+        """the distances under the rectangle of tile keys low to high, inclusive, clipped to the map"""
+
+        x0, y0, x1, y1, inside = self.occupancy.bounds(low, high)
+        return self.distances[x0:x1, y0:y1]
+
+
+class OccupancyGrid(object):
+
+    """agent ids for every tile of a TileGrid, one layer per class of agent, stamped and cleared a rectangle at a time.
+
+    buildings, vehicles and infantry each have their own layer, so a man stepping onto a tile never overwrites a
+    vehicle or a building and clearing him never wipes them. the tile grid's own occupant array holds all the
+    layers put together, a building over a man over a vehicle, so tiles[key].occupied, the clearance map and the
+    path finders still see one id per tile. the registry maps ids to agents, 0 is empty.
+    rectangles are given as inclusive tile keys low to high and are clipped to the map.
+
+    rect_count() reads a summed area table of occupied tiles, four lookups for any size of rectangle.
+    there is a table for each layer and one for the combined grid, built when first read. blocks written to
+    since a table was built are counted from the array instead, so writes have to go through stamp(), clear()
+    and move(). tick() rebuilds a table once a quarter of its blocks have been written to.
+    """
+
+    # rectangles of up to this many tiles are written one tile at a time, below it slicing costs more than it saves
+    small_rect = 9
+
+    def __init__(self, tiles, block_size=16):
+
+        self.tiles = tiles
+        self.origin = tiles.origin
+        self.width = tiles.width
+        self.registry = tiles.registry
+        self.grid = tiles.occupant_map()
+        self.layers = {layer: np.zeros((self.width, self.width), dtype=np.int32) for layer in LAYERS}
+        self.ordered_layers = [self.layers[layer] for layer in LAYERS]
+        self.step_offsets = {}
+
+        self.block_size = block_size
+        self.dirty = {layer: set() for layer in (None,) + LAYERS}
+        self.tables = {}
+        self.max_dirty = max(1, (((self.width - 1) // block_size) + 1) ** 2 // 4)
+        self.rebuilds = 0
+        self.proximity = ProximityField(self, "VEHICLE")
+
+    def agent_id(self, agent):
+        return self.registry.agent_id(agent)
+
+    def bounds(self, low, high):
+
+        """array indices of the rectangle clipped to the map, exclusive at the top, and True if none was clipped"""
+
+        x0 = low[0] - self.origin[0]
+        y0 = low[1] - self.origin[1]
+        x1 = high[0] - self.origin[0] + 1
+        y1 = high[1] - self.origin[1] + 1
+
+        inside = x0 >= 0 and y0 >= 0 and x1 <= self.width and y1 <= self.width
+        return max(0, x0), max(0, y0), min(self.width, max(0, x1)), min(self.width, max(0, y1)), inside
+
+    def window(self, low, high, layer=None):
+
+        """the slice of the combined grid or of one layer under the rectangle and True if all of it is on the map"""
+
+        x0, y0, x1, y1, inside = self.bounds(low, high)
+        array = self.grid if layer is None else self.layers[layer]
+        return array[x0:x1, y0:y1], inside
+
+    def changed(self, low, high, layer):
+
+        """puts the layers back together over the rectangle and marks its blocks in layer and the combined grid"""
+
+        x0, y0, x1, y1, inside = self.bounds(low, high)
+
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        building = self.layers["BUILDING"][x0:x1, y0:y1]
+        infantry = self.layers["INFANTRY"][x0:x1, y0:y1]
+        vehicle = self.layers["VEHICLE"][x0:x1, y0:y1]
+        self.grid[x0:x1, y0:y1] = np.where(building != 0, building, np.where(infantry != 0, infantry, vehicle))
+
+        self.mark(x0, y0, x1, y1, layer)
+
+    def top_id(self, x, y):
+
+        """the id the combined grid shows at array index x, y"""
+
+        for array in self.ordered_layers:
+            agent_id = array[x, y]
+            if agent_id:
+                return agent_id
+
+        return 0
+
+    def mark(self, x0, y0, x1, y1, layer):
+
+        size = self.block_size
+        combined = self.dirty[None]
+        dirty = self.dirty[layer]
+
+        for bx in range(x0 // size, ((x1 - 1) // size) + 1):
+            for by in range(y0 // size, ((y1 - 1) // size) + 1):
+                combined.add((bx, by))
+                dirty.add((bx, by))
+
+        if layer == self.proximity.layer:
+            self.proximity.mark(x0, y0, x1, y1)
+
+    def tick(self):
+
+        for layer in list(self.tables):
+            if len(self.dirty[layer]) > self.max_dirty:
+                self.build_table(layer)
+
+        self.proximity.update()
+
+    def build_table(self, layer):
+
+        array = self.grid if layer is None else self.layers[layer]
+        table = clearance.summed_area(array != 0)
+        self.tables[layer] = table
+        self.dirty[layer].clear()
+        self.rebuilds += 1
+
+        return table
+
+    def rect_count(self, low, high, layer=None):
+
+        """the number of occupied tiles in the rectangle, in one layer or in any"""
+
+        x0, y0, x1, y1, inside = self.bounds(low, high)
+
+        if x0 >= x1 or y0 >= y1:
+            return 0
+
+        table = self.tables.get(layer)
+
+        if table is None:
+            table = self.build_table(layer)
+
+        dirty = self.dirty[layer]
+
+        if dirty:
+            size = self.block_size
+
+            for bx in range(x0 // size, ((x1 - 1) // size) + 1):
+                for by in range(y0 // size, ((y1 - 1) // size) + 1):
+                    if (bx, by) in dirty:
+                        array = self.grid if layer is None else self.layers[layer]
+                        return int(np.count_nonzero(array[x0:x1, y0:y1]))
+
+        item = table.item
+        return item(x1, y1) - item(x0, y1) - item(x1, y0) + item(x0, y0)
+
+    def stamp(self, agent, low, high):
+
+        layer = get_layer(agent)
+        x0, y0, x1, y1, inside = self.bounds(low, high)
+
+        if (x1 - x0) * (y1 - y0) > self.small_rect:
+            self.layers[layer][x0:x1, y0:y1] = self.agent_id(agent)
+            self.changed(low, high, layer)
+            return
+
+        array = self.layers[layer]
+        agent_id = self.agent_id(agent)
+
+        for x in range(x0, x1):
+            for y in range(y0, y1):
+                array[x, y] = agent_id
+                self.grid[x, y] = self.top_id(x, y)
+
+        if x0 < x1 and y0 < y1:
+            self.mark(x0, y0, x1, y1, layer)
+
+    def clear(self, agent, low, high):
+
+        """empties the tiles of agent in the rectangle, leaving anyone who has stamped over it"""
+
+        layer = get_layer(agent)
+        x0, y0, x1, y1, inside = self.bounds(low, high)
+
+        if (x1 - x0) * (y1 - y0) > self.small_rect:
+            region = self.layers[layer][x0:x1, y0:y1]
+            region[region == self.agent_id(agent)] = 0
+            self.changed(low, high, layer)
+            return
+
+        array = self.layers[layer]
+        agent_id = self.agent_id(agent)
+
+        for x in range(x0, x1):
+            for y in range(y0, y1):
+                if array[x, y] == agent_id:
+                    array[x, y] = 0
+                    self.grid[x, y] = self.top_id(x, y)
+
+        if x0 < x1 and y0 < y1:
+            self.mark(x0, y0, x1, y1, layer)
+
+    def get_step_offsets(self, span, dx, dy):
+
+        """flat array offsets from the old corner of the tiles left, from step_rects()"""
+
+        offsets = self.step_offsets.get((span, dx, dy))
+
+        if offsets is None:
+            rects = step_rects(span, dx, dy)[0]
+            keys = [(x, y) for (x0, y0), (x1, y1) in rects for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            offsets = np.array([(x * self.width) + y for x, y in keys], dtype=np.int64)
+
+            self.step_offsets[(span, dx, dy)] = offsets
+
+        return offsets
+
+    def move(self, agent, old_corner, new_corner, span):
+
+        """move_footprint() with one gather and scatter into the flat layer for the tiles left and one slice
+        assignment for the new footprint, when both footprints are on the map
+        """
+
+        x = old_corner[0] - self.origin[0]
+        y = old_corner[1] - self.origin[1]
+        dx = new_corner[0] - old_corner[0]
+        dy = new_corner[1] - old_corner[1]
+        low = min(x, x + dx)
+        high = max(x, x + dx) + span
+
+        if abs(dx) > 1 or abs(dy) > 1 or low < 0 or min(y, y + dy) < 0 or high > self.width or \
+                max(y, y + dy) + span > self.width:
+            return move_footprint(self, agent, old_corner, new_corner, span)
+
+        agent_id = self.agent_id(agent)
+        layer = get_layer(agent)
+        array = self.layers[layer]
+        flat = array.ravel()
+
+        leaving = self.get_step_offsets(span, dx, dy) + ((x * self.width) + y)
+        flat[leaving[flat[leaving] == agent_id]] = 0
+        array[x + dx:x + dx + span, y + dy:y + dy + span] = agent_id
+
+        low = (min(old_corner[0], new_corner[0]), min(old_corner[1], new_corner[1]))
+        high = (max(old_corner[0], new_corner[0]) + span - 1, max(old_corner[1], new_corner[1]) + span - 1)
+
+        self.changed(low, high, layer)
+        return low, high
+
+    def rect_any(self, low, high, ignore=None, ignore_rect=None, layer=None):
+
+        """True if any tile in the rectangle is held by an agent other than ignore, or is off the map.
+        ignore_rect is the rectangle ignore has stamped, if it has one. its tiles come off the count of its layer
+        when they all still hold its id, so the arrays only have to be read when something else is there
+        """
+
+        x0, y0, x1, y1, inside = self.bounds(low, high)
+
+        if not inside:
+            return True
+
+        layers = LAYERS if layer is None else (layer,)
+        ignore_id = self.registry.agent_ids.get(ignore, 0)
+
+        if ignore_rect:
+            count = sum(self.rect_count(low, high, name) for name in layers)
+            overlap = rect_overlap(ignore_rect, (low, high))
+            own_layer = get_layer(ignore)
+
+            if count > overlap or count == 0 or own_layer not in layers:
+                return count > 0
+
+            if count == overlap:
+                shared = ((max(low[0], ignore_rect[0][0]), max(low[1], ignore_rect[0][1])),
+                          (min(high[0], ignore_rect[1][0]), min(high[1], ignore_rect[1][1])))
+
+                if np.all(self.window(shared[0], shared[1], own_layer)[0] == ignore_id):
+                    return False
+
+        else:
+            count = self.rect_count(low, high, layer)
+
+            if count <= 0 or ignore is None:
+                return count > 0
+
+        for name in layers:
+            region = self.layers[name][x0:x1, y0:y1]
+            if np.any((region != 0) & (region != ignore_id)):
+                return True
+
+        return False
+
+    def release(self, agent):
+
+        """wipes any tiles an agent that has ended still holds and frees its id, returns the rectangle of tile keys
+        it held or None
+        """
+
+        agent_id = self.registry.agent_ids.get(agent)
+        held = None
+
+        if agent_id is not None:
+            for layer, array in self.layers.items():
+                xs, ys = np.nonzero(array == agent_id)
+
+                if len(xs):
+                    low = (int(xs.min()) + self.origin[0], int(ys.min()) + self.origin[1])
+                    high = (int(xs.max()) + self.origin[0], int(ys.max()) + self.origin[1])
+                    array[xs, ys] = 0
+                    self.changed(low, high, layer)
+                    held = rect_union(held, (low, high))
+
+            self.registry.release(agent)
+
+        return held
+
+    def rect_agents(self, low, high, ignore=None, layer=None):
+
+        """the agents holding tiles in the rectangle in one layer or in any, other than ignore, in id order"""
+
+        x0, y0, x1, y1, inside = self.bounds(low, high)
+        layers = LAYERS if layer is None else (layer,)
+        ids = set()
+
+        for name in layers:
+            ids.update(np.unique(self.layers[name][x0:x1, y0:y1]).tolist())
+
+        ids.discard(0)
+        ids.discard(self.registry.agent_ids.get(ignore, 0))
+
+        return [self.registry.get_agent(agent_id) for agent_id in sorted(ids)]
+
+
+class TileOccupancy(object):
+
+    """the same queries one tile at a time through tiles[key].occupied, for chunked tiles which have no single array.
+    there is one agent to a tile, layers are picked out by agent type
+    """
+
+    def __init__(self, tiles):
+        self.tiles = tiles
+        self.proximity = None
+
+    def move(self, agent, old_corner, new_corner, span):
+        return move_footprint(self, agent, old_corner, new_corner, span)
+
+    def tick(self):
+        pass
+
+    def release(self, agent):
+
+        registry = self.tiles.registry
+        agent_id = registry.agent_ids.get(agent)
+        held = None
+
+        if agent_id is not None:
+            for chunk in self.tiles.chunks.values():
+                indices = np.flatnonzero(chunk.occupant == agent_id)
+
+                if len(indices):
+                    chunk.occupant[indices] = 0
+                    xs = indices // chunk.width
+                    ys = indices % chunk.width
+                    low = (int(xs.min()) + chunk.origin[0], int(ys.min()) + chunk.origin[1])
+                    high = (int(xs.max()) + chunk.origin[0], int(ys.max()) + chunk.origin[1])
+                    held = rect_union(held, (low, high))
+
+            registry.release(agent)
+
+        return held
+
+    def rect_keys(self, low, high):
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                yield x, y
+
+    def stamp(self, agent, low, high):
+        for key in self.rect_keys(low, high):
+            tile = self.tiles.get(key)
+            if tile:
+                tile.occupied = agent
+
+    def clear(self, agent, low, high):
+        for key in self.rect_keys(low, high):
+            tile = self.tiles.get(key)
+            if tile and tile.occupied == agent:
+                tile.occupied = None
+
+    def rect_count(self, low, high, layer=None):
+
+        count = 0
+
+        for key in self.rect_keys(low, high):
+            tile = self.tiles.get(key)
+            occupant = tile.occupied if tile else None
+
+            if occupant and (layer is None or get_layer(occupant) == layer):
+                count += 1
+
+        return count
+
+    def rect_any(self, low, high, ignore=None, ignore_rect=None, layer=None):
+        for key in self.rect_keys(low, high):
+            tile = self.tiles.get(key)
+            if not tile:
+                return True
+
+            occupant = tile.occupied
+            if occupant and occupant != ignore and (layer is None or get_layer(occupant) == layer):
+                return True
+
+        return False
+
+    def rect_agents(self, low, high, ignore=None, layer=None):
+
+        agents = []
+
+        for key in self.rect_keys(low, high):
+            tile = self.tiles.get(key)
+            occupant = tile.occupied if tile else None
+
+            if occupant and occupant != ignore and occupant not in agents:
+                if layer is None or get_layer(occupant) == layer:
+                    agents.append(occupant)
+
+        return agents
+
@@ -0,0 +1,73 @@
+import concurrent.futures
+
+
+class PathService(object):
+
+    """runs path searches on a thread pool, so a long search doesn't stall the frame it was asked for in.
+
+    jobs only get copies of the grid they need, never live game objects, so they are safe to run off the game thread.
+    there's one ticket per agent, asking again or forget() discards the last one and its result is thrown away
+    when it comes in, so a unit given a new order never follows a path planned for the old one.
+
+    the searches are plain python and hold the GIL, so they don't run any faster side by side with the game thread,
+    the pool only keeps a long search from landing on one frame. call shutdown() when the game ends, the threads
+    would outlive it otherwise.
+    """
+
+    def __init__(self, workers=2, enabled=True):
+
+        self.workers = workers
+        self.enabled = enabled
+        self.executor = None
+        self.tickets = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.discarded = 0
+
+    def get_executor(self):
+        if not self.executor:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+        return self.executor
+
+    def submit(self, agent, method, *args):
+
+        self.forget(agent)
+
+        future = self.get_executor().submit(method, *args)
+        self.tickets[agent] = future
+        self.submitted += 1
+
+        return future
+
+    def forget(self, agent):
+
+        future = self.tickets.pop(agent, None)
+
+        if future:
+            future.cancel()
+            self.discarded += 1
+
+    def collect(self, agent, future):
+
+        """the result of a finished job, or None if the agent has asked for something else since"""
+
+        if self.tickets.get(agent) is not future:
+            return None
+
+        del self.tickets[agent]
+        self.completed += 1
+        return future.result()
+
+    def pending(self):
+        return len(self.tickets)
+
+    def shutdown(self):
+
+        for agent in list(self.tickets):
+            self.forget(agent)
+
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
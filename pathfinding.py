@@ -0,0 +1,1148 @@
+import collections
+import heapq
+import math
+import threading
+import numpy as np
+
+ROOT_TWO = math.sqrt(2.0)
+UNREACHABLE = 1000000000.0
+SEARCH_ARRAY = [(1, 0), (0, 1), (-1, 0), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def octile(dx, dy):
+    dx = abs(dx)
+    dy = abs(dy)
+
+    if dx > dy:
+        return dx + ((ROOT_TWO - 1.0) * dy)
+
+    return dy + ((ROOT_TWO - 1.0) * dx)
+
+
+def path_length(start, path):
+
+    length = 0.0
+    last = start
+
+    for key in path:
+        length += octile(key[0] - last[0], key[1] - last[1])
+        last = key
+
+    return length
+
+
+def line_tiles(start, end):
+
+    """the 8 connected tiles on the straight line from start to end, without start"""
+
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    steps = max(abs(dx), abs(dy))
+
+    return [(start[0] + int(round(dx * i / float(steps))), start[1] + int(round(dy * i / float(steps))))
+            for i in range(1, steps + 1)]
+
+
+def swept_tiles(start, line):
+
+    """the tiles of line plus the corners each diagonal step passes, for checking a footprint can follow it"""
+
+    swept = []
+    previous = start
+
+    for key in line:
+        if key[0] != previous[0] and key[1] != previous[1]:
+            swept.append((key[0], previous[1]))
+            swept.append((previous[0], key[1]))
+
+        swept.append(key)
+        previous = key
+
+    return swept
+
+
+def footprint_blocked(occupant_map, agent_id, span):
+
+    """true for every tile where an agent with its corner on that tile would overlap another occupant,
+    the same test as agent.check_occupied() with span tiles per side, done for the whole map at once.
+    """
+
+    return footprint_mask((occupant_map != 0) & (occupant_map != agent_id), span)
+
+
+def footprint_mask(occupied, span):
+
+    """footprint_blocked() for a map of occupied tiles.
+    the outer rows and columns are blocked too, so flat neighbour indices can't wrap around the edges.
+    """
+
+    width, height = occupied.shape
+
+    table = np.zeros((width + 1, height + 1), dtype=np.int32)
+    table[1:, 1:] = occupied.cumsum(axis=0, dtype=np.int32).cumsum(axis=1, dtype=np.int32)
+
+    blocked = np.ones((width, height), dtype=np.bool_)
+    sums = table[span:, span:] - table[:-span, span:] - table[span:, :-span] + table[:-span, :-span]
+    blocked[:width - span + 1, :height - span + 1] = sums > 0
+
+    return block_edges(blocked)
+
+
+def block_edges(blocked):
+    blocked[0, :] = True
+    blocked[-1, :] = True
+    blocked[:, 0] = True
+    blocked[:, -1] = True
+
+    return blocked
+
+
+def block_outside(blocked, origin, low, high):
+
+    """blocks every tile outside the keys low to high, so footprints stay inside the level"""
+
+    width, height = blocked.shape
+    low_x = min(width, max(0, low[0] - origin[0]))
+    low_y = min(height, max(0, low[1] - origin[1]))
+    high_x = max(0, high[0] - origin[0] + 1)
+    high_y = max(0, high[1] - origin[1] + 1)
+
+    blocked[:low_x, :] = True
+    blocked[high_x:, :] = True
+    blocked[:, :low_y] = True
+    blocked[:, high_y:] = True
+
+    return blocked
+
+
+def plan_path(occupant_map, origin, agent_id, span, start, goal, limits, finder_class=None, costs=None):
+
+    """one search on a copy of the occupant map, for running on the path service. returns (path, reached)"""
+
+    finder_class = finder_class or GridPathfinder
+    finder = finder_class(block_outside(footprint_blocked(occupant_map, agent_id, span), origin, *limits), origin,
+                          costs=costs)
+    path = finder.find_path(start, goal)
+    return path, finder.reached
+
+
+def search_window(occupant_map, origin, start, goal, margin, span):
+
+    """the part of the occupant map around start and goal, plus margin tiles and room for the footprint.
+    returns the cropped map and the key of its first tile
+    """
+
+    width, height = occupant_map.shape
+    low_x = max(0, min(start[0], goal[0]) - origin[0] - margin)
+    low_y = max(0, min(start[1], goal[1]) - origin[1] - margin)
+    high_x = min(width, max(start[0], goal[0]) - origin[0] + margin + span)
+    high_y = min(height, max(start[1], goal[1]) - origin[1] + margin + span)
+
+    return occupant_map[low_x:high_x, low_y:high_y], (low_x + origin[0], low_y + origin[1])
+
+
+def shifted(array, dx, dy, fill):
+
+    """result[x, y] is array[x + dx, y + dy], fill where that is off the array"""
+
+    width, height = array.shape
+    result = np.full(array.shape, fill, dtype=array.dtype)
+    result[max(0, -dx):min(width, width - dx), max(0, -dy):min(height, height - dy)] = \
+        array[max(0, dx):min(width, width + dx), max(0, dy):min(height, height + dy)]
+
+    return result
+
+
+class GridPathfinder(object):
+
+    """A* over a blocked array of tile corners, with 8 way movement and an octile heuristic.
+    diagonal steps need both orthogonal steps free so footprints can't cut corners.
+    keys are tile keys, origin is the key of blocked[0, 0].
+    costs, the same shape as blocked and never below 1.0, scales each step by the tile it enters,
+    the heuristic is scaled by the cheapest tile so it stays admissible.
+    """
+
+    def __init__(self, blocked, origin=(0, 0), max_nodes=40000, costs=None):
+
+        self.origin = origin
+        self.max_nodes = max_nodes
+        self.expanded = 0
+        self.reached = False
+        self.costs = None
+        self.cost_floor = 1.0
+
+        if costs is not None:
+            self.costs = costs.ravel().tolist()
+            self.cost_floor = max(1.0, float(costs.min()))
+
+        self.set_blocked(blocked)
+
+    def set_blocked(self, blocked):
+
+        self.width, self.height = blocked.shape
+        self.blocked_map = blocked
+        self.blocked = blocked.ravel().tolist()
+        self.steps = []
+
+        for x, y in SEARCH_ARRAY:
+            if x and y:
+                self.steps.append(((x * self.height) + y, ROOT_TWO, x * self.height, y))
+            else:
+                self.steps.append(((x * self.height) + y, 1.0, 0, 0))
+
+    def index(self, key):
+        x = int(key[0]) - self.origin[0]
+        y = int(key[1]) - self.origin[1]
+
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return (x * self.height) + y
+
+        return None
+
+    def key(self, index):
+        x, y = divmod(index, self.height)
+        return x + self.origin[0], y + self.origin[1]
+
+    def is_blocked(self, key):
+        index = self.index(key)
+        return index is None or self.blocked[index]
+
+    def nearest_open(self, key, radius=8):
+
+        """the closest unblocked tile to key within radius, so orders onto buildings still get a path"""
+
+        if not self.is_blocked(key):
+            return key
+
+        best = None
+        closest = radius + 1.0
+
+        for x in range(-radius, radius + 1):
+            for y in range(-radius, radius + 1):
+                check_key = (key[0] + x, key[1] + y)
+                distance = octile(x, y)
+
+                if distance < closest and not self.is_blocked(check_key):
+                    closest = distance
+                    best = check_key
+
+        return best
+
+    def find_path(self, start, goal):
+
+        """returns the list of tile keys from after start to goal.
+        if goal can't be reached the path goes to the closest tile that can be, an empty path means stay put.
+        returns None if start is outside the map.
+        """
+
+        self.expanded = 0
+        self.reached = False
+
+        start_index = self.index(start)
+        if start_index is None:
+            return None
+
+        goal = self.nearest_open(goal) or goal
+        goal_index = self.index(goal)
+        if goal_index == start_index:
+            self.reached = True
+            return []
+
+        height = self.height
+        blocked = self.blocked
+        tile_costs = self.costs
+        steps = self.steps
+        gx, gy = goal[0] - self.origin[0], goal[1] - self.origin[1]
+        diagonal_saving = ROOT_TWO - 2.0
+        cost_floor = self.cost_floor
+
+        def heuristic(index):
+            dx = abs((index // height) - gx)
+            dy = abs((index % height) - gy)
+            return (dx + dy + (diagonal_saving * min(dx, dy))) * cost_floor
+
+        start_h = heuristic(start_index)
+        costs = {start_index: 0.0}
+        parents = {start_index: None}
+        open_list = [(start_h, start_h, start_index)]
+        closed = set()
+
+        best_index = start_index
+        best_h = start_h
+
+        while open_list and self.expanded < self.max_nodes:
+            f, h, current = heapq.heappop(open_list)
+
+            if current in closed:
+                continue
+
+            if current == goal_index:
+                best_index = current
+                break
+
+            closed.add(current)
+            self.expanded += 1
+
+            if h < best_h:
+                best_h = h
+                best_index = current
+
+            current_cost = costs[current]
+
+            for step, step_cost, side_a, side_b in steps:
+                neighbor = current + step
+
+                if blocked[neighbor] or neighbor in closed:
+                    continue
+
+                if side_a and (blocked[current + side_a] or blocked[current + side_b]):
+                    continue
+
+                if tile_costs:
+                    new_cost = current_cost + (step_cost * tile_costs[neighbor])
+                else:
+                    new_cost = current_cost + step_cost
+
+                if new_cost < costs.get(neighbor, UNREACHABLE):
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = current
+                    neighbor_h = heuristic(neighbor)
+                    heapq.heappush(open_list, (new_cost + neighbor_h, neighbor_h, neighbor))
+
+        self.reached = best_index == goal_index
+        path = []
+        current = best_index
+
+        while current != start_index:
+            path.append(self.key(current))
+            current = parents[current]
+
+        path.reverse()
+        return path
+
+
+class JumpPointPathfinder(GridPathfinder):
+
+    """jump point search, same rules and results as GridPathfinder but much faster across open ground.
+
+    straight runs and diagonals are scanned without touching the open list, only tiles where the way around
+    an obstacle opens up (forced neighbours) are expanded. diagonals can't cut corners, so every straight jump
+    point also looks to both sides. blocked is a footprint map, so forced neighbours are found along the edges
+    a whole footprint can pass, not the edges of single tiles.
+    set_blocked() works out where each straight run stops, so a straight jump is one lookup.
+    when the goal can't be reached the search is repeated as plain A* for the closest tile.
+    jumps only work when every tile costs the same, with costs it's plain A*.
+    """
+
+    def set_blocked(self, blocked):
+        super().set_blocked(blocked)
+
+        if self.costs:
+            return
+
+        width, height = blocked.shape
+        indices = np.arange(width * height, dtype=np.int32).reshape(width, height)
+        self.stops = {}
+
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            if dx:
+                forced = ((~shifted(blocked, 0, 1, True) & shifted(blocked, -dx, 1, False)) |
+                          (~shifted(blocked, 0, -1, True) & shifted(blocked, -dx, -1, False)))
+            else:
+                forced = ((~shifted(blocked, 1, 0, True) & shifted(blocked, 1, -dy, False)) |
+                          (~shifted(blocked, -1, 0, True) & shifted(blocked, -1, -dy, False)))
+
+            stop = blocked | forced
+            axis = 0 if dx else 1
+            direction = dx or dy
+
+            if direction > 0:
+                candidates = np.where(stop, indices, width * height)
+                # reversed by slicing, np.flip with an axis needs a newer numpy than blender ships
+                if axis == 0:
+                    nearest = np.minimum.accumulate(candidates[::-1], axis=0)[::-1]
+                else:
+                    nearest = np.minimum.accumulate(candidates[:, ::-1], axis=1)[:, ::-1]
+            else:
+                candidates = np.where(stop, indices, -1)
+                nearest = np.maximum.accumulate(candidates, axis=axis)
+
+            # the first stop after each tile, tiles on the edges are blocked so never scanned from
+            self.stops[(dx, dy)] = shifted(nearest, dx, dy, 0).ravel()
+
+    def straight(self, current, dx, dy, goal_index):
+
+        stop = int(self.stops[(dx, dy)][current])
+
+        if dx:
+            on_line = (goal_index - current) % self.height == 0
+        else:
+            on_line = goal_index // self.height == current // self.height
+
+        if on_line and min(current, stop) <= goal_index <= max(current, stop) and goal_index != current:
+            if not self.blocked[goal_index]:
+                return goal_index
+
+        if self.blocked[stop]:
+            return None
+
+        return stop
+
+    def jump(self, current, dx, dy, goal_index):
+
+        """the next jump point from current heading dx, dy, or None if the way is blocked first"""
+
+        if not (dx and dy):
+            return self.straight(current, dx, dy, goal_index)
+
+        blocked = self.blocked
+        step = (dx * self.height) + dy
+        side_x = dx * self.height
+
+        while not blocked[current + side_x] and not blocked[current + dy]:
+            current += step
+
+            if blocked[current]:
+                return None
+
+            if current == goal_index:
+                return current
+
+            if self.straight(current, dx, 0, goal_index) is not None or \
+                    self.straight(current, 0, dy, goal_index) is not None:
+                return current
+
+        return None
+
+    def directions(self, current, parent):
+
+        if parent is None:
+            return SEARCH_ARRAY
+
+        px, py = divmod(parent, self.height)
+        cx, cy = divmod(current, self.height)
+        dx = (cx > px) - (cx < px)
+        dy = (cy > py) - (cy < py)
+
+        if dx and dy:
+            return [(dx, 0), (0, dy), (dx, dy)]
+
+        if dx:
+            return [(dx, 0), (dx, 1), (dx, -1), (0, 1), (0, -1)]
+
+        return [(0, dy), (1, dy), (-1, dy), (1, 0), (-1, 0)]
+
+    def find_path(self, start, goal):
+
+        if self.costs:
+            return super().find_path(start, goal)
+
+        self.expanded = 0
+        self.reached = False
+
+        start_index = self.index(start)
+        if start_index is None:
+            return None
+
+        goal = self.nearest_open(goal) or goal
+        goal_index = self.index(goal)
+        if goal_index == start_index:
+            self.reached = True
+            return []
+
+        height = self.height
+        gx, gy = goal[0] - self.origin[0], goal[1] - self.origin[1]
+
+        def heuristic(index):
+            x, y = divmod(index, height)
+            return octile(x - gx, y - gy)
+
+        start_h = heuristic(start_index)
+        costs = {start_index: 0.0}
+        parents = {start_index: None}
+        open_list = [(start_h, start_h, start_index)]
+        closed = set()
+
+        best_index = start_index
+        best_h = start_h
+
+        while open_list and self.expanded < self.max_nodes:
+            f, h, current = heapq.heappop(open_list)
+
+            if current in closed:
+                continue
+
+            if current == goal_index:
+                best_index = current
+                break
+
+            closed.add(current)
+            self.expanded += 1
+
+            if h < best_h:
+                best_h = h
+                best_index = current
+
+            current_cost = costs[current]
+            cx, cy = divmod(current, height)
+
+            for dx, dy in self.directions(current, parents[current]):
+                jump_point = self.jump(current, dx, dy, goal_index)
+
+                if jump_point is None or jump_point in closed:
+                    continue
+
+                jx, jy = divmod(jump_point, height)
+                new_cost = current_cost + octile(jx - cx, jy - cy)
+
+                if new_cost < costs.get(jump_point, UNREACHABLE):
+                    costs[jump_point] = new_cost
+                    parents[jump_point] = current
+                    jump_h = heuristic(jump_point)
+                    heapq.heappush(open_list, (new_cost + jump_h, jump_h, jump_point))
+
+        if best_index != goal_index:
+            # jump points are too sparse to find the closest tile to an unreachable goal, so flood it the slow way
+            expanded = self.expanded
+            path = super().find_path(start, goal)
+            self.expanded += expanded
+            return path
+
+        self.reached = True
+        path = []
+        current = best_index
+
+        while current != start_index:
+            parent = parents[current]
+            cx, cy = divmod(current, height)
+            px, py = divmod(parent, height)
+            dx = (cx > px) - (cx < px)
+            dy = (cy > py) - (cy < py)
+
+            for i in range(max(abs(cx - px), abs(cy - py))):
+                path.append(self.key(current - (i * ((dx * height) + dy))))
+
+            current = parent
+
+        path.reverse()
+        return path
+
+
+def window_pathfinder(blocked, origin, low, high):
+
+    """a GridPathfinder over blocked[low:high] with a blocked ring around it, low and high are array indices"""
+
+    low_x = max(0, low[0] - 1)
+    low_y = max(0, low[1] - 1)
+    window = block_edges(blocked[low_x:high[0] + 1, low_y:high[1] + 1].copy())
+
+    return GridPathfinder(window, (low_x + origin[0], low_y + origin[1]))
+
+
+class ClusterGraph(GridPathfinder):
+
+    """hierarchical path finding (HPA*) over square clusters of cluster_size tiles.
+
+    where a run of open tiles crosses the border of two clusters there's a transition, a pair of entrance nodes,
+    one at the middle of short runs and one at each end of long ones. searches run over entrance nodes,
+    then each step is refined with a small A* inside one cluster.
+    costs between the entrances of a cluster are worked out the first time a search reaches it and kept,
+    update_area() rebuilds only the clusters around a change, like a building being placed.
+    searches and updates hold a lock, so searches can run on the path service.
+    """
+
+    def __init__(self, blocked, origin=(0, 0), cluster_size=16):
+        super().__init__(blocked, origin)
+
+        self.lock = threading.Lock()
+        self.cluster_size = cluster_size
+        self.clusters_x = int(math.ceil(self.width / float(cluster_size)))
+        self.clusters_y = int(math.ceil(self.height / float(cluster_size)))
+
+        self.cluster_nodes = {}
+        self.transitions = {}
+        self.inter = {}
+        self.intra = {}
+        self.built = set()
+
+        for cx in range(self.clusters_x):
+            for cy in range(self.clusters_y):
+                self.cluster_nodes[(cx, cy)] = set()
+
+        for cluster in self.cluster_nodes:
+            for neighbor in self.next_clusters(cluster):
+                self.add_border(cluster, neighbor)
+
+    def next_clusters(self, cluster):
+
+        """the clusters after this one in x and y, so each border is only visited once"""
+
+        cx, cy = cluster
+        neighbors = []
+
+        if cx + 1 < self.clusters_x:
+            neighbors.append((cx + 1, cy))
+        if cy + 1 < self.clusters_y:
+            neighbors.append((cx, cy + 1))
+
+        return neighbors
+
+    def get_cluster(self, index):
+        x, y = divmod(index, self.height)
+        return x // self.cluster_size, y // self.cluster_size
+
+    def cluster_bounds(self, cluster):
+        low_x = cluster[0] * self.cluster_size
+        low_y = cluster[1] * self.cluster_size
+        return (low_x, low_y), (min(self.width, low_x + self.cluster_size),
+                                min(self.height, low_y + self.cluster_size))
+
+    def add_border(self, cluster, neighbor):
+
+        height = self.height
+        blocked = self.blocked
+        (low_x, low_y), (high_x, high_y) = self.cluster_bounds(cluster)
+
+        if neighbor[0] != cluster[0]:
+            x = high_x - 1
+            line = [((x * height) + y, ((x + 1) * height) + y) for y in range(low_y, high_y)]
+        else:
+            y = high_y - 1
+            line = [((x * height) + y, (x * height) + y + 1) for x in range(low_x, high_x)]
+
+        transitions = []
+        run = []
+
+        for pair in line + [None]:
+            if pair and not blocked[pair[0]] and not blocked[pair[1]]:
+                run.append(pair)
+
+            elif run:
+                if len(run) < 6:
+                    transitions.append(run[len(run) // 2])
+                else:
+                    transitions.append(run[0])
+                    transitions.append(run[-1])
+
+                run = []
+
+        for node, other in transitions:
+            self.cluster_nodes[cluster].add(node)
+            self.cluster_nodes[neighbor].add(other)
+            self.inter.setdefault(node, {})[other] = 1.0
+            self.inter.setdefault(other, {})[node] = 1.0
+
+        self.transitions[(cluster, neighbor)] = transitions
+
+    def remove_border(self, cluster, neighbor):
+
+        for node, other in self.transitions.pop((cluster, neighbor), []):
+            for from_node, to_node, to_cluster in ((node, other, cluster), (other, node, neighbor)):
+                edges = self.inter.get(from_node)
+
+                if edges is not None:
+                    edges.pop(to_node, None)
+
+                    if not edges:
+                        del self.inter[from_node]
+                        self.intra.pop(from_node, None)
+                        self.cluster_nodes[to_cluster].discard(from_node)
+
+    def cluster_costs(self, source, cluster, targets):
+
+        """path costs from source to each reachable target, without leaving the cluster"""
+
+        height = self.height
+        blocked = self.blocked
+        (low_x, low_y), (high_x, high_y) = self.cluster_bounds(cluster)
+
+        remaining = set(targets)
+        remaining.discard(source)
+        found = {}
+
+        costs = {source: 0.0}
+        open_list = [(0.0, source)]
+        closed = set()
+
+        while open_list and remaining:
+            cost, current = heapq.heappop(open_list)
+
+            if current in closed:
+                continue
+
+            closed.add(current)
+
+            if current in remaining:
+                found[current] = cost
+                remaining.discard(current)
+
+            for step, step_cost, side_a, side_b in self.steps:
+                neighbor = current + step
+
+                if blocked[neighbor] or neighbor in closed:
+                    continue
+
+                x, y = divmod(neighbor, height)
+                if not (low_x <= x < high_x and low_y <= y < high_y):
+                    continue
+
+                if side_a and (blocked[current + side_a] or blocked[current + side_b]):
+                    continue
+
+                new_cost = cost + step_cost
+
+                if new_cost < costs.get(neighbor, UNREACHABLE):
+                    costs[neighbor] = new_cost
+                    heapq.heappush(open_list, (new_cost, neighbor))
+
+        return found
+
+    def build_cluster(self, cluster):
+
+        nodes = self.cluster_nodes[cluster]
+
+        for node in nodes:
+            self.intra[node] = self.cluster_costs(node, cluster, nodes)
+
+        self.built.add(cluster)
+
+    def get_edges(self, node):
+
+        cluster = self.get_cluster(node)
+        if cluster not in self.built:
+            self.build_cluster(cluster)
+
+        return self.intra[node], self.inter.get(node, {})
+
+    def update_area(self, blocked, low, high):
+        with self.lock:
+            return self.rebuild_area(blocked, low, high)
+
+    def rebuild_area(self, blocked, low, high):
+
+        """swap in a new blocked map, then rebuild the clusters touching the tile keys from low to high"""
+
+        self.set_blocked(blocked)
+
+        low_x = max(0, (low[0] - self.origin[0]) // self.cluster_size)
+        low_y = max(0, (low[1] - self.origin[1]) // self.cluster_size)
+        high_x = min(self.clusters_x - 1, (high[0] - self.origin[0]) // self.cluster_size)
+        high_y = min(self.clusters_y - 1, (high[1] - self.origin[1]) // self.cluster_size)
+
+        borders = set()
+        stale = set()
+
+        for cx in range(low_x, high_x + 1):
+            for cy in range(low_y, high_y + 1):
+                for neighbor in ((cx - 1, cy), (cx, cy - 1)):
+                    if neighbor in self.cluster_nodes:
+                        borders.add((neighbor, (cx, cy)))
+
+                for neighbor in self.next_clusters((cx, cy)):
+                    borders.add(((cx, cy), neighbor))
+
+        for cluster, neighbor in borders:
+            self.remove_border(cluster, neighbor)
+            stale.add(cluster)
+            stale.add(neighbor)
+
+        for cluster, neighbor in borders:
+            self.add_border(cluster, neighbor)
+
+        self.built -= stale
+        return len(stale)
+
+    def abstract_path(self, start, goal):
+        with self.lock:
+            return self.search_entrances(start, goal)
+
+    def search_entrances(self, start, goal):
+
+        """the entrance nodes on the way from start to goal, ending with goal,
+        or None if goal can't be reached. goals on blocked tiles are moved like find_path() does
+        """
+
+        self.expanded = 0
+        start_index = self.index(start)
+        if start_index is None:
+            return None
+
+        goal = self.nearest_open(goal) or goal
+        goal_index = self.index(goal)
+        if goal_index is None:
+            return None
+
+        if goal_index == start_index:
+            return []
+
+        start_cluster = self.get_cluster(start_index)
+        goal_cluster = self.get_cluster(goal_index)
+
+        start_targets = set(self.cluster_nodes[start_cluster])
+        if start_cluster == goal_cluster:
+            start_targets.add(goal_index)
+
+        start_edges = self.cluster_costs(start_index, start_cluster, start_targets)
+        goal_edges = self.cluster_costs(goal_index, goal_cluster, self.cluster_nodes[goal_cluster])
+
+        height = self.height
+        gx, gy = divmod(goal_index, height)
+
+        def heuristic(index):
+            x, y = divmod(index, height)
+            return octile(x - gx, y - gy)
+
+        start_h = heuristic(start_index)
+        costs = {start_index: 0.0}
+        parents = {start_index: None}
+        open_list = [(start_h, start_index)]
+        closed = set()
+
+        while open_list:
+            f, current = heapq.heappop(open_list)
+
+            if current == goal_index:
+                path = []
+                while current != start_index:
+                    path.append(self.key(current))
+                    current = parents[current]
+
+                path.reverse()
+                return path
+
+            if current in closed:
+                continue
+
+            closed.add(current)
+            self.expanded += 1
+            current_cost = costs[current]
+
+            if current == start_index:
+                edge_lists = (start_edges,)
+            else:
+                edge_lists = self.get_edges(current)
+
+            for edges in edge_lists:
+                for neighbor, edge_cost in edges.items():
+                    self.push_node(open_list, costs, parents, current, current_cost + edge_cost, neighbor, heuristic)
+
+            if current in goal_edges:
+                self.push_node(open_list, costs, parents, current, current_cost + goal_edges[current], goal_index,
+                               heuristic)
+
+        return None
+
+    def push_node(self, open_list, costs, parents, current, new_cost, neighbor, heuristic):
+        if new_cost < costs.get(neighbor, UNREACHABLE):
+            costs[neighbor] = new_cost
+            parents[neighbor] = current
+            heapq.heappush(open_list, (new_cost + heuristic(neighbor), neighbor))
+
+    def refine(self, start, nodes):
+
+        """the tile path along a list of entrance nodes, each step only searches the cluster it crosses"""
+
+        path = []
+        current = start
+
+        for node in nodes:
+            if abs(node[0] - current[0]) + abs(node[1] - current[1]) == 1:
+                path.append(node)
+
+            else:
+                cluster = self.get_cluster(self.index(node))
+                low, high = self.cluster_bounds(cluster)
+                finder = window_pathfinder(self.blocked_map, self.origin, low, high)
+                step_path = finder.find_path(current, node)
+
+                if not finder.reached:
+                    return None
+
+                path.extend(step_path)
+
+            current = node
+
+        return path
+
+    def hierarchical_path(self, start, goal):
+        nodes = self.abstract_path(start, goal)
+        if nodes is None:
+            return None
+
+        return self.refine(start, nodes)
+
+
+class FlowField(GridPathfinder):
+
+    """an integration field, the path cost from every tile to the nearest of the goal tiles.
+    a whole group can walk down it from anywhere in the map without searching again.
+    the edges of blocked are blocked, tiles that can't reach a goal have a cost of UNREACHABLE
+    """
+
+    def __init__(self, blocked, origin, goals):
+        super().__init__(block_edges(blocked.copy()), origin)
+
+        self.goals = goals
+        self.costs = self.integrate()
+
+    def integrate(self):
+
+        blocked = self.blocked
+        costs = [UNREACHABLE] * len(blocked)
+        open_list = []
+
+        for goal in self.goals:
+            index = self.index(self.nearest_open(goal) or goal)
+
+            if index is not None and not blocked[index]:
+                costs[index] = 0.0
+                open_list.append((0.0, index))
+
+        heapq.heapify(open_list)
+
+        while open_list:
+            cost, current = heapq.heappop(open_list)
+
+            if cost > costs[current]:
+                continue
+
+            self.expanded += 1
+
+            for step, step_cost, side_a, side_b in self.steps:
+                neighbor = current + step
+
+                if blocked[neighbor]:
+                    continue
+
+                if side_a and (blocked[current + side_a] or blocked[current + side_b]):
+                    continue
+
+                new_cost = cost + step_cost
+
+                if new_cost < costs[neighbor]:
+                    costs[neighbor] = new_cost
+                    heapq.heappush(open_list, (new_cost, neighbor))
+
+        return costs
+
+    def get_cost(self, key):
+        index = self.index(key)
+        if index is None:
+            return UNREACHABLE
+
+        return self.costs[index]
+
+    def next_steps(self, key):
+
+        """the neighbours of key that are closer to a goal, best first"""
+
+        index = self.index(key)
+        if index is None or self.costs[index] >= UNREACHABLE:
+            return []
+
+        blocked = self.blocked
+        costs = self.costs
+        current_cost = costs[index]
+        steps = []
+
+        for step, step_cost, side_a, side_b in self.steps:
+            neighbor = index + step
+
+            if blocked[neighbor] or costs[neighbor] >= current_cost:
+                continue
+
+            if side_a and (blocked[index + side_a] or blocked[index + side_b]):
+                continue
+
+            steps.append((costs[neighbor], neighbor))
+
+        return [self.key(neighbor) for cost, neighbor in sorted(steps)]
+
+
+class PathCache(object):
+
+    """finished paths kept by (start region, goal region, footprint span, drive type), the least recently used
+    are dropped.
+
+    set_occupied() and clear_occupied() mark the regions they touch as dirty. a cached path is only checked
+    again where its corridor, the regions under its footprints, has been dirtied since it was last used,
+    and it's thrown away if anything now stands on it there.
+    """
+
+    def __init__(self, region_size=16, capacity=256):
+
+        self.region_size = region_size
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.versions = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_region(self, key):
+        return key[0] // self.region_size, key[1] // self.region_size
+
+    def mark_dirty(self, low, high):
+
+        """bumps the version of every region touching the tiles from low to high"""
+
+        low_x, low_y = self.get_region(low)
+        high_x, high_y = self.get_region(high)
+
+        for x in range(low_x, high_x + 1):
+            for y in range(low_y, high_y + 1):
+                self.versions[(x, y)] = self.versions.get((x, y), 0) + 1
+
+    def footprint_regions(self, key, span):
+        x, y = key
+        far_x = x + span - 1
+        far_y = y + span - 1
+
+        return {self.get_region((x, y)), self.get_region((far_x, y)), self.get_region((x, far_y)),
+                self.get_region((far_x, far_y))}
+
+    def corridor(self, path, span):
+
+        regions = set()
+
+        for key in path:
+            regions |= self.footprint_regions(key, span)
+
+        return {region: self.versions.get(region, 0) for region in regions}
+
+    def get(self, start, goal, span, check_blocked, drive_type=None):
+
+        """a cached (start, path) pair for this journey or None.
+        check_blocked(tiles) is called with the path tiles in dirtied regions and should be True if any is blocked
+        """
+
+        cache_key = (self.get_region(start), self.get_region(goal), span, drive_type)
+        entry = self.entries.get(cache_key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        path_start, path, corridor = entry
+        dirty = set(region for region, version in corridor.items() if self.versions.get(region, 0) != version)
+
+        if dirty:
+            tiles = [key for key in path if not dirty.isdisjoint(self.footprint_regions(key, span))]
+
+            if tiles and check_blocked(tiles):
+                del self.entries[cache_key]
+                self.invalidated += 1
+                self.misses += 1
+                return None
+
+            for region in dirty:
+                corridor[region] = self.versions.get(region, 0)
+
+        self.entries.move_to_end(cache_key)
+        self.hits += 1
+        return path_start, path
+
+    def put(self, start, goal, span, path, drive_type=None):
+
+        cache_key = (self.get_region(start), self.get_region(goal), span, drive_type)
+        self.entries[cache_key] = (start, list(path), self.corridor(path, span))
+        self.entries.move_to_end(cache_key)
+
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class VisitedTiles(object):
+
+    """the last limit tiles a walker stepped on, counted in a dict for membership and kept in a ring buffer for
+    their order, so memory stays bounded and the oldest tile drops out as each new one goes in.
+
+    add() also takes the distance left to the goal. a walker that has gone patience steps without beating its
+    closest is going round in circles, looping() says so and the caller can hand it to a full planner.
+    """
+
+    def __init__(self, limit=25, patience=None):
+
+        self.limit = limit
+        self.patience = patience or limit
+        self.counts = {}
+        self.order = collections.deque()
+        self.best = None
+        self.since_best = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def add(self, key, distance=None):
+
+        self.order.append(key)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+        if len(self.order) > self.limit:
+            oldest = self.order.popleft()
+            count = self.counts[oldest] - 1
+
+            if count:
+                self.counts[oldest] = count
+            else:
+                del self.counts[oldest]
+
+        if distance is not None:
+            if self.best is None or distance < self.best - 0.01:
+                self.best = distance
+                self.since_best = 0
+            else:
+                self.since_best += 1
+
+    def looping(self):
+        return self.since_best >= self.patience
+
+    def reset_progress(self):
+
+        """forget the closest distance, for when the goal moves"""
+
+        self.best = None
+        self.since_best = 0
+
+    def clear(self):
+
+        self.counts.clear()
+        self.order.clear()
+        self.reset_progress()
+
+
+class StuckCounter(object):
+
+    """counts the times agents get stuck and the ticks they lose to it.
+    waits are pauses in front of a blocked step, loops are walkers caught going round in circles,
+    escalated are loops handed to a full planner and gave_up are orders dropped because the agent was stuck
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+
+        self.waits = 0
+        self.wasted_ticks = 0
+        self.loops = 0
+        self.escalated = 0
+        self.gave_up = 0
+
+    def waited(self, ticks):
+        self.waits += 1
+        self.wasted_ticks += ticks
+
+    def report(self):
+        return {"waits": self.waits, "wasted_ticks": self.wasted_ticks, "loops": self.loops,
+                "escalated": self.escalated, "gave_up": self.gave_up}
@@ -0,0 +1,236 @@
+import collections
+import functools
+import json
+import time
+
+
+def percentile(sorted_times, fraction):
+    if not sorted_times:
+        return 0.0
+
+    index = min(len(sorted_times) - 1, int(round(fraction * (len(sorted_times) - 1))))
+    return sorted_times[index]
+
+
+class ProfileScope(object):
+
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.begin(self.name)
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.profiler.end()
+        return False
+
+
+class NullScope(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+
+NULL_SCOPE = NullScope()
+
+
+class Profiler(object):
+
+    """nested timing scopes collected per frame.
+
+    scopes are named by their path, "main_state_machine/agents_update/ManAction.update",
+    a scope entered many times in one frame adds up to one sample for that frame.
+    the last frames are kept in a ring buffer for min / mean / p95 / p99,
+    when tracing the individual scope events are kept too and can be saved as a chrome trace.
+
+    when disabled, scope() hands back a shared null context and profiled methods only check one flag.
+    """
+
+    def __init__(self, frames=300, trace_frames=120, enabled=False):
+
+        self.enabled = enabled
+        self.tracing = False
+
+        self.history = collections.deque(maxlen=frames)
+        self.trace = collections.deque(maxlen=trace_frames)
+
+        self.stack = []
+        self.frame_totals = {}
+        self.frame_counts = {}
+        self.frame_events = []
+        self.frame_number = 0
+        self.frame_start = time.perf_counter()
+        self.origin = self.frame_start
+
+    def begin(self, name):
+
+        if self.stack:
+            path = "{}/{}".format(self.stack[-1][0], name)
+        else:
+            path = name
+
+        self.stack.append((path, time.perf_counter()))
+
+    def end(self):
+
+        end_time = time.perf_counter()
+
+        if not self.stack:
+            return
+
+        path, start_time = self.stack.pop()
+        duration = end_time - start_time
+
+        self.frame_totals[path] = self.frame_totals.get(path, 0.0) + duration
+        self.frame_counts[path] = self.frame_counts.get(path, 0) + 1
+
+        if self.tracing:
+            self.frame_events.append((path, start_time, duration))
+
+    def scope(self, name):
+        if self.enabled:
+            return ProfileScope(self, name)
+
+        return NULL_SCOPE
+
+    def end_frame(self):
+
+        """closes the current frame, frame time is measured from the end of the last frame"""
+
+        end_time = time.perf_counter()
+
+        if self.enabled:
+            frame_time = end_time - self.frame_start
+            self.history.append((self.frame_number, frame_time, self.frame_totals, self.frame_counts))
+
+            if self.tracing:
+                self.trace.append((self.frame_number, self.frame_start, frame_time, self.frame_events))
+
+            self.frame_number += 1
+
+        self.frame_totals = {}
+        self.frame_counts = {}
+        self.frame_events = []
+        self.frame_start = end_time
+
+    def clear(self):
+        self.history.clear()
+        self.trace.clear()
+        self.stack = []
+        self.frame_totals = {}
+        self.frame_counts = {}
+        self.frame_events = []
+
+    def stats(self):
+
+        """per scope path, times in milliseconds over the frames where the scope ran"""
+
+        samples = {"frame": []}
+        calls = {"frame": 0}
+
+        for frame_number, frame_time, totals, counts in self.history:
+            samples["frame"].append(frame_time * 1000.0)
+            calls["frame"] += 1
+
+            for path in totals:
+                samples.setdefault(path, []).append(totals[path] * 1000.0)
+                calls[path] = calls.get(path, 0) + counts[path]
+
+        stats = {}
+
+        for path in samples:
+            times = sorted(samples[path])
+            if times:
+                stats[path] = {"frames": len(times), "calls": calls[path], "min": times[0],
+                               "mean": sum(times) / len(times), "p95": percentile(times, 0.95),
+                               "p99": percentile(times, 0.99), "max": times[-1]}
+
+        return stats
+
+    def report_lines(self, max_depth=3):
+
+        """one line per scope for the debug console, children indented under their parent"""
+
+        stats = self.stats()
+        lines = []
+
+        for path in sorted(stats, key=lambda stats_path: (stats_path != "frame", stats_path)):
+            depth = path.count("/")
+            if depth >= max_depth:
+                continue
+
+            scope_stats = stats[path]
+            name = "{}{}".format("  " * depth, path.rsplit("/", 1)[-1])
+            lines.append("{:<30}:{:>9.3f}ms p95{:>9.3f}ms p99{:>9.3f}ms".format(name, scope_stats["mean"],
+                                                                                 scope_stats["p95"],
+                                                                                 scope_stats["p99"]))
+
+        return lines
+
+    def start_trace(self):
+        self.trace.clear()
+        self.frame_events = []
+        self.tracing = True
+
+    def stop_trace(self):
+        self.tracing = False
+
+    def chrome_trace(self):
+
+        """the traced frames as chrome://tracing / perfetto complete events, times in microseconds"""
+
+        events = []
+
+        for frame_number, frame_start, frame_time, frame_events in self.trace:
+            events.append({"name": "frame {}".format(frame_number), "cat": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": (frame_start - self.origin) * 1000000.0, "dur": frame_time * 1000000.0})
+
+            for path, start_time, duration in frame_events:
+                events.append({"name": path.rsplit("/", 1)[-1], "cat": "scope", "ph": "X", "pid": 0, "tid": 0,
+                               "ts": (start_time - self.origin) * 1000000.0, "dur": duration * 1000000.0,
+                               "args": {"path": path}})
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, out_path):
+        with open(out_path, "w") as out_file:
+            json.dump(self.chrome_trace(), out_file)
+
+
+PROFILER = Profiler()
+
+
+def scope(name):
+    return PROFILER.scope(name)
+
+
+def profiled(name=None):
+
+    """decorator for hot paths, times every call as a scope of the shared profiler"""
+
+    def decorate(method):
+        scope_name = name or method.__qualname__
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return method(*args, **kwargs)
+
+            PROFILER.begin(scope_name)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                PROFILER.end()
+
+        return wrapper
+
+    return decorate
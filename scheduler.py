@@ -0,0 +1,66 @@
+import collections
+import time
+
+
+class AgentScheduler(object):
+
+    """runs deferrable agent work, like target searches and path decisions, under a per tick time budget.
+
+    agents ask for a task with request(agent, task_name, method), asking again while it is waiting only
+    swaps the method. tasks for selected or on screen agents go first, the rest are round robin.
+    at least one normal task runs every tick so off screen agents always make progress.
+    """
+
+    def __init__(self, budget=2.0):
+
+        self.budget = budget
+        self.tasks = {}
+        self.priority_queue = collections.deque()
+        self.queue = collections.deque()
+
+        self.ran = 0
+        self.waiting = 0
+
+    def request(self, agent, task_name, method):
+
+        key = (agent, task_name)
+
+        if key not in self.tasks:
+            if agent.selected or agent.on_screen:
+                self.priority_queue.append(key)
+            else:
+                self.queue.append(key)
+
+        self.tasks[key] = method
+
+    def pending(self, agent, task_name):
+        return (agent, task_name) in self.tasks
+
+    def run_task(self, queue):
+
+        key = queue.popleft()
+        method = self.tasks.pop(key)
+
+        if key[0].ended:
+            return False
+
+        method()
+        return True
+
+    def update(self):
+
+        budget = self.budget / 1000.0
+        timer = time.perf_counter()
+        ran = 0
+        normal_ran = 0
+
+        while self.priority_queue and time.perf_counter() - timer < budget:
+            ran += self.run_task(self.priority_queue)
+
+        while self.queue and (not normal_ran or time.perf_counter() - timer < budget):
+            if self.run_task(self.queue):
+                ran += 1
+                normal_ran += 1
+
+        self.ran = ran
+        self.waiting = len(self.tasks)
@@ -0,0 +1,103 @@
+import collections
+import math
+
+
+class SpatialHash(object):
+
+    """a uniform grid of agent positions for radius and nearest queries.
+
+    agents are stored by cell, update() moves an agent between cells only when it crosses a cell edge.
+    cells are ordered dicts, plain dicts only keep insertion order from python 3.7 and the game runs on 3.5,
+    so ties are broken the same way on every run.
+    """
+
+    def __init__(self, cell_size=32.0):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.positions = {}
+        self.agent_cells = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, agent):
+        return agent in self.positions
+
+    def get_cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def update(self, agent, position):
+
+        x = float(position[0])
+        y = float(position[1])
+        cell = self.get_cell(x, y)
+        old_cell = self.agent_cells.get(agent)
+
+        if cell != old_cell:
+            if old_cell is not None:
+                self.remove_from_cell(agent, old_cell)
+
+            members = self.cells.get(cell)
+            if members is None:
+                members = self.cells[cell] = collections.OrderedDict()
+
+            members[agent] = None
+            self.agent_cells[agent] = cell
+
+        self.positions[agent] = (x, y)
+
+    def remove_from_cell(self, agent, cell):
+        members = self.cells[cell]
+        del members[agent]
+
+        if not members:
+            del self.cells[cell]
+
+    def remove(self, agent):
+
+        cell = self.agent_cells.pop(agent, None)
+        if cell is not None:
+            self.remove_from_cell(agent, cell)
+            del self.positions[agent]
+
+    def query(self, position, radius):
+
+        """yields (agent, distance) for agents closer than radius"""
+
+        x = float(position[0])
+        y = float(position[1])
+        low_x, low_y = self.get_cell(x - radius, y - radius)
+        high_x, high_y = self.get_cell(x + radius, y + radius)
+        radius_squared = radius * radius
+
+        for cx in range(low_x, high_x + 1):
+            for cy in range(low_y, high_y + 1):
+                members = self.cells.get((cx, cy))
+
+                if members:
+                    for agent in members:
+                        ax, ay = self.positions[agent]
+                        distance_squared = ((ax - x) * (ax - x)) + ((ay - y) * (ay - y))
+
+                        if distance_squared < radius_squared:
+                            yield agent, math.sqrt(distance_squared)
+
+    def nearest(self, position, radius, condition=None):
+
+        best = None
+        closest = radius
+
+        for agent, distance in self.query(position, radius):
+            if distance < closest and (not condition or condition(agent)):
+                closest = distance
+                best = agent
+
+        return best
+
+    def any_within(self, position, radius, condition=None):
+
+        for agent, distance in self.query(position, radius):
+            if not condition or condition(agent):
+                return True
+
+        return False
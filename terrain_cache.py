@@ -0,0 +1,119 @@
+import hashlib
+import os
+
+import numpy as np
+
+CACHE_VERSION = 2
+
+
+def vertex_digest(mesh):
+
+    """a hash of every vertex position, so moving vertices changes the key even when the topology stays the same"""
+
+    digest = hashlib.sha1()
+
+    for material_index in range(mesh.numMaterials):
+        positions = [list(mesh.getVertex(material_index, i).XYZ)
+                     for i in range(mesh.getVertexArrayLength(material_index))]
+        digest.update(np.array(positions, dtype=np.float32).tobytes())
+
+    return digest.hexdigest()
+
+
+def terrain_signature(ground_object):
+
+    """everything about the ground object which changes the surveyed heights,
+    if the mesh, its vertex positions or its transform change the cache key changes too
+    """
+
+    parts = [str(CACHE_VERSION), ground_object.name]
+
+    for mesh in ground_object.meshes:
+        vertex_counts = [mesh.getVertexArrayLength(i) for i in range(mesh.numMaterials)]
+        parts.append("{}:{}:{}:{}".format(mesh.name, mesh.numPolygons, vertex_counts, vertex_digest(mesh)))
+
+    transform = [round(value, 4) for row in ground_object.worldTransform for value in row]
+    parts.append(str(transform))
+
+    return ";".join(parts)
+
+
+def make_key(*parts):
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class HeightfieldCache(object):
+
+    """saves the surveyed tile grid arrays as .npy files and memory maps them on later launches.
+
+    heights and normals only depend on the ground object and level size. off road data comes from the terrain
+    field, which is generated again every launch, so it's set from the field each time instead of cached.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def terrain_key(self, ground_object, level_size, mode="RAY"):
+        return make_key("heights", terrain_signature(ground_object), level_size, mode)
+
+    def get_path(self, key, array_name):
+        return os.path.join(self.cache_dir, "{}_{}.npy".format(key, array_name))
+
+    def save_array(self, key, array_name, array):
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        path = self.get_path(key, array_name)
+        temp_path = "{}.tmp".format(path)
+
+        with open(temp_path, "wb") as out_file:
+            np.save(out_file, np.ascontiguousarray(array))
+
+        os.replace(temp_path, path)
+
+    def load_array(self, key, array_name, shape, dtype):
+
+        path = self.get_path(key, array_name)
+
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            array = np.load(path, mmap_mode="c")
+        except (ValueError, OSError):
+            return None
+
+        if array.shape != shape or array.dtype != dtype:
+            return None
+
+        return array
+
+    def save_heights(self, grid, key):
+        self.save_array(key, "height", grid.height)
+        self.save_array(key, "normal", grid.normal)
+        self.save_array(key, "hit", grid.hit)
+
+    def load_heights(self, grid, key):
+
+        height = self.load_array(key, "height", grid.height.shape, grid.height.dtype)
+        normal = self.load_array(key, "normal", grid.normal.shape, grid.normal.dtype)
+        hit = self.load_array(key, "hit", grid.hit.shape, grid.hit.dtype)
+
+        if height is None or normal is None or hit is None:
+            return False
+
+        grid.height = height
+        grid.normal = normal
+        grid.hit = hit
+
+        return True
+
+    def clear(self, *keys):
+
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        for file_name in os.listdir(self.cache_dir):
+            if any(file_name.startswith(key) for key in keys):
+                os.remove(os.path.join(self.cache_dir, file_name))
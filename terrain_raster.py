@@ -0,0 +1,158 @@
+import numpy as np
+
+
+def get_mesh_triangles(ground_object):
+
+    """reads the ground object's mesh once and returns world space vertices and triangle indices
+    quads are split in to two triangles
+    """
+
+    matrix = np.array([list(row) for row in ground_object.worldTransform], dtype=np.float64)
+
+    vertices = []
+    triangles = []
+    offset = 0
+
+    for mesh in ground_object.meshes:
+        material_offsets = []
+
+        for material_index in range(mesh.numMaterials):
+            material_offsets.append(offset)
+
+            for i in range(mesh.getVertexArrayLength(material_index)):
+                vertices.append(list(mesh.getVertex(material_index, i).XYZ))
+                offset += 1
+
+        for i in range(mesh.numPolygons):
+            polygon = mesh.getPolygon(i)
+            material_offset = material_offsets[polygon.getMaterialIndex()]
+            indexes = [material_offset + polygon.getVertexIndex(v) for v in range(polygon.getNumVertex())]
+
+            triangles.append(indexes[:3])
+            if len(indexes) > 3:
+                triangles.append([indexes[0], indexes[2], indexes[3]])
+
+    vertices = np.array(vertices, dtype=np.float64).reshape(-1, 3)
+    triangles = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
+    homogeneous = np.hstack([vertices, np.ones((len(vertices), 1))])
+    vertices = (homogeneous @ matrix.T)[:, :3]
+
+    return vertices, triangles
+
+
+def rasterize_triangles(grid, vertices, triangles, height_offset=0.5, batch_size=4096, sample_limit=2000000):
+
+    """fills a tile grid or chunk's height, normal and hit arrays from triangle data.
+
+    every integer tile point inside a triangle's xy footprint gets a barycentric height,
+    where triangles overlap the highest one wins, the same as a ray cast from above.
+    normals are flat face normals, pointing up.
+    """
+
+    width = grid.width
+    origin_x, origin_y = grid.origin
+
+    best = np.full(grid.size, -np.inf)
+    normals = np.zeros((grid.size, 3))
+
+    corners = vertices[triangles]
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(face_normals, axis=1)
+
+    flat = lengths > 1e-12
+    corners = corners[flat]
+    face_normals = face_normals[flat] / lengths[flat][:, None]
+    face_normals[face_normals[:, 2] < 0.0] *= -1.0
+
+    low = np.ceil(corners[:, :, :2].min(axis=1) - 1e-6).astype(np.int64)
+    high = np.floor(corners[:, :, :2].max(axis=1) + 1e-6).astype(np.int64)
+
+    low = np.maximum(low, (origin_x, origin_y))
+    high = np.minimum(high, (origin_x + width - 1, origin_y + width - 1))
+    spans = high - low + 1
+
+    on_grid = (spans > 0).all(axis=1)
+    corners = corners[on_grid]
+    face_normals = face_normals[on_grid]
+    low = low[on_grid]
+    spans = spans[on_grid]
+
+    # batch similar sized triangles together so the padded sample grids stay small
+    sides = spans.max(axis=1)
+    order = np.argsort(sides)
+    start = 0
+
+    while start < len(order):
+        end = min(len(order), start + batch_size)
+
+        # the last triangle in the batch is the biggest, shrink the batch until it fits the sample limit
+        while end - start > 1 and (end - start) * int(sides[order[end - 1]]) ** 2 > sample_limit:
+            end = start + max(1, (end - start) // 2)
+
+        batch = order[start:end]
+        start = end
+
+        batch_corners = corners[batch]
+        batch_low = low[batch]
+        span_x, span_y = spans[batch].max(axis=0)
+
+        offsets_x, offsets_y = np.meshgrid(np.arange(span_x), np.arange(span_y), indexing="ij")
+        px = batch_low[:, 0, None] + offsets_x.ravel()[None, :]
+        py = batch_low[:, 1, None] + offsets_y.ravel()[None, :]
+
+        a = batch_corners[:, 0, None, :]
+        b = batch_corners[:, 1, None, :]
+        c = batch_corners[:, 2, None, :]
+
+        denominator = ((b[..., 1] - c[..., 1]) * (a[..., 0] - c[..., 0]) +
+                       (c[..., 0] - b[..., 0]) * (a[..., 1] - c[..., 1]))
+        denominator = np.where(np.abs(denominator) < 1e-12, np.nan, denominator)
+
+        w_a = ((b[..., 1] - c[..., 1]) * (px - c[..., 0]) + (c[..., 0] - b[..., 0]) * (py - c[..., 1])) / denominator
+        w_b = ((c[..., 1] - a[..., 1]) * (px - c[..., 0]) + (a[..., 0] - c[..., 0]) * (py - c[..., 1])) / denominator
+        w_c = 1.0 - w_a - w_b
+
+        tolerance = -1e-9
+        inside = (w_a >= tolerance) & (w_b >= tolerance) & (w_c >= tolerance)
+        inside &= (px < origin_x + width) & (py < origin_y + width)
+
+        if not inside.any():
+            continue
+
+        heights = w_a * a[..., 2] + w_b * b[..., 2] + w_c * c[..., 2]
+        triangle_index = np.broadcast_to(np.arange(len(batch))[:, None], inside.shape)
+
+        hit_x = px[inside]
+        hit_y = py[inside]
+        hit_heights = heights[inside]
+        hit_triangles = triangle_index[inside]
+        hit_index = ((hit_x - origin_x) * width) + (hit_y - origin_y)
+
+        # keep the highest hit per tile inside this batch, then merge with earlier batches
+        sort = np.lexsort((hit_heights, hit_index))
+        hit_index = hit_index[sort]
+        last = np.ones(len(hit_index), dtype=np.bool_)
+        last[:-1] = hit_index[1:] != hit_index[:-1]
+
+        hit_index = hit_index[last]
+        hit_heights = hit_heights[sort][last]
+        hit_triangles = hit_triangles[sort][last]
+
+        higher = hit_heights > best[hit_index]
+        hit_index = hit_index[higher]
+
+        best[hit_index] = hit_heights[higher]
+        normals[hit_index] = face_normals[batch][hit_triangles[higher]]
+
+    hit = np.isfinite(best)
+
+    grid.hit = hit
+    grid.height = np.where(hit, best + height_offset, 0.0).astype(grid.height.dtype)
+    normals[~hit] = (0.0, 0.0, 1.0)
+    grid.normal = normals.astype(grid.normal.dtype)
+
+
+def rasterize_ground(grid, ground_object):
+    vertices, triangles = get_mesh_triangles(ground_object)
+    rasterize_triangles(grid, vertices, triangles)
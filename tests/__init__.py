@@ -0,0 +1,3 @@
+"""unittest cases run outside blender, each module calls headless.install() before importing game modules.
+run from the project folder with python -m unittest discover -s tests -t .
+"""
@@ -0,0 +1,81 @@
+import random
+import unittest
+
+import headless
+
+headless.install()
+
+import clearance
+import occupancy
+import tile_grid
+
+
+class Agent(object):
+
+    def __init__(self, agent_type):
+        self.agent_type = agent_type
+
+
+class ClearanceTest(unittest.TestCase):
+
+    """fits() and free_steps() checked against reading every tile of the footprint"""
+
+    def setUp(self):
+        self.tiles = tile_grid.TileGrid(3)
+        self.occupancy = occupancy.OccupancyGrid(self.tiles)
+        self.clearance = clearance.ClearanceMap(self.tiles, max_clearance=6)
+        self.random_state = random.Random(0)
+        self.agents = [Agent(agent_type) for agent_type in ("BUILDING", "INFANTRY", "VEHICLE") * 4]
+
+        low = self.tiles.key_range()[0]
+        high = self.tiles.key_range()[-1]
+        self.keys = [(x, y) for x in range(low - 1, high + 2) for y in range(low - 1, high + 2)]
+
+    def open_square(self, key, span, agent=None):
+        for x in range(key[0], key[0] + span):
+            for y in range(key[1], key[1] + span):
+                tile = self.tiles.get((x, y))
+                if tile is None or tile.occupied not in (None, agent):
+                    return False
+
+        return True
+
+    def scatter(self, count):
+        for _ in range(count):
+            agent = self.random_state.choice(self.agents)
+            x, y = self.random_state.choice(self.keys)
+            high = (x + self.random_state.randrange(3), y + self.random_state.randrange(3))
+
+            if self.random_state.random() < 0.3:
+                self.occupancy.clear(agent, (x, y), high)
+            else:
+                self.occupancy.stamp(agent, (x, y), high)
+
+            self.clearance.update((x, y), high)
+
+    def test_fits(self):
+        for _ in range(10):
+            self.scatter(15)
+
+            for key in self.keys:
+                for span in range(1, 7):
+                    self.assertEqual(self.clearance.fits(key, span), self.open_square(key, span), (key, span))
+
+    def test_free_steps(self):
+        for _ in range(10):
+            self.scatter(15)
+
+            for key in self.keys:
+                for span in (1, 2, 3):
+                    agent = self.random_state.choice(self.agents)
+                    steps = self.clearance.free_steps(key, span, self.occupancy.agent_id(agent))
+
+                    for dx in (-1, 0, 1):
+                        for dy in (-1, 0, 1):
+                            target = (key[0] + dx, key[1] + dy)
+                            self.assertEqual(steps[dx + 1, dy + 1], self.open_square(target, span, agent),
+                                             (key, span, dx, dy))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import random
+import unittest
+
+import headless
+
+headless.install()
+
+import occupancy
+import tile_grid
+
+
+class Agent(object):
+
+    def __init__(self, agent_type, span):
+        self.agent_type = agent_type
+        self.span = span
+        self.corner = None
+
+
+class OccupancyTest(unittest.TestCase):
+
+    """random stamps, clears and moves checked against a dict of tile keys for each layer"""
+
+    def setUp(self):
+        self.tiles = tile_grid.TileGrid(2)
+        self.occupancy = occupancy.OccupancyGrid(self.tiles)
+        self.model = {layer: {} for layer in occupancy.LAYERS}
+        self.random_state = random.Random(0)
+
+        low = self.tiles.key_range()[0]
+        high = self.tiles.key_range()[-1]
+        self.keys = [(x, y) for x in range(low - 2, high + 3) for y in range(low - 2, high + 3)]
+
+        types = [("BUILDING", 3), ("INFANTRY", 1), ("INFANTRY", 1), ("VEHICLE", 2), ("VEHICLE", 3), ("ARTILLERY", 2)]
+        self.agents = [Agent(agent_type, span) for agent_type, span in types * 3]
+
+    def footprint(self, agent, corner):
+        return [(corner[0] + x, corner[1] + y) for x in range(agent.span) for y in range(agent.span)]
+
+    def model_stamp(self, agent, corner):
+        layer = self.model[occupancy.get_layer(agent)]
+        for key in self.footprint(agent, corner):
+            if key in self.tiles:
+                layer[key] = agent
+
+    def model_clear(self, agent, corner):
+        layer = self.model[occupancy.get_layer(agent)]
+        for key in self.footprint(agent, corner):
+            if layer.get(key) is agent:
+                del layer[key]
+
+    def model_top(self, key):
+        for layer in occupancy.LAYERS:
+            agent = self.model[layer].get(key)
+            if agent:
+                return agent
+
+    def rect_keys(self, low, high):
+        return [(x, y) for x in range(low[0], high[0] + 1) for y in range(low[1], high[1] + 1)]
+
+    def random_rect(self):
+        x, y = self.random_state.choice(self.keys)
+        return (x, y), (x + self.random_state.randrange(5), y + self.random_state.randrange(5))
+
+    def step(self):
+        agent = self.random_state.choice(self.agents)
+        span = agent.span
+
+        if agent.corner is None:
+            corner = self.random_state.choice(self.keys)
+            self.occupancy.stamp(agent, corner, (corner[0] + span - 1, corner[1] + span - 1))
+            self.model_stamp(agent, corner)
+            agent.corner = corner
+
+        elif self.random_state.random() < 0.1:
+            corner = agent.corner
+            self.occupancy.clear(agent, corner, (corner[0] + span - 1, corner[1] + span - 1))
+            self.model_clear(agent, corner)
+            agent.corner = None
+
+        else:
+            old = agent.corner
+            new = (old[0] + self.random_state.randint(-1, 1), old[1] + self.random_state.randint(-1, 1))
+            self.occupancy.move(agent, old, new, span)
+            self.model_clear(agent, old)
+            self.model_stamp(agent, new)
+            agent.corner = new
+
+    def check_arrays(self):
+        origin = self.tiles.origin
+
+        for layer in occupancy.LAYERS:
+            array = self.occupancy.layers[layer]
+            for x, y in self.tiles.keys():
+                agent = self.model[layer].get((x, y))
+                expected = self.occupancy.registry.agent_ids[agent] if agent else 0
+                self.assertEqual(array[x - origin[0], y - origin[1]], expected, (layer, x, y))
+
+        for key in self.tiles.keys():
+            self.assertIs(self.tiles[key].occupied, self.model_top(key), key)
+
+    def test_stamp_clear_and_move(self):
+        for turn in range(3000):
+            self.step()
+
+            if turn % 100 == 0:
+                self.check_arrays()
+
+        self.check_arrays()
+
+    def test_rect_count_and_rect_any(self):
+        for turn in range(2000):
+            self.step()
+
+            if turn % 7 == 0:
+                self.occupancy.tick()
+
+            low, high = self.random_rect()
+            keys = self.rect_keys(low, high)
+            inside = all(key in self.tiles for key in keys)
+
+            self.assertEqual(self.occupancy.rect_count(low, high), sum(1 for key in keys if self.model_top(key)))
+            self.assertEqual(self.occupancy.rect_any(low, high), not inside or any(map(self.model_top, keys)))
+
+            for layer in occupancy.LAYERS:
+                count = sum(1 for key in keys if key in self.model[layer])
+                self.assertEqual(self.occupancy.rect_count(low, high, layer), count)
+
+            for ignore in self.agents:
+                others = any(agent and agent is not ignore
+                             for layer in occupancy.LAYERS for agent in map(self.model[layer].get, keys))
+                self.assertEqual(self.occupancy.rect_any(low, high, ignore=ignore), not inside or others)
+
+                if ignore.corner is not None:
+                    corner = ignore.corner
+                    ignore_rect = corner, (corner[0] + ignore.span - 1, corner[1] + ignore.span - 1)
+                    self.assertEqual(self.occupancy.rect_any(low, high, ignore=ignore, ignore_rect=ignore_rect),
+                                     not inside or others, (low, high, corner))
+
+    def test_release(self):
+        for turn in range(500):
+            self.step()
+
+        agent = self.random_state.choice([agent for agent in self.agents if agent.corner is not None])
+        agent_id = self.occupancy.registry.agent_ids[agent]
+
+        self.assertIsNotNone(self.occupancy.release(agent))
+        self.assertNotIn(agent, self.occupancy.registry.agent_ids)
+
+        for array in self.occupancy.layers.values():
+            self.assertFalse((array == agent_id).any())
+
+    def test_proximity_distances(self):
+        field = self.occupancy.proximity
+        reach = field.max_distance
+        tiles = list(self.tiles.keys())
+
+        for turn in range(600):
+            self.step()
+            self.occupancy.tick()
+
+            if turn % 50 != 0:
+                continue
+
+            vehicles = list(self.model["VEHICLE"].items())
+
+            for key in tiles:
+                distances = [(max(abs(key[0] - x), abs(key[1] - y)), agent) for (x, y), agent in vehicles]
+                distance = min([reach + 1] + [distance for distance, agent in distances])
+                self.assertEqual(field.distance(key), distance, key)
+
+                nearest = field.nearest(key, 3)
+                if distance <= 3:
+                    self.assertIn((distance, nearest), distances)
+                else:
+                    self.assertIsNone(nearest)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+import headless
+
+headless.install()
+
+import benchmarks
+import pathfinding
+
+
+class PathfinderTest(unittest.TestCase):
+
+    """jump point search has to find paths as short as plain A* and only through open tiles"""
+
+    def check_same_cost(self, occupant_map, span, queries=40):
+        blocked = pathfinding.footprint_blocked(occupant_map, 0, span)
+        astar = pathfinding.GridPathfinder(blocked)
+        jump_point = pathfinding.JumpPointPathfinder(blocked)
+
+        starts = benchmarks.open_tiles(astar, queries, 0)
+        goals = benchmarks.open_tiles(astar, queries, 1)
+
+        for start, goal in zip(starts, goals):
+            astar_path = astar.find_path(start, goal)
+            jump_point_path = jump_point.find_path(start, goal)
+
+            self.assertEqual(astar.reached, jump_point.reached, (start, goal))
+            self.assertAlmostEqual(pathfinding.path_length(start, astar_path),
+                                   pathfinding.path_length(start, jump_point_path), places=6, msg=(start, goal))
+
+            last = start
+            for key in jump_point_path:
+                self.assertLessEqual(max(abs(key[0] - last[0]), abs(key[1] - last[1])), 1, (start, goal))
+                self.assertFalse(jump_point.is_blocked(key), (start, goal, key))
+                last = key
+
+    def test_open_field(self):
+        self.check_same_cost(benchmarks.maze_occupant_map(96, wall_spacing=96, houses=6), 1)
+
+    def test_maze(self):
+        self.check_same_cost(benchmarks.maze_occupant_map(96, houses=20), 1)
+
+    def test_maze_footprint(self):
+        self.check_same_cost(benchmarks.maze_occupant_map(96, houses=20), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
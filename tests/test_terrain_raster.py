@@ -0,0 +1,18 @@
+import unittest
+
+import headless
+
+headless.install()
+
+import benchmarks
+
+
+class TerrainRasterTest(unittest.TestCase):
+
+    def test_matches_ray_cast(self):
+        for level_size in (1, 2):
+            self.assertLessEqual(benchmarks.mesh_heightfield_check(level_size, tolerance=0.001), 0.001)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+import headless
+
+headless.install()
+
+import tile_grid
+
+
+class Agent(object):
+    pass
+
+
+class TileGridTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tiles = tile_grid.TileGrid(2)
+
+    def test_keys_match_a_dict(self):
+        keys = {(x, y) for x in self.tiles.key_range() for y in self.tiles.key_range()}
+
+        self.assertEqual(set(self.tiles.keys()), keys)
+        self.assertEqual(len(keys), self.tiles.size)
+
+        for key in keys:
+            self.assertIn(key, self.tiles)
+            self.assertEqual(self.tiles[key].key, key)
+            self.assertEqual(self.tiles.key(self.tiles.index(key)), key)
+
+    def test_missing_keys(self):
+        last = self.tiles.key_range()[-1]
+
+        for key in [(-3, 0), (0, -3), (last + 1, 0), (0, last + 1)]:
+            self.assertNotIn(key, self.tiles)
+            self.assertIsNone(self.tiles.get(key))
+            self.assertEqual(self.tiles.get(key, "empty"), "empty")
+
+            with self.assertRaises(KeyError):
+                self.tiles[key]
+
+    def test_fractional_keys(self):
+        self.assertEqual(self.tiles[(3.0, 4.0)].key, (3, 4))
+        self.assertEqual(self.tiles[(3.0, 4.0)], self.tiles[(3, 4)])
+
+        for key in [(3.5, 4), (3, 4.25), (-0.5, -0.5)]:
+            self.assertNotIn(key, self.tiles)
+            self.assertIsNone(self.tiles.get(key))
+
+            with self.assertRaises(KeyError):
+                self.tiles[key]
+
+    def test_views_write_through(self):
+        agent = Agent()
+        tile = self.tiles[(1, 2)]
+
+        tile.off_road = True
+        tile.occupied = agent
+
+        self.assertTrue(self.tiles[(1, 2)].off_road)
+        self.assertIs(self.tiles[(1, 2)].occupied, agent)
+        self.assertIsNone(self.tiles[(2, 1)].occupied)
+        self.assertEqual(hash(tile), hash((1, 2)))
+
+        tile.occupied = None
+        self.assertIsNone(self.tiles[(1, 2)].occupied)
+
+    def test_released_ids_are_reused(self):
+        registry = self.tiles.registry
+        first = Agent()
+        second = Agent()
+
+        first_id = registry.agent_id(first)
+        self.assertEqual(registry.agent_id(first), first_id)
+        self.assertNotEqual(registry.agent_id(second), first_id)
+
+        registry.release(first)
+        self.assertNotIn(first, registry.agent_ids)
+        self.assertEqual(registry.agent_id(Agent()), first_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
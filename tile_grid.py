@@ -0,0 +1,352 @@
+import mathutils
+import numpy as np
+
+
+class TileView(object):
+
+    __slots__ = ("grid", "key", "index")
+
+    def __init__(self, grid, key, index):
+        self.grid = grid
+        self.key = key
+        self.index = index
+
+    def __eq__(self, other):
+        if isinstance(other, TileView):
+            return self.key == other.key
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    @property
+    def hit_object(self):
+        if self.grid.hit[self.index]:
+            return self.grid.ground_object
+
+        return None
+
+    @property
+    def point(self):
+        x, y = self.key
+        return mathutils.Vector([x, y, float(self.grid.height[self.index])])
+
+    @property
+    def normal(self):
+        return mathutils.Vector(self.grid.normal[self.index].tolist())
+
+    @property
+    def off_road(self):
+        return bool(self.grid.off_road[self.index])
+
+    @off_road.setter
+    def off_road(self, value):
+        self.grid.off_road[self.index] = bool(value)
+
+    @property
+    def occupied(self):
+        return self.grid.get_occupant(self.index)
+
+    @occupied.setter
+    def occupied(self, agent):
+        self.grid.set_occupant(self.index, agent)
+
+
+class AgentRegistry(object):
+
+    """maps agents to the integer ids stored in occupancy arrays, 0 is always empty.
+    release() frees the id of an agent that has ended for the next new agent, its tiles have to be cleared first
+    """
+
+    def __init__(self):
+        self.agent_ids = {}
+        self.id_agents = {0: None}
+        self.free_ids = []
+        self.next_id = 1
+
+    def agent_id(self, agent):
+        agent_id = self.agent_ids.get(agent)
+
+        if agent_id is None:
+            if self.free_ids:
+                agent_id = self.free_ids.pop()
+            else:
+                agent_id = self.next_id
+                self.next_id += 1
+
+            self.agent_ids[agent] = agent_id
+            self.id_agents[agent_id] = agent
+
+        return agent_id
+
+    def release(self, agent):
+        agent_id = self.agent_ids.pop(agent, None)
+
+        if agent_id is not None:
+            del self.id_agents[agent_id]
+            self.free_ids.append(agent_id)
+
+    def get_agent(self, agent_id):
+        return self.id_agents[int(agent_id)]
+
+
+class TileStore(object):
+
+    """a square block of flat tile arrays starting at origin, shared by the full grid and by chunks"""
+
+    def __init__(self, origin, width, registry):
+
+        self.origin = origin
+        self.width = width
+        self.size = width * width
+        self.registry = registry
+        self.ground_object = None
+
+        self.height = np.zeros(self.size, dtype=np.float32)
+        self.normal = np.zeros((self.size, 3), dtype=np.float32)
+        self.normal[:, 2] = 1.0
+        self.off_road = np.zeros(self.size, dtype=np.bool_)
+        self.hit = np.zeros(self.size, dtype=np.bool_)
+        self.occupant = np.zeros(self.size, dtype=np.int32)
+
+    def index(self, key):
+
+        """the flat index of an integer tile key, None off the block or for keys with a fraction like the old dict"""
+
+        x = int(key[0])
+        y = int(key[1])
+
+        if x != key[0] or y != key[1]:
+            return None
+
+        x -= self.origin[0]
+        y -= self.origin[1]
+
+        if 0 <= x < self.width and 0 <= y < self.width:
+            return (x * self.width) + y
+
+        return None
+
+    def key(self, index):
+        x, y = divmod(int(index), self.width)
+        return x + self.origin[0], y + self.origin[1]
+
+    def keys(self):
+        for x in range(self.origin[0], self.origin[0] + self.width):
+            for y in range(self.origin[1], self.origin[1] + self.width):
+                yield x, y
+
+    def nbytes(self):
+        return self.height.nbytes + self.normal.nbytes + self.off_road.nbytes + self.hit.nbytes + self.occupant.nbytes
+
+    def set_tile(self, key, height, normal, off_road, hit_object=None):
+        index = self.index(key)
+
+        self.height[index] = height
+        self.normal[index] = normal
+        self.off_road[index] = off_road
+        self.hit[index] = bool(hit_object)
+
+        if hit_object and not self.ground_object:
+            self.ground_object = hit_object
+
+    def set_off_road(self, field):
+
+        """terrain cells with no road are off road, tiles outside the field count as road
+        same as field.get(get_terrain_position(key), 2) but for the whole block at once
+        """
+
+        x_cells = np.round(np.arange(self.origin[0], self.origin[0] + self.width) * 0.125).astype(np.int32)
+        y_cells = np.round(np.arange(self.origin[1], self.origin[1] + self.width) * 0.125).astype(np.int32)
+
+        low = int(min(x_cells.min(), y_cells.min()))
+        high = int(max(x_cells.max(), y_cells.max()))
+        cell_width = high - low + 1
+
+        field_map = np.full((cell_width, cell_width), 2, dtype=np.int32)
+        for (x, y), value in field.items():
+            if low <= x <= high and low <= y <= high:
+                field_map[x - low, y - low] = value
+
+        off_road = field_map[(x_cells - low)[:, None], (y_cells - low)[None, :]] == 0
+
+        self.off_road = (off_road.ravel() & self.hit).astype(np.bool_)
+
+    def get_occupant(self, index):
+        return self.registry.get_agent(self.occupant[index])
+
+    def set_occupant(self, index, agent):
+        if agent:
+            self.occupant[index] = self.registry.agent_id(agent)
+        else:
+            self.occupant[index] = 0
+
+
+class TileGrid(TileStore):
+
+    """flat array store for the terrain tiles, tiles[(x, y)] returns a light weight view
+    so existing code can keep using tile.point, tile.normal, tile.off_road and tile.occupied
+    """
+
+    def __init__(self, level_size, border=2):
+
+        self.level_size = level_size
+        self.border = border
+
+        super().__init__((-border, -border), (level_size * 8) + (border * 2), AgentRegistry())
+
+    def __getitem__(self, key):
+        index = self.index(key)
+        if index is None:
+            raise KeyError(key)
+
+        return TileView(self, (int(key[0]), int(key[1])), index)
+
+    def __contains__(self, key):
+        return self.index(key) is not None
+
+    def get(self, key, default=None):
+        index = self.index(key)
+        if index is None:
+            return default
+
+        return TileView(self, (int(key[0]), int(key[1])), index)
+
+    def key_range(self):
+        return range(-self.border, self.width - self.border)
+
+    def height_map(self):
+        return self.height.reshape(self.width, self.width)
+
+    def normal_map(self):
+        return self.normal.reshape(self.width, self.width, 3)
+
+    def off_road_map(self):
+        return self.off_road.reshape(self.width, self.width)
+
+    def occupant_map(self):
+        return self.occupant.reshape(self.width, self.width)
+
+
+class TileChunk(TileStore):
+
+    def __init__(self, coords, origin, width, registry):
+        super().__init__(origin, width, registry)
+
+        self.coords = coords
+        self.last_used = 0
+
+    def pinned(self):
+        return bool(self.occupant.any())
+
+
+class ChunkedTileGrid(object):
+
+    """the same tiles[(x, y)] api as TileGrid, but tiles live in fixed size chunks
+    which are only surveyed the first time something touches them.
+
+    surveyor(chunk) fills a new chunk's arrays. when more than memory_cap bytes of chunks are loaded
+    the least recently used chunks are dropped, chunks with occupants are never dropped.
+    """
+
+    def __init__(self, level_size, surveyor, chunk_size=32, memory_cap=64 * 1024 * 1024, border=2):
+
+        self.level_size = level_size
+        self.border = border
+        self.width = (level_size * 8) + (border * 2)
+        self.size = self.width * self.width
+        self.chunk_size = chunk_size
+        self.memory_cap = memory_cap
+        self.surveyor = surveyor
+        self.registry = AgentRegistry()
+
+        self.chunks = {}
+        self.clock = 0
+        self.surveyed = 0
+        self.evicted = 0
+
+        chunk_bytes = TileStore((0, 0), chunk_size, self.registry).nbytes()
+        self.max_chunks = max(1, memory_cap // chunk_bytes)
+
+    def chunk_coords(self, key):
+        return (int(key[0]) + self.border) // self.chunk_size, (int(key[1]) + self.border) // self.chunk_size
+
+    def in_bounds(self, key):
+        x = int(key[0])
+        y = int(key[1])
+
+        if x != key[0] or y != key[1]:
+            return False
+
+        x += self.border
+        y += self.border
+
+        return 0 <= x < self.width and 0 <= y < self.width
+
+    def get_chunk(self, coords):
+
+        chunk = self.chunks.get(coords)
+
+        if not chunk:
+            origin = ((coords[0] * self.chunk_size) - self.border, (coords[1] * self.chunk_size) - self.border)
+            chunk = TileChunk(coords, origin, self.chunk_size, self.registry)
+            self.surveyor(chunk)
+            self.surveyed += 1
+
+            self.chunks[coords] = chunk
+            self.evict()
+
+        chunk.last_used = self.clock
+        return chunk
+
+    def evict(self):
+
+        if len(self.chunks) <= self.max_chunks:
+            return
+
+        candidates = sorted((chunk for chunk in self.chunks.values() if chunk.last_used < self.clock and
+                             not chunk.pinned()), key=lambda old_chunk: old_chunk.last_used)
+
+        for chunk in candidates[:len(self.chunks) - self.max_chunks]:
+            del self.chunks[chunk.coords]
+            self.evicted += 1
+
+    def tick(self):
+        self.clock += 1
+
+    def touch_area(self, position, radius):
+
+        """materializes the chunks around a point, use for the camera so chunks are ready before units arrive"""
+
+        low = self.chunk_coords((position[0] - radius, position[1] - radius))
+        high = self.chunk_coords((position[0] + radius, position[1] + radius))
+        last = (self.width - 1) // self.chunk_size
+
+        for cx in range(max(0, low[0]), min(last, high[0]) + 1):
+            for cy in range(max(0, low[1]), min(last, high[1]) + 1):
+                self.get_chunk((cx, cy))
+
+    def __getitem__(self, key):
+        if not self.in_bounds(key):
+            raise KeyError(key)
+
+        chunk = self.get_chunk(self.chunk_coords(key))
+        return TileView(chunk, (int(key[0]), int(key[1])), chunk.index(key))
+
+    def __contains__(self, key):
+        return self.in_bounds(key)
+
+    def get(self, key, default=None):
+        if not self.in_bounds(key):
+            return default
+
+        return self[key]
+
+    def key_range(self):
+        return range(-self.border, self.width - self.border)
+
+    def loaded_bytes(self):
+        return sum(chunk.nbytes() for chunk in self.chunks.values())